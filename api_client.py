@@ -1,17 +1,26 @@
-import requests
+import http_client
 import yaml
-from logger import log_debug, log_error
+from logger import log_debug
 
 cfg = yaml.safe_load(open("config.yaml"))
 
-def get_clients():
-    log_debug("api_client", "A consultar forex_api.php")
-    try:
-        r = requests.get(cfg["api"]["config_url"], timeout=10)
+def fetch_clients(etag=None, last_modified=None, params=None):
+    """
+    Pedido condicional (ETag / If-Modified-Since) da lista de clientes.
+    Retorna a resposta (304 = sem alterações); erros propagam.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    log_debug("api_client", "A consultar forex_api.php", {
+        "conditional": bool(headers),
+        "params": params
+    })
+
+    r = http_client.get(cfg["api"]["config_url"], headers=headers, params=params, timeout=10)
+    if r.status_code != 304:
         r.raise_for_status()
-        data = r.json()
-        log_debug("api_client", "Clientes recebidos", data)
-        return data
-    except Exception as e:
-        log_error("api_client", "Erro ao obter clientes", e)
-        return []
+    return r
@@ -0,0 +1,304 @@
+"""
+Backtest da estratégia Falcon sobre klines guardados (correr a partir da
+pasta do projeto):
+
+    python backtest.py data/BTCUSDT_5m.csv data/ETHUSDT_5m.parquet \\
+        --sl 1 --tp 2 --qty 0.01 --out trades.jsonl
+
+Ficheiros: CSV (com cabeçalho open_time,open,high,low,close,... ou sem
+cabeçalho no formato dos klines da Binance), Parquet (pyarrow) ou NPY
+(array estruturado com esses campos, ou 2D com as colunas por essa ordem).
+O símbolo é o nome do ficheiro até ao primeiro "_" (BTCUSDT_5m.csv → BTCUSDT).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from strategy_falcon import EMA_SPANS, falcon_signals
+
+COLUMNS = ("open_time", "open", "high", "low", "close")
+
+# taxa taker por lado (entrada e saída a mercado/stop-market)
+DEFAULT_FEE_RATE = 0.0005
+
+
+# =====================================================
+# CARREGAR KLINES
+# =====================================================
+def _from_frame(df):
+    return {c: df[c].to_numpy() for c in COLUMNS}
+
+
+def _read_csv(path):
+    with open(path) as f:
+        first = f.readline().split(",")[0].strip().strip('"')
+
+    # klines da Binance sem cabeçalho: open_time,open,high,low,close,volume,...
+    if first.isdigit():
+        return pd.read_csv(path, header=None, usecols=range(5), names=COLUMNS)
+    return pd.read_csv(path, usecols=list(COLUMNS))
+
+
+def load_klines(path) -> dict:
+    """
+    {open_time, open, high, low, close} como arrays numpy, por ordem de tempo
+    """
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext == ".npy":
+        arr = np.load(path, mmap_mode="r")
+        if arr.dtype.names:
+            data = {c: arr[c] for c in COLUMNS}
+        else:
+            data = {c: arr[:, i] for i, c in enumerate(COLUMNS)}
+    elif ext == ".parquet":
+        try:
+            data = _from_frame(pd.read_parquet(path, columns=list(COLUMNS)))
+        except ImportError as e:
+            raise RuntimeError(f"Parquet requer pyarrow: pip install pyarrow ({e})")
+    else:
+        data = _from_frame(_read_csv(path))
+
+    data = {
+        c: np.ascontiguousarray(v, dtype=np.int64 if c == "open_time" else np.float64)
+        for c, v in data.items()
+    }
+
+    t = data["open_time"]
+    if len(t) > 1 and not np.all(t[1:] > t[:-1]):
+        _, idx = np.unique(t, return_index=True)
+        data = {c: v[idx] for c, v in data.items()}
+
+    return data
+
+
+def symbol_from_path(path):
+    return os.path.basename(path).split("_")[0].split(".")[0].upper()
+
+
+# =====================================================
+# SIMULAÇÃO (SL/TP COMO NO place_order)
+# =====================================================
+#
+# Entrada a mercado no fecho do candle do sinal (entry = close, como no
+# bot), SL/TP em % (apply_risk) como STOP_MARKET/TAKE_PROFIT_MARKET.
+# Só uma posição de cada vez (o bot não abre com posição aberta).
+# Saída: 1º candle seguinte cujo high/low toca SL ou TP; se abrir já para
+# lá de um deles sai na abertura (gap); se tocar nos dois no mesmo candle
+# assume-se o SL (conservador). O ciclo é por trade, não por candle: os
+# sinais e a procura da saída são vetorizados.
+
+def _exit(open_, high, low, start, side, stop, take):
+    """
+    (índice do candle de saída, preço de saída) ou (None, None) se não fechou
+    """
+    n = len(high)
+    j = start
+    size = 256
+
+    while j < n:
+        end = min(n, j + size)
+
+        if side > 0:
+            hit_sl = low[j:end] <= stop
+            hit_tp = high[j:end] >= take
+        else:
+            hit_sl = high[j:end] >= stop
+            hit_tp = low[j:end] <= take
+
+        hit = hit_sl | hit_tp
+        if hit.any():
+            k = int(np.argmax(hit))
+            i = j + k
+            o = open_[i]
+
+            if (o - stop) * side <= 0:
+                return i, o              # gap através do SL
+            if (o - take) * side >= 0:
+                return i, o              # gap através do TP
+            return i, (stop if hit_sl[k] else take)
+
+        j = end
+        size *= 4
+
+    return None, None
+
+
+def simulate(data, sl_pct, tp_pct, spans=EMA_SPANS, sides=None):
+    """
+    Trades como arrays: entry_idx, exit_idx, side (+1/-1), entry, exit.
+    `sides` (sinais já calculados) evita recalcular as EMAs.
+    """
+    open_, high, low, close = data["open"], data["high"], data["low"], data["close"]
+
+    if sides is None:
+        sides = falcon_signals(close, spans)
+
+    signal_idx = np.flatnonzero(sides)
+    sl = sl_pct / 100
+    tp = tp_pct / 100
+
+    entry_idx, exit_idx, trade_side, entry, exit_ = [], [], [], [], []
+    pos = 0
+
+    while pos < len(signal_idx):
+        i = int(signal_idx[pos])
+        side = int(sides[i])
+        price = close[i]
+
+        stop = price * (1 - sl * side)
+        take = price * (1 + tp * side)
+
+        k, exit_price = _exit(open_, high, low, i + 1, side, stop, take)
+        if k is None:
+            break  # posição ainda aberta no fim dos dados
+
+        entry_idx.append(i)
+        exit_idx.append(k)
+        trade_side.append(side)
+        entry.append(price)
+        exit_.append(exit_price)
+
+        # próximo sinal a partir do candle em que a posição fechou
+        pos = int(np.searchsorted(signal_idx, k, side="left"))
+
+    return {
+        "entry_idx": np.array(entry_idx, dtype=np.int64),
+        "exit_idx": np.array(exit_idx, dtype=np.int64),
+        "side": np.array(trade_side, dtype=np.int8),
+        "entry": np.array(entry, dtype=np.float64),
+        "exit": np.array(exit_, dtype=np.float64)
+    }
+
+
+def pnl(trades, qty=1.0, fee_rate=DEFAULT_FEE_RATE):
+    """
+    (pnl líquido, fee) por trade
+    """
+    fee = fee_rate * qty * (trades["entry"] + trades["exit"])
+    gross = trades["side"] * (trades["exit"] - trades["entry"]) * qty
+    return gross - fee, fee
+
+
+def summarize(trade_pnl) -> dict:
+    """
+    Totais de uma sequência de PnL (por ordem de fecho)
+    """
+    equity = np.cumsum(trade_pnl)
+    peak = np.maximum.accumulate(np.concatenate(([0.0], equity)))[1:]
+    drawdown = float(np.max(peak - equity)) if len(equity) else 0.0
+
+    return {
+        "trades": int(len(trade_pnl)),
+        "wins": int(np.sum(trade_pnl > 0)),
+        "pnl": round(float(equity[-1]) if len(equity) else 0.0, 8),
+        "max_drawdown": round(drawdown, 8)
+    }
+
+
+def to_records(symbol, data, trades, qty=1.0, fee_rate=DEFAULT_FEE_RATE) -> list:
+    """
+    Trades no formato de get_closed_trades (bybit_client/binance_client)
+    """
+    t = data["open_time"]
+    bar_ms = int(np.median(np.diff(t[:1000]))) if len(t) > 1 else 0
+    net, fee = pnl(trades, qty, fee_rate)
+
+    return [
+        {
+            "orderId": f"BT-{symbol}-{int(t[i])}",
+            "symbol": symbol,
+            "side": "BUY" if s > 0 else "SELL",
+            "entry_price": float(entry),
+            "exit_price": float(exit_),
+            "qty": float(qty),
+            "fee": float(f),
+            "pnl": float(p),
+            "createdTime": int(t[i]) + bar_ms - 1,   # fecho do candle do sinal
+            "updatedTime": int(t[k]) + bar_ms - 1
+        }
+        for i, k, s, entry, exit_, f, p in zip(
+            trades["entry_idx"], trades["exit_idx"], trades["side"],
+            trades["entry"], trades["exit"], fee, net
+        )
+    ]
+
+
+def backtest(path, sl_pct, tp_pct, qty=1.0, fee_rate=DEFAULT_FEE_RATE, spans=EMA_SPANS):
+    """
+    (símbolo, trades no formato de get_closed_trades, resumo) de um ficheiro
+    """
+    symbol = symbol_from_path(path)
+    data = load_klines(path)
+    trades = simulate(data, sl_pct, tp_pct, spans)
+
+    records = to_records(symbol, data, trades, qty, fee_rate)
+    summary = summarize(np.array([r["pnl"] for r in records]))
+    summary["candles"] = len(data["close"])
+
+    return symbol, records, summary
+
+
+def _backtest_args(args):
+    return backtest(*args)
+
+
+# =====================================================
+# CLI
+# =====================================================
+def _write(records, out):
+    if out.endswith(".csv"):
+        pd.DataFrame(records).to_csv(out, index=False)
+        return
+
+    with open(out, "w") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest da estratégia Falcon")
+    parser.add_argument("files", nargs="+", help="klines (.csv, .parquet, .npy)")
+    parser.add_argument("--sl", type=float, required=True, help="StopLoss em %%")
+    parser.add_argument("--tp", type=float, required=True, help="TakeProfit em %%")
+    parser.add_argument("--qty", type=float, default=1.0, help="quantidade por trade")
+    parser.add_argument("--fee", type=float, default=DEFAULT_FEE_RATE, help="taxa por lado")
+    parser.add_argument("--spans", type=int, nargs=3, default=list(EMA_SPANS), help="EMAs (rápida lenta tendência)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="processos (um ficheiro cada)")
+    parser.add_argument("--out", help="ficheiro de trades (.jsonl ou .csv)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    jobs = [(f, args.sl, args.tp, args.qty, args.fee, tuple(args.spans)) for f in args.files]
+
+    if len(jobs) > 1 and args.processes > 1:
+        with Pool(min(args.processes, len(jobs))) as pool:
+            results = pool.map(_backtest_args, jobs)
+    else:
+        results = [_backtest_args(j) for j in jobs]
+
+    all_records = []
+    candles = 0
+
+    for symbol, records, summary in results:
+        print(f"{symbol:12s} {json.dumps(summary)}")
+        all_records.extend(records)
+        candles += summary["candles"]
+
+    all_records.sort(key=lambda r: r["updatedTime"])
+    total = summarize(np.array([r["pnl"] for r in all_records]))
+    print(f"{'TOTAL':12s} {json.dumps(total)}")
+    print(f"{candles} candles em {time.perf_counter() - start:.2f}s")
+
+    if args.out:
+        _write(all_records, args.out)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
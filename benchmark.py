@@ -0,0 +1,813 @@
+"""
+Benchmarks do bot (correr a partir da pasta do projeto):
+
+    python benchmark.py [ema] [log_writer] [log_overhead] [orders] [streams] [signing] [backtest]
+"""
+import os
+import sys
+import json
+import time
+import datetime
+import tempfile
+import threading
+import traceback
+
+import numpy as np
+import pandas as pd
+
+
+# =====================================================
+# UTILITÁRIOS
+# =====================================================
+def _random_walk(n, seed=42):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    open_time = np.arange(n, dtype=np.int64) * 300_000
+    return open_time, close
+
+
+def _timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+# =====================================================
+# EMA: PANDAS vs INCREMENTAL
+# =====================================================
+def bench_ema(window=200, candles=5000):
+    """
+    Paridade: as decisões (crossover/tendência) do caminho incremental têm
+    de ser iguais às do pandas sobre a mesma série (mesmo primeiro candle).
+    Benchmark: custo por avaliação com uma janela de `window` candles.
+    """
+    import indicators
+    from strategy_falcon import EMA_SPANS, falcon_strategy, falcon_strategy_incremental
+
+    cfg = {"StopLoss": 0.4, "TakeProfit": 0.6}
+    open_time, close = _random_walk(candles)
+
+    # -------------------------------------------------
+    # Paridade (série a crescer, candle a candle)
+    # -------------------------------------------------
+    indicators.reset()
+    key = ("bench", "PARITY", "5m")
+    mismatches = 0
+    signals = 0
+    max_diff = 0.0
+
+    for n in range(3, candles + 1):
+        df = pd.DataFrame({"open_time": open_time[:n], "close": close[:n]})
+
+        expected = falcon_strategy(df, cfg)
+        got = falcon_strategy_incremental(key, df, cfg)
+
+        signals += expected is not None
+        if (expected is None) != (got is None) or (
+            expected is not None and expected["side"] != got["side"]
+        ):
+            mismatches += 1
+
+        if n % 500 == 0:
+            _, last = indicators.update_emas(key, open_time[:n], close[:n], EMA_SPANS)
+            ref = [df["close"].ewm(span=s, adjust=False).mean().iloc[-1] for s in EMA_SPANS]
+            max_diff = max(max_diff, float(np.max(np.abs(np.array(ref) - last))))
+
+    print(f"paridade: {candles - 2} avaliações, {signals} sinais, "
+          f"{mismatches} diferenças, erro máx. EMA {max_diff:.2e}")
+
+    # -------------------------------------------------
+    # Benchmark (janela fixa, 1 candle novo por avaliação)
+    # -------------------------------------------------
+    frames = [
+        pd.DataFrame({
+            "open_time": open_time[i - window:i],
+            "close": close[i - window:i]
+        })
+        for i in range(window, candles)
+    ]
+
+    def run_pandas():
+        for df in frames:
+            falcon_strategy(df, cfg)
+
+    def run_incremental():
+        indicators.reset()
+        for df in frames:
+            falcon_strategy_incremental(("bench", "BENCH", "5m"), df, cfg)
+
+    t_pandas = _timeit(run_pandas, 3) / len(frames)
+    t_incr = _timeit(run_incremental, 3) / len(frames)
+
+    print(f"pandas:      {t_pandas * 1e6:8.1f} µs/avaliação")
+    print(f"incremental: {t_incr * 1e6:8.1f} µs/avaliação ({t_pandas / t_incr:.1f}x)")
+
+    return mismatches == 0
+
+
+# =====================================================
+# LOG LOCAL: OPEN/APPEND POR LINHA vs BUFFER
+# =====================================================
+def bench_log_writer(lines=50000):
+    """
+    Linhas/s do log local: escrita antiga (makedirs + open/append por
+    linha) vs escrita com buffer do logger (inclui rotação por tamanho).
+    """
+    import logger
+
+    data = {"IDCliente": 12, "TipoMoeda": "BTCUSDT", "LotSize": 0.01, "BotActive": 1}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old_file = os.path.join(tmp, "old", "bot.log")
+
+        def run_old():
+            for i in range(lines):
+                os.makedirs(os.path.dirname(old_file), exist_ok=True)
+                log_line = {
+                    "time": datetime.datetime.utcnow().isoformat(),
+                    "level": "DEBUG",
+                    "module": "bench",
+                    "message": "Processar cliente",
+                    "data": data
+                }
+                with open(old_file, "a") as f:
+                    f.write(json.dumps(log_line, ensure_ascii=False) + "\n")
+
+        logger.DEBUG = True
+        logger.LOG_FILE = os.path.join(tmp, "new", "bot.log")
+        logger.LOG_MAX_BYTES = 4 * 1024 * 1024
+
+        def run_new():
+            for i in range(lines):
+                logger.log_debug("bench", "Processar cliente", data)
+            logger.flush_local()
+
+        t_old = _timeit(run_old, 1)
+        t_new = _timeit(run_new, 1)
+
+        rotated = sorted(f for f in os.listdir(os.path.dirname(logger.LOG_FILE)))
+
+    print(f"open/append: {lines / t_old:10.0f} linhas/s")
+    print(f"buffer:      {lines / t_new:10.0f} linhas/s ({t_old / t_new:.1f}x)")
+    print(f"ficheiros após rotação: {rotated}")
+
+
+# =====================================================
+# LOGGER: CUSTO COM DEBUG DESLIGADO / log_error
+# =====================================================
+def bench_log_overhead(calls=100000):
+    """
+    Custo por chamada, do lado de quem faz o log, com o mesmo dict:
+    - DEBUG desligado: log_debug original (_write_local → return) vs atual
+    - DEBUG ligado, módulo filtrado para INFO: original (escreve sempre)
+      vs atual (limiar por módulo)
+    - log_error: traceback.format_exc() no momento vs formatação diferida
+    """
+    import logger
+
+    clients = [
+        {"IDCliente": i, "TipoMoeda": "BTCUSDT", "LotSize": 0.01, "StopLoss": 0.4}
+        for i in range(300)
+    ]
+
+    # os logs de erro não podem sair para a API real
+    logger.cfg["api"]["log_url"] = "http://127.0.0.1:9/"
+
+    # log_debug do logger original (antes dos limiares/_Lazy)
+    state = {"debug": False}
+    tmp_log = os.path.join(tempfile.mkdtemp(), "baseline.log")
+
+    def baseline_write_local(level, module, message, data=None):
+        if not state["debug"]:
+            return
+        log_line = {
+            "time": datetime.datetime.utcnow().isoformat(),
+            "level": level,
+            "module": module,
+            "message": message,
+            "data": data
+        }
+        with open(tmp_log, "a") as f:
+            f.write(json.dumps(log_line, ensure_ascii=False) + "\n")
+
+    def baseline_log_debug(module, message, data=None):
+        baseline_write_local("DEBUG", module, message, data)
+
+    def run(fn, n):
+        def loop():
+            for _ in range(n):
+                fn("bench", "Clientes", clients)
+        return _timeit(loop, 1) / n
+
+    # DEBUG desligado
+    logger.DEBUG = False
+    t_old_off = run(baseline_log_debug, calls)
+    t_new_off = run(logger.log_debug, calls)
+
+    # DEBUG ligado, mas este módulo só a partir de INFO
+    state["debug"] = True
+    logger.DEBUG = True
+    logger.MODULE_LEVELS["bench"] = "INFO"
+    logger._thresholds.pop("bench", None)
+    slow_calls = max(1, calls // 100)
+    t_old_filtered = run(baseline_log_debug, slow_calls)
+    t_new_filtered = run(logger.log_debug, calls)
+    logger.DEBUG = False
+
+    print(f"DEBUG desligado, original:               {t_old_off * 1e6:8.2f} µs/chamada")
+    print(f"DEBUG desligado, atual:                  {t_new_off * 1e6:8.2f} µs/chamada "
+          f"({t_old_off / t_new_off:.1f}x)")
+    print(f"DEBUG ligado, módulo a INFO, original:   {t_old_filtered * 1e6:8.2f} µs/chamada (escreve)")
+    print(f"DEBUG ligado, módulo a INFO, atual:      {t_new_filtered * 1e6:8.2f} µs/chamada "
+          f"({t_old_filtered / t_new_filtered:.0f}x)")
+
+    def _fail():
+        raise ValueError("erro de teste")
+
+    errors = 2000
+
+    def old_error():
+        for _ in range(errors):
+            try:
+                _fail()
+            except Exception as e:
+                {"error": str(e), "traceback": traceback.format_exc()}
+
+    def new_error():
+        for _ in range(errors):
+            try:
+                _fail()
+            except Exception as e:
+                logger.log_error("bench", "Erro de teste", e)
+
+    t_old = _timeit(old_error, 1) / errors
+    t_new = _timeit(new_error, 1) / errors
+
+    # descarta o que ficou na fila (não interessa enviar)
+    logger.API_OVERFLOW = "drop"
+    logger.shutdown(timeout=0)
+
+    print(f"log_error, format_exc imediato:          {t_old * 1e6:8.2f} µs/chamada")
+    print(f"log_error, traceback diferido:           {t_new * 1e6:8.2f} µs/chamada")
+
+
+# =====================================================
+# ORDENS BINANCE: SL/TP SEQUENCIAL vs PARALELO vs BATCH
+# =====================================================
+def _mock_exchange(latency):
+    """
+    Servidor HTTP local que responde como a Binance às ordens e à
+    listenKey, com `latency` segundos por pedido (simula o round trip).
+    server.calls: [(método, path)] recebidos.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlsplit, parse_qs
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+        order_id = 0
+        calls = []
+
+        def _reply(self, body):
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            # /fapi/v1/time (time_sync)
+            time.sleep(latency)
+            self._reply({"serverTime": int(time.time() * 1000)})
+
+        def do_POST(self):
+            time.sleep(latency)
+            parts = urlsplit(self.path)
+            query = parse_qs(parts.query)
+            Handler.calls.append(("POST", parts.path))
+
+            Handler.order_id += 1
+            if parts.path.endswith("/listenKey"):
+                body = {"listenKey": f"lk{Handler.order_id}"}
+            elif parts.path.endswith("/batchOrders"):
+                orders = json.loads(query["batchOrders"][0])
+                body = [dict(o, orderId=Handler.order_id * 10 + i) for i, o in enumerate(orders)]
+            else:
+                body = {"orderId": Handler.order_id, "status": "NEW"}
+
+            self._reply(body)
+
+        def do_PUT(self):
+            # keepalive da listenKey
+            Handler.calls.append(("PUT", urlsplit(self.path).path))
+            self._reply({})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.calls = Handler.calls
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_orders(orders=20, latency=0.03):
+    """
+    Tempo sinal → posição protegida (MARKET + SL + TP) contra uma corretora
+    mock local com `latency` s por pedido, nos três modos de proteção.
+    """
+    import logger
+    import binance_client
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # nada sai para a API real nem para o log do bot
+        logger.cfg["api"]["log_url"] = "http://127.0.0.1:9/"
+        logger.LOG_FILE = os.path.join(tmp, "bot.log")
+
+        server = _mock_exchange(latency)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        binance_client._base_url = lambda env: base
+
+        results = {}
+        for mode in ("sequential", "parallel", "batch"):
+            binance_client.PROTECTION_MODE = mode
+            times = []
+
+            for _ in range(orders):
+                signal_time = time.time()
+                binance_client.place_order(
+                    "KEY", "SECRET", "BTCUSDT", "BUY", 0.01,
+                    sl=29000, tp=31000, signal_time=signal_time
+                )
+                times.append(time.time() - signal_time)
+
+            results[mode] = float(np.median(times))
+
+        server.shutdown()
+        logger.API_OVERFLOW = "drop"
+        logger.shutdown(timeout=0)
+
+    print(f"latência mock: {latency * 1000:.0f} ms/pedido, {orders} ordens por modo")
+    for mode, t in results.items():
+        print(f"{mode:<11} {t * 1000:7.1f} ms sinal → protegida "
+              f"({results['sequential'] / t:.1f}x)")
+    print(binance_client.get_order_stats())
+
+
+# =====================================================
+# STREAMS: KLINES E CONTA CONTRA UM SERVIDOR WEBSOCKET LOCAL
+# =====================================================
+class _FakeWebSocket:
+    """
+    Servidor WebSocket local (biblioteca websockets) que responde como a
+    Binance (combined streams, SUBSCRIBE) e a Bybit (auth, subscribe, ping).
+    Corre num event loop próprio numa thread.
+    """
+
+    def __init__(self, api_key, api_secret):
+        import asyncio
+        from websockets.asyncio.server import serve
+
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.paths = []       # path de cada ligação aceite
+        self.received = []    # (path, mensagem) recebidas
+        self._connections = []
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        async def handler(ws):
+            path = ws.request.path
+            self.paths.append(path)
+            self._connections.append(ws)
+            try:
+                async for message in ws:
+                    msg = json.loads(message)
+                    self.received.append((path, msg))
+                    reply = self._reply(msg)
+                    if reply is not None:
+                        await ws.send(json.dumps(reply))
+            except Exception:
+                pass
+            finally:
+                self._connections.remove(ws)
+
+        async def run():
+            self._server = await serve(handler, "127.0.0.1", 0)
+            self.url = f"ws://127.0.0.1:{self._server.sockets[0].getsockname()[1]}"
+            ready.set()
+            await self._server.serve_forever()
+
+        threading.Thread(target=self._loop.run_until_complete, args=(run(),), daemon=True).start()
+        ready.wait(5)
+
+    def _reply(self, msg):
+        import hmac
+        import hashlib
+
+        if msg.get("method") in ("SUBSCRIBE", "UNSUBSCRIBE"):
+            return {"result": None, "id": msg["id"]}
+
+        op = msg.get("op")
+        if op == "auth":
+            api_key, expires, signature = msg["args"]
+            expected = hmac.new(
+                self.api_secret.encode(), f"GET/realtime{expires}".encode(), hashlib.sha256
+            ).hexdigest()
+            ok = api_key == self.api_key and signature == expected
+            return {"op": "auth", "success": ok, "ret_msg": "" if ok else "invalid signature"}
+        if op == "subscribe":
+            return {"op": "subscribe", "success": True}
+        if op == "ping":
+            return {"op": "pong"}
+        return None
+
+    def _matching(self, prefix):
+        return [c for c in self._connections if c.request.path.startswith(prefix)]
+
+    def push(self, prefix, msg):
+        """
+        Envia `msg` a todas as ligações cujo path começa por `prefix`
+        """
+        import asyncio
+
+        for ws in self._matching(prefix):
+            asyncio.run_coroutine_threadsafe(ws.send(json.dumps(msg)), self._loop).result(5)
+
+    def drop(self, prefix):
+        """
+        Corta o TCP sem close frame (simula uma queda da ligação)
+        """
+        for ws in self._matching(prefix):
+            self._loop.call_soon_threadsafe(ws.transport.abort)
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._server.close)
+
+
+def _wait_for(cond, timeout=5):
+    end = time.time() + timeout
+    while time.time() < end:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _kline(symbol, interval, open_time, step_ms, close, closed):
+    return {"stream": f"{symbol.lower()}@kline_{interval}", "data": {
+        "e": "kline",
+        "s": symbol,
+        "k": {
+            "s": symbol, "i": interval, "t": open_time, "T": open_time + step_ms - 1,
+            "o": str(close), "h": str(close), "l": str(close), "c": str(close), "v": "1",
+            "x": closed
+        }
+    }}
+
+
+def _check_market_stream(fake, check):
+    import market_stream
+    from kline_buffer import get_buffer
+
+    env, symbol, interval, step = "real", "BTCUSDT", "5m", 300_000
+    market_stream.ENABLED = True
+    market_stream.RECONNECT_DELAY = 0.1
+    market_stream.WS_URLS[env] = fake.url
+
+    # histórico "REST" do buffer
+    t0 = (int(time.time() * 1000) // step - 10) * step
+    buf = get_buffer(env, symbol, interval)
+    for i in range(5):
+        buf.update(t0 + i * step, 100, 100, 100, 100, 1, t0 + (i + 1) * step - 1)
+    last = t0 + 4 * step
+
+    closes = []
+    market_stream.add_close_listener(lambda *args: closes.append(args))
+    market_stream.subscribe({(env, symbol, interval)})
+
+    check("ligação com combined streams",
+          _wait_for(lambda: "/stream?streams=btcusdt@kline_5m" in fake.paths))
+    _wait_for(lambda: market_stream._streams[env]._connected)
+
+    # candle em curso (x=false) atualiza o buffer sem notificar o fecho
+    fake.push("/stream", _kline(symbol, interval, last + step, step, 101, False))
+    _wait_for(lambda: buf.last_open_time == last + step)
+    check("x=false atualiza o buffer", buf.last_open_time == last + step and not closes)
+    check("stream live", market_stream.is_live(env, symbol, interval))
+
+    # fecho (x=true) → listener do scheduler
+    fake.push("/stream", _kline(symbol, interval, last + step, step, 102, True))
+    check("x=true notifica o fecho",
+          _wait_for(lambda: closes == [(env, symbol, interval, last + step)]))
+
+    # candle em falta → gap até resincronizar por REST
+    fake.push("/stream", _kline(symbol, interval, last + 3 * step, step, 103, False))
+    check("candle em falta marca gap",
+          _wait_for(lambda: not market_stream.is_live(env, symbol, interval)))
+
+    # subscrição nova na ligação aberta
+    market_stream.subscribe({(env, symbol, interval), (env, "ETHUSDT", interval)})
+    check("SUBSCRIBE sem religar", _wait_for(lambda: any(
+        m.get("method") == "SUBSCRIBE" and m.get("params") == ["ethusdt@kline_5m"]
+        for _, m in fake.received
+    )))
+
+    # queda da ligação → gap, religa com todos os streams, resync
+    connections = len(fake.paths)
+    fake.drop("/stream")
+    check("queda marca gap", _wait_for(lambda: "ethusdt@kline_5m" in market_stream._streams[env]._gap))
+    check("religa com todos os streams", _wait_for(lambda: len(fake.paths) > connections and
+          fake.paths[-1] == "/stream?streams=btcusdt@kline_5m/ethusdt@kline_5m"))
+    _wait_for(lambda: market_stream._streams[env]._connected)
+    check("sem resync continua em REST", not market_stream.is_live(env, symbol, interval))
+
+    for i in range(3):
+        buf.update(last + (i + 1) * step, 104, 104, 104, 104, 1, last + (i + 2) * step - 1)
+    market_stream.clear_gap(env, symbol, interval)
+    fake.push("/stream", _kline(symbol, interval, last + 3 * step, step, 105, False))
+    check("live depois do resync", _wait_for(lambda: market_stream.is_live(env, symbol, interval)))
+
+    market_stream._streams[env].stop()
+
+
+def _check_user_stream(fake, rest, api_key, api_secret, check):
+    import user_stream
+
+    user_stream.ENABLED = True
+    user_stream.RECONNECT_DELAY = 0.1
+    user_stream.KEEPALIVE_SECONDS = 0
+    user_stream.WS_URLS["binance"]["real"] = fake.url
+    user_stream.WS_URLS["bybit"]["real"] = fake.url + "/v5/private"
+    user_stream.LISTEN_KEY_URLS["real"] = f"http://127.0.0.1:{rest.server_address[1]}"
+
+    binance = ("binance", "real", api_key)
+    bybit = ("bybit", "real", api_key)
+
+    # ---------- Binance: listenKey por REST → /ws/<listenKey>
+    user_stream.sync([("binance", "real", api_key, api_secret)])
+    check("listenKey pedida por REST", _wait_for(lambda: any(p.startswith("/ws/lk") for p in fake.paths)))
+    account = user_stream._get_account(*binance)
+    _wait_for(lambda: account._live)
+
+    started = time.time()
+    user_stream.seed(*binance, [{"symbol": "BTCUSDT", "positionAmt": "0", "positionSide": "BOTH"}], started)
+    fake.push("/ws/", {"e": "ACCOUNT_UPDATE", "a": {"P": [
+        {"s": "BTCUSDT", "pa": "0.5", "ep": "100", "up": "0", "ps": "BOTH"}
+    ]}})
+    check("ACCOUNT_UPDATE atualiza posições", _wait_for(lambda: any(
+        p["positionAmt"] == "0.5" for p in user_stream.get_positions(*binance) or []
+    )))
+
+    user_stream.trades_polled(*binance, "BTCUSDT", time.time())
+    due_before = user_stream.trades_due(*binance, "BTCUSDT")
+    fake.push("/ws/", {"e": "ORDER_TRADE_UPDATE", "o": {"s": "BTCUSDT", "x": "TRADE"}})
+    check("execução pede trades por REST",
+          not due_before and _wait_for(lambda: user_stream.trades_due(*binance, "BTCUSDT")))
+
+    account.maintain()
+    check("keepalive da listenKey", ("PUT", "/fapi/v1/listenKey") in rest.calls)
+
+    listen_keys = sum(1 for c in rest.calls if c == ("POST", "/fapi/v1/listenKey"))
+    fake.push("/ws/", {"e": "listenKeyExpired"})
+    check("listenKey expirada → nova listenKey", _wait_for(lambda: sum(
+        1 for c in rest.calls if c == ("POST", "/fapi/v1/listenKey")) > listen_keys))
+    check("snapshot descartado ao religar", user_stream.get_positions(*binance) is None)
+
+    # ---------- Bybit: auth assinada → subscribe → live
+    user_stream.sync([("bybit", "real", api_key, api_secret)])
+    check("auth Bybit com assinatura válida",
+          _wait_for(lambda: any(m.get("op") == "subscribe" for _, m in fake.received)))
+    subscribe = [m for _, m in fake.received if m.get("op") == "subscribe"][-1]
+    check("subscribe position/execution", subscribe["args"] == ["position", "execution"])
+
+    account = user_stream._get_account(*bybit)
+    _wait_for(lambda: account._live)
+    user_stream.seed(*bybit, [], time.time(), scope="USDT")
+    fake.push("/v5/private", {"topic": "position", "data": [
+        {"symbol": "ETHUSDT", "positionIdx": 0, "size": "2", "side": "Buy"}
+    ]})
+    check("evento position atualiza posições", _wait_for(lambda: any(
+        p["size"] == "2" for p in user_stream.get_positions(*bybit, scope="USDT") or []
+    )))
+
+    # queda → REST até semear outra vez
+    fake.drop("/v5/private")
+    check("queda invalida o snapshot",
+          _wait_for(lambda: user_stream.get_positions(*bybit, scope="USDT") is None))
+    auths = sum(1 for _, m in fake.received if m.get("op") == "auth")
+    check("religa e autentica de novo", _wait_for(lambda: sum(
+        1 for _, m in fake.received if m.get("op") == "auth") > auths))
+
+    user_stream.sync([])
+
+
+def bench_streams():
+    """
+    market_stream e user_stream contra um servidor WebSocket local: fecho
+    de candle (x=true), gap/queda/resync, listenKey e auth da Bybit.
+    Não é um benchmark de tempo: falha se algum passo não se verificar.
+    Requer websocket-client (requirements.txt) e websockets (servidor falso).
+    """
+    import importlib.util
+
+    missing = [m for m in ("websocket", "websockets") if importlib.util.find_spec(m) is None]
+    if missing:
+        # sem o servidor falso não há verificação: falha em vez de passar
+        print(f"FALHOU módulos em falta: {', '.join(missing)} "
+              f"(pip install websocket-client websockets)")
+        return False
+
+    import logger
+    import time_sync
+
+    api_key, api_secret = "bench-key", "bench-secret"
+    failures = []
+
+    def check(name, ok):
+        print(f"{'ok    ' if ok else 'FALHOU'} {name}")
+        if not ok:
+            failures.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # nada sai para a API real nem para o log do bot
+        logger.cfg["api"]["log_url"] = "http://127.0.0.1:9/"
+        logger.LOG_FILE = os.path.join(tmp, "bot.log")
+        time_sync.ENABLED = False
+
+        fake = _FakeWebSocket(api_key, api_secret)
+        rest = _mock_exchange(0)
+        try:
+            _check_market_stream(fake, check)
+            _check_user_stream(fake, rest, api_key, api_secret, check)
+        finally:
+            fake.stop()
+            rest.shutdown()
+
+    return not failures
+
+
+# =====================================================
+# ASSINATURA: hmac.new POR PEDIDO vs ESTADO PRÉ-CALCULADO
+# =====================================================
+def bench_signing(calls=200000):
+    """
+    Custo de assinar um query string de ordem (HMAC-SHA256), com
+    verificação de que as assinaturas são iguais.
+    """
+    import hmac
+    import hashlib
+    import signing
+
+    secret = "s" * 64
+    payloads = [
+        f"symbol=BTCUSDT&side=BUY&type=MARKET&quantity=0.01&timestamp={1700000000000 + i}"
+        for i in range(1000)
+    ]
+
+    mismatches = sum(
+        hmac.new(secret.encode(), p.encode(), hashlib.sha256).hexdigest() != signing.sign(secret, p)
+        for p in payloads
+    )
+
+    def run_old():
+        for i in range(calls):
+            hmac.new(secret.encode(), payloads[i % 1000].encode(), hashlib.sha256).hexdigest()
+
+    def run_new():
+        for i in range(calls):
+            signing.sign(secret, payloads[i % 1000])
+
+    t_old = _timeit(run_old, 1) / calls
+    t_new = _timeit(run_new, 1) / calls
+
+    print(f"assinaturas diferentes: {mismatches}")
+    print(f"hmac.new:        {t_old * 1e6:6.2f} µs/assinatura")
+    print(f"pré-calculado:   {t_new * 1e6:6.2f} µs/assinatura ({t_old / t_new:.1f}x)")
+
+    return mismatches == 0
+
+
+# =====================================================
+# BACKTEST: SINAIS VETORIZADOS vs falcon_signal / CICLO POR CANDLE
+# =====================================================
+def _ohlc(n, seed=42):
+    rng = np.random.default_rng(seed)
+    open_time, close = _random_walk(n, seed)
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    wick = np.abs(rng.normal(0, 0.001, (2, n)))
+    return {
+        "open_time": open_time,
+        "open": open_,
+        "high": np.maximum(open_, close) * (1 + wick[0]),
+        "low": np.minimum(open_, close) * (1 - wick[1]),
+        "close": close
+    }
+
+
+def _simulate_per_candle(data, sl_pct, tp_pct):
+    """
+    Referência: percorre candle a candle com falcon_signal/apply_risk
+    """
+    from strategy_falcon import falcon_signals, apply_risk
+
+    sides = falcon_signals(data["close"])
+    trades = []
+    position = None
+
+    for i in range(len(data["close"])):
+        if position is not None:
+            s, entry, stop, take, start = position
+            o, h, l = data["open"][i], data["high"][i], data["low"][i]
+            buy = s == "BUY"
+
+            if (o <= stop) if buy else (o >= stop):
+                exit_price = o
+            elif (o >= take) if buy else (o <= take):
+                exit_price = o
+            elif (l <= stop) if buy else (h >= stop):
+                exit_price = stop
+            elif (h >= take) if buy else (l <= take):
+                exit_price = take
+            else:
+                continue
+
+            trades.append((start, i, exit_price))
+            position = None
+
+        if position is None and sides[i]:
+            side = "BUY" if sides[i] > 0 else "SELL"
+            r = apply_risk({"side": side, "entry": data["close"][i]},
+                           {"StopLoss": sl_pct, "TakeProfit": tp_pct})
+            position = (side, r["entry"], r["stop"], r["take"], i)
+
+    return trades
+
+
+def bench_backtest(symbols=10, candles=105_120, sl=1.0, tp=2.0):
+    """
+    Paridade dos sinais vetorizados com falcon_signal (amostra de candles)
+    e da simulação com um ciclo por candle; tempo para `symbols` anos de 5m.
+    """
+    import backtest
+    from strategy_falcon import falcon_signal, falcon_signals
+
+    data = _ohlc(20_000)
+    df = pd.DataFrame({"close": data["close"]})
+    sides = falcon_signals(data["close"])
+
+    rng = np.random.default_rng(1)
+    sample = np.unique(np.concatenate((np.flatnonzero(sides)[:200], rng.integers(60, 20_000, 200))))
+    signal_mismatches = 0
+    for i in sample:
+        s = falcon_signal(df.iloc[:i + 1])
+        expected = 0 if s is None else (1 if s["side"] == "BUY" else -1)
+        signal_mismatches += expected != sides[i]
+
+    trades = backtest.simulate(data, sl, tp)
+    reference = _simulate_per_candle(data, sl, tp)
+    vectorized = list(zip(trades["entry_idx"], trades["exit_idx"], trades["exit"]))
+    trade_mismatches = sum(a != b for a, b in zip(vectorized, reference)) + abs(len(vectorized) - len(reference))
+
+    t_loop = _timeit(lambda: _simulate_per_candle(data, sl, tp), 1)
+    t_vec = _timeit(lambda: backtest.simulate(data, sl, tp), 3)
+
+    datasets = [_ohlc(candles, seed) for seed in range(symbols)]
+    start = time.perf_counter()
+    total = 0
+    for i, d in enumerate(datasets):
+        total += len(backtest.to_records(f"SYM{i}", d, backtest.simulate(d, sl, tp)))
+    t_all = time.perf_counter() - start
+
+    print(f"sinais diferentes: {signal_mismatches}/{len(sample)}")
+    print(f"trades diferentes: {trade_mismatches} ({len(reference)} trades)")
+    print(f"por candle:   {t_loop * 1000:8.1f} ms / 20k candles")
+    print(f"vetorizado:   {t_vec * 1000:8.1f} ms / 20k candles ({t_loop / t_vec:.0f}x)")
+    print(f"{symbols} símbolos x {candles} candles: {t_all:.2f}s, {total} trades")
+
+    return signal_mismatches == 0 and trade_mismatches == 0
+
+
+BENCHMARKS = {
+    "ema": bench_ema,
+    "log_writer": bench_log_writer,
+    "log_overhead": bench_log_overhead,
+    "orders": bench_orders,
+    "streams": bench_streams,
+    "signing": bench_signing,
+    "backtest": bench_backtest
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    ok = True
+
+    for name in names:
+        print(f"== {name}")
+        ok = BENCHMARKS[name]() is not False and ok
+
+    sys.exit(0 if ok else 1)
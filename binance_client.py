@@ -1,9 +1,29 @@
 import time
-import hmac
-import hashlib
-import requests
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlencode
+
+import yaml
+
+import rate_limit
+import signing
+import time_sync
+import position_cache
+
+from logger import log_debug, log_info, log_error
+
+# =====================================================
+# CONFIG
+# =====================================================
+cfg = yaml.safe_load(open("config.yaml"))
+
+ORDERS_CFG = cfg.get("orders", {}) or {}
+
+# SL/TP após o fill: "batch", "parallel" ou "sequential"
+PROTECTION_MODE = ORDERS_CFG.get("binance_protection", "batch")
+PROTECTION_WORKERS = int(ORDERS_CFG.get("protection_workers", 8))
 
-from logger import log_debug, log_error
 
 # =====================================================
 # UTILITÁRIOS
@@ -22,42 +42,54 @@ def _sign(secret: str, query: str) -> str:
     """
     Assinatura HMAC SHA256 exigida pela Binance
     """
-    return hmac.new(
-        secret.encode(),
-        query.encode(),
-        hashlib.sha256
-    ).hexdigest()
+    return signing.sign(secret, query)
 
 
 # =====================================================
 # VERIFICAR POSIÇÃO ABERTA
 # =====================================================
 
+def _fetch_positions(api_key, api_secret, env):
+    ts = time_sync.now_ms("binance", env)
+    query = f"timestamp={ts}"
+    signature = _sign(api_secret, query)
+
+    url = f"{_base_url(env)}/fapi/v2/positionRisk?{query}&signature={signature}"
+
+    r = rate_limit.request(
+        "binance", api_key, "position", "GET", url, weight=5,
+        headers={"X-MBX-APIKEY": api_key},
+        timeout=10
+    )
+
+    r.raise_for_status()
+    return r.json()
+
+
+def get_positions(api_key, api_secret, env="real"):
+    """
+    Todas as posições da conta (positionRisk), uma vez por ciclo e API key
+    """
+    return position_cache.get_positions(
+        "binance",
+        env,
+        api_key,
+        lambda: _fetch_positions(api_key, api_secret, env)
+    )
+
+
 def has_open_position(api_key, api_secret, symbol, env="real") -> bool:
     """
     Retorna True se existir posição aberta para o símbolo
     """
 
     try:
-        ts = int(time.time() * 1000)
-        query = f"timestamp={ts}"
-        signature = _sign(api_secret, query)
-
-        url = f"{_base_url(env)}/fapi/v2/positionRisk?{query}&signature={signature}"
-
         log_debug("binance", "A verificar posição aberta", {
             "symbol": symbol,
             "env": env
         })
 
-        r = requests.get(
-            url,
-            headers={"X-MBX-APIKEY": api_key},
-            timeout=10
-        )
-
-        r.raise_for_status()
-        positions = r.json()
+        positions = get_positions(api_key, api_secret, env)
 
         for p in positions:
             if p["symbol"] == symbol and float(p["positionAmt"]) != 0:
@@ -76,19 +108,22 @@ def has_open_position(api_key, api_secret, symbol, env="real") -> bool:
 # ENVIAR ORDEM (MARKET + SL + TP)
 # =====================================================
 
-def place_order(api_key, api_secret, symbol, side, qty, env="real", sl=None, tp=None):
+def place_order(api_key, api_secret, symbol, side, qty, env="real", sl=None, tp=None,
+                signal_time=None):
     """
-    Envia ordem MARKET e cria SL/TP separados
+    Envia ordem MARKET e, logo após o fill, o SL/TP (PROTECTION_MODE).
+    signal_time: time.time() do sinal, para medir sinal → posição protegida.
     """
 
     try:
         base = _base_url(env)
-        ts = int(time.time() * 1000)
+        start = time.time()
+        ts = time_sync.now_ms("binance", env)
 
         # -----------------------------
         # ORDEM MARKET
         # -----------------------------
-        order_side = "BUY" if side.upper() == "LONG" else "SELL"
+        order_side = "BUY" if side.upper() in ("BUY", "LONG") else "SELL"
 
         params = (
             f"symbol={symbol}"
@@ -109,42 +144,32 @@ def place_order(api_key, api_secret, symbol, side, qty, env="real", sl=None, tp=
             "env": env
         })
 
-        r = requests.post(
-            url,
+        r = rate_limit.request(
+            "binance", api_key, "order", "POST", url,
             headers={"X-MBX-APIKEY": api_key},
             timeout=10
         )
 
         r.raise_for_status()
         result = r.json()
+        filled = time.time()
 
-        # -----------------------------
-        # STOP LOSS
-        # -----------------------------
-        if sl:
-            _send_protection_order(
-                api_key,
-                api_secret,
-                symbol,
-                "SELL" if order_side == "BUY" else "BUY",
-                "STOP_MARKET",
-                sl,
-                env
-            )
+        # a conta mudou → o snapshot de posições deixa de valer
+        position_cache.invalidate("binance", env, api_key)
 
         # -----------------------------
-        # TAKE PROFIT
+        # STOP LOSS + TAKE PROFIT
         # -----------------------------
+        protections = []
+        if sl:
+            protections.append(("STOP_MARKET", sl))
         if tp:
-            _send_protection_order(
-                api_key,
-                api_secret,
-                symbol,
-                "SELL" if order_side == "BUY" else "BUY",
-                "TAKE_PROFIT_MARKET",
-                tp,
-                env
-            )
+            protections.append(("TAKE_PROFIT_MARKET", tp))
+
+        if protections:
+            close_side = "SELL" if order_side == "BUY" else "BUY"
+            results = _protect(api_key, api_secret, symbol, close_side, protections, env)
+            _record_protection(symbol, env, start, filled, signal_time, protections, results)
 
         return result
 
@@ -156,32 +181,56 @@ def place_order(api_key, api_secret, symbol, side, qty, env="real", sl=None, tp=
 # =====================================================
 # SL / TP (ORDENS DE PROTEÇÃO)
 # =====================================================
-
-def _send_protection_order(api_key, api_secret, symbol, order_type, price, env):
+#
+# batch:      um POST /fapi/v1/batchOrders com SL + TP
+# parallel:   SL e TP em POSTs simultâneos
+# sequential: SL e depois TP (comportamento antigo)
+
+_protection_pool = ThreadPoolExecutor(
+    max_workers=PROTECTION_WORKERS,
+    thread_name_prefix="binance-protection"
+)
+
+_order_stats_lock = threading.Lock()
+_order_stats = {
+    "orders": 0,
+    "protected": 0,
+    "unprotected": 0,
+    "protect_ms_total": 0.0,
+    "signal_to_protected_ms_total": 0.0,
+    "signal_to_protected_ms_max": 0.0
+}
+
+
+def _protection_params(symbol, side, order_type, price) -> dict:
+    return {
+        "symbol": symbol,
+        "side": side,
+        "type": order_type,
+        "stopPrice": str(round(float(price), 2)),
+        "closePosition": "true",
+        "workingType": "MARK_PRICE"
+    }
+
+
+def _send_protection_order(api_key, api_secret, symbol, side, order_type, price, env):
     try:
-        ts = int(time.time() * 1000)
-        price = round(float(price), 2)
+        order = _protection_params(symbol, side, order_type, price)
+        ts = time_sync.now_ms("binance", env)
 
-        params = (
-            f"symbol={symbol}"
-            f"&type={order_type}"
-            f"&stopPrice={price}"
-            f"&closePosition=true"
-            f"&workingType=MARK_PRICE"
-            f"&timestamp={ts}"
-        )
+        params = urlencode(order) + f"&timestamp={ts}"
 
         signature = _sign(api_secret, params)
         url = f"{_base_url(env)}/fapi/v1/order?{params}&signature={signature}"
 
         log_debug("binance", f"A enviar {order_type}", {
             "symbol": symbol,
-            "price": price,
+            "price": order["stopPrice"],
             "env": env
         })
 
-        r = requests.post(
-            url,
+        r = rate_limit.request(
+            "binance", api_key, "order", "POST", url,
             headers={"X-MBX-APIKEY": api_key},
             timeout=10
         )
@@ -193,31 +242,129 @@ def _send_protection_order(api_key, api_secret, symbol, order_type, price, env):
         log_error("binance", f"Erro ao enviar {order_type}", e)
         return None
 
-def get_closed_trades(api_key, api_secret, symbol, env="real", limit=20):
+
+def _send_batch_orders(api_key, api_secret, orders, env):
     """
-    Retorna trades FECHADOS (Binance Futures)
+    Lista de resultados na ordem de `orders` (None nos que falharam)
     """
     try:
-        base = _base_url(env)
-        ts = int(time.time() * 1000)
+        ts = time_sync.now_ms("binance", env)
+        batch = json.dumps(orders, separators=(",", ":"))
 
-        # ----------------------------------
-        # 1️⃣ Verificar se posição está fechada
-        # ----------------------------------
-        query_pos = f"timestamp={ts}"
-        sign_pos = _sign(api_secret, query_pos)
+        params = f"batchOrders={quote(batch)}&timestamp={ts}"
+
+        signature = _sign(api_secret, params)
+        url = f"{_base_url(env)}/fapi/v1/batchOrders?{params}&signature={signature}"
 
-        url_pos = f"{base}/fapi/v2/positionRisk?{query_pos}&signature={sign_pos}"
+        log_debug("binance", "A enviar ordens de proteção (batch)", orders)
 
-        r_pos = requests.get(
-            url_pos,
+        r = rate_limit.request(
+            "binance", api_key, "order", "POST", url, weight=5,
             headers={"X-MBX-APIKEY": api_key},
             timeout=10
         )
-        r_pos.raise_for_status()
 
-        positions = r_pos.json()
-        pos = next((p for p in positions if p["symbol"] == symbol), None)
+        r.raise_for_status()
+
+        results = []
+        for order, res in zip(orders, r.json()):
+            # erros individuais vêm como {"code": ..., "msg": ...}
+            if "orderId" not in res:
+                log_error("binance", f"Erro ao enviar {order['type']}", res.get("msg"))
+                res = None
+            results.append(res)
+        return results
+
+    except Exception as e:
+        log_error("binance", "Erro ao enviar ordens de proteção (batch)", e)
+        return [None] * len(orders)
+
+
+def _protect(api_key, api_secret, symbol, side, protections, env):
+    if PROTECTION_MODE == "batch" and len(protections) > 1:
+        orders = [_protection_params(symbol, side, t, p) for t, p in protections]
+        return _send_batch_orders(api_key, api_secret, orders, env)
+
+    if PROTECTION_MODE == "parallel" and len(protections) > 1:
+        futures = [
+            _protection_pool.submit(
+                _send_protection_order, api_key, api_secret, symbol, side, t, p, env
+            )
+            for t, p in protections
+        ]
+        return [f.result() for f in futures]
+
+    return [
+        _send_protection_order(api_key, api_secret, symbol, side, t, p, env)
+        for t, p in protections
+    ]
+
+
+def _record_protection(symbol, env, start, filled, signal_time, protections, results):
+    done = time.time()
+    origin = signal_time or start
+    ok = all(r is not None for r in results)
+
+    timing = {
+        "symbol": symbol,
+        "env": env,
+        "mode": PROTECTION_MODE,
+        "market_ms": round((filled - start) * 1000, 1),
+        "protect_ms": round((done - filled) * 1000, 1),
+        "signal_to_protected_ms": round((done - origin) * 1000, 1)
+    }
+
+    with _order_stats_lock:
+        _order_stats["orders"] += 1
+        _order_stats["protected" if ok else "unprotected"] += 1
+        _order_stats["protect_ms_total"] += timing["protect_ms"]
+        _order_stats["signal_to_protected_ms_total"] += timing["signal_to_protected_ms"]
+        _order_stats["signal_to_protected_ms_max"] = max(
+            _order_stats["signal_to_protected_ms_max"],
+            timing["signal_to_protected_ms"]
+        )
+
+    if ok:
+        log_info("binance", "Posição protegida (SL/TP)", timing)
+    else:
+        timing["failed"] = [t for (t, _), r in zip(protections, results) if r is None]
+        log_error("binance", "Posição sem proteção completa", timing)
+
+
+def get_order_stats() -> dict:
+    with _order_stats_lock:
+        stats = dict(_order_stats)
+
+    n = stats.pop("orders")
+    protect_total = stats.pop("protect_ms_total")
+    signal_total = stats.pop("signal_to_protected_ms_total")
+
+    stats["orders"] = n
+    stats["protect_ms_avg"] = round(protect_total / n, 1) if n else 0.0
+    stats["signal_to_protected_ms_avg"] = round(signal_total / n, 1) if n else 0.0
+    return stats
+
+
+# =====================================================
+# TRADES FECHADOS
+# =====================================================
+
+USER_TRADES_PAGE_LIMIT = 1000
+USER_TRADES_MAX_PAGES = 20
+
+
+def get_closed_trades(api_key, api_secret, symbol, env="real", limit=20, from_id=None):
+    """
+    Retorna trades FECHADOS (Binance Futures)
+    """
+    try:
+        base = _base_url(env)
+
+        # ----------------------------------
+        # 1️⃣ Verificar se posição está fechada
+        # ----------------------------------
+        positions = get_positions(api_key, api_secret, env)
+        pos = position_cache.find_position(positions, symbol)
 
         if not pos or float(pos["positionAmt"]) != 0:
             return []
@@ -225,43 +372,59 @@ def get_closed_trades(api_key, api_secret, symbol, env="real", limit=20):
         # ----------------------------------
         # 2️⃣ Buscar trades executados
         # ----------------------------------
-        query = (
-            f"symbol={symbol}"
-            f"&limit={limit}"
-            f"&timestamp={ts}"
-        )
-
-        sign = _sign(api_secret, query)
-        url = f"{base}/fapi/v1/userTrades?{query}&signature={sign}"
-
+        # Com from_id: todos os trades a partir desse id (paginado);
+        # sem from_id: os últimos `limit`.
         log_debug("binance", "A obter trades fechados", {
             "symbol": symbol,
-            "env": env
+            "env": env,
+            "from_id": from_id
         })
 
-        r = requests.get(
-            url,
-            headers={"X-MBX-APIKEY": api_key},
-            timeout=10
-        )
-        r.raise_for_status()
-
-        trades = r.json()
-
         closed = []
-        for t in trades:
-            closed.append({
-                "orderId": t["orderId"],
-                "symbol": t["symbol"],
-                "side": t["side"],
-                "entry_price": float(t["price"]),
-                "exit_price": float(t["price"]),  # market fill
-                "qty": float(t["qty"]),
-                "fee": float(t["commission"]),
-                "pnl": float(t.get("realizedPnl", 0)),
-                "createdTime": t["time"],
-                "updatedTime": t["time"]
-            })
+
+        for _ in range(USER_TRADES_MAX_PAGES):
+            ts = time_sync.now_ms("binance", env)
+
+            if from_id is None:
+                query = f"symbol={symbol}&limit={limit}&timestamp={ts}"
+            else:
+                query = (
+                    f"symbol={symbol}"
+                    f"&fromId={from_id}"
+                    f"&limit={USER_TRADES_PAGE_LIMIT}"
+                    f"&timestamp={ts}"
+                )
+
+            sign = _sign(api_secret, query)
+            url = f"{base}/fapi/v1/userTrades?{query}&signature={sign}"
+
+            r = rate_limit.request(
+                "binance", api_key, "history", "GET", url, weight=5,
+                headers={"X-MBX-APIKEY": api_key},
+                timeout=10
+            )
+            r.raise_for_status()
+
+            trades = r.json()
+
+            for t in trades:
+                closed.append({
+                    "orderId": t["orderId"],
+                    "tradeId": t["id"],
+                    "symbol": t["symbol"],
+                    "side": t["side"],
+                    "entry_price": float(t["price"]),
+                    "exit_price": float(t["price"]),  # market fill
+                    "qty": float(t["qty"]),
+                    "fee": float(t["commission"]),
+                    "pnl": float(t.get("realizedPnl", 0)),
+                    "createdTime": t["time"],
+                    "updatedTime": t["time"]
+                })
+
+            if from_id is None or len(trades) < USER_TRADES_PAGE_LIMIT:
+                break
+            from_id = max(t["id"] for t in trades) + 1
 
         return closed
 
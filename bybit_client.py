@@ -1,7 +1,8 @@
 import time
-import hmac
-import hashlib
-import requests
+import rate_limit
+import signing
+import time_sync
+import position_cache
 import json
 
 from logger import log_debug, log_error
@@ -17,11 +18,7 @@ def _base_url(env: str) -> str:
 
 
 def _sign(secret: str, payload: str) -> str:
-    return hmac.new(
-        secret.encode(),
-        payload.encode(),
-        hashlib.sha256
-    ).hexdigest()
+    return signing.sign(secret, payload)
 
 
 def _headers(api_key: str, sign: str, ts: str) -> dict:
@@ -37,31 +34,69 @@ def _headers(api_key: str, sign: str, ts: str) -> dict:
 # 🔎 VERIFICAR POSIÇÃO ABERTA (FUTURES LINEAR)
 # =====================================================
 
-def has_open_position(api_key, api_secret, symbol, env="real") -> bool:
-    try:
-        log_debug("bybit_client", "A verificar posição aberta", {
-            "symbol": symbol,
-            "env": env
-        })
+POSITION_PAGE_LIMIT = 200
 
-        ts = str(int(time.time() * 1000))
-        query = f"category=linear&symbol={symbol}"
 
+def _settle_coin(symbol: str) -> str:
+    return "USDC" if symbol.endswith(("USDC", "PERP")) else "USDT"
+
+
+def _fetch_positions(api_key, api_secret, settle_coin, env):
+    positions = []
+    cursor = None
+
+    while True:
+        query = f"category=linear&settleCoin={settle_coin}&limit={POSITION_PAGE_LIMIT}"
+        if cursor:
+            query += f"&cursor={cursor}"
+
+        ts = str(time_sync.now_ms("bybit", env))
         sign_payload = ts + api_key + RECV_WINDOW + query
         sign = _sign(api_secret, sign_payload)
 
         url = f"{_base_url(env)}/v5/position/list?{query}"
 
-        r = requests.get(
-            url,
+        r = rate_limit.request(
+            "bybit", api_key, "position", "GET", url,
             headers=_headers(api_key, sign, ts),
             timeout=10
         )
 
         r.raise_for_status()
-        data = r.json()
+        result = r.json().get("result", {}) or {}
+
+        positions.extend(result.get("list", []))
+
+        cursor = result.get("nextPageCursor")
+        if not cursor:
+            return positions
+
+
+def get_positions(api_key, api_secret, settle_coin="USDT", env="real"):
+    """
+    Todas as posições lineares da conta (por settleCoin), uma vez por
+    ciclo e API key
+    """
+    return position_cache.get_positions(
+        "bybit",
+        env,
+        api_key,
+        lambda: _fetch_positions(api_key, api_secret, settle_coin, env),
+        scope=settle_coin
+    )
+
+
+def has_open_position(api_key, api_secret, symbol, env="real") -> bool:
+    try:
+        log_debug("bybit_client", "A verificar posição aberta", {
+            "symbol": symbol,
+            "env": env
+        })
 
-        positions = data.get("result", {}).get("list", [])
+        positions = [
+            p for p in get_positions(api_key, api_secret, _settle_coin(symbol), env)
+            if p.get("symbol") == symbol
+        ]
         log_debug("bybit_client", "Resultado posição aberta", positions)
 
         for p in positions:
@@ -81,7 +116,7 @@ def has_open_position(api_key, api_secret, symbol, env="real") -> bool:
 
 def place_order(api_key, api_secret, symbol, side, qty, env="real", sl=None, tp=None):
     try:
-        ts = str(int(time.time() * 1000))
+        ts = str(time_sync.now_ms("bybit", env))
 
         order_side = "Buy" if side.upper() == "BUY" else "Sell"
 
@@ -109,8 +144,8 @@ def place_order(api_key, api_secret, symbol, side, qty, env="real", sl=None, tp=
 
         url = f"{_base_url(env)}/v5/order/create"
 
-        r = requests.post(
-            url,
+        r = rate_limit.request(
+            "bybit", api_key, "order", "POST", url,
             headers=_headers(api_key, sign, ts),
             data=body,
             timeout=10
@@ -119,6 +154,9 @@ def place_order(api_key, api_secret, symbol, side, qty, env="real", sl=None, tp=
         r.raise_for_status()
         result = r.json()
 
+        # a conta mudou → o snapshot de posições deixa de valer
+        position_cache.invalidate("bybit", env, api_key)
+
         log_debug("bybit_client", "Resposta Bybit (order)", result)
         return result
 
@@ -130,56 +168,75 @@ def place_order(api_key, api_secret, symbol, side, qty, env="real", sl=None, tp=
 # 📊 OBTER TRADES FECHADOS (REALIZED PNL)
 # =====================================================
 
-def get_closed_trades(api_key, api_secret, symbol, env="real", limit=20):
+CLOSED_PNL_WINDOW_MS = 7 * 24 * 3600 * 1000  # a Bybit só aceita startTime nos últimos 7 dias
+CLOSED_PNL_PAGE_LIMIT = 100
+CLOSED_PNL_MAX_PAGES = 20
+
+
+def _parse_closed_trade(t):
+    return {
+        "orderId": t.get("orderId"),
+        "symbol": t.get("symbol"),
+        "side": t.get("side"),
+        "entry_price": float(t.get("entryPrice", 0)),
+        "exit_price": float(t.get("exitPrice", 0)),
+        "qty": float(t.get("qty", 0)),
+        "fee": float(t.get("cumExecFee", 0)),
+        "pnl": float(t.get("closedPnl", 0)),
+        "createdTime": t.get("createdTime"),
+        "updatedTime": t.get("updatedTime")
+    }
+
+
+def get_closed_trades(api_key, api_secret, symbol, env="real", limit=20, start_time=None):
     """
-    Retorna trades FECHADOS com PnL realizado
+    Retorna trades FECHADOS com PnL realizado.
+    Com start_time (ms) devolve todos os trades desde esse instante
+    (inclusive, paginado); sem start_time devolve os últimos `limit`.
     """
     try:
-        ts = str(int(time.time() * 1000))
-
-        query = (
-            f"category=linear"
-            f"&symbol={symbol}"
-            f"&limit={limit}"
-        )
+        base_query = f"category=linear&symbol={symbol}"
 
-        sign_payload = ts + api_key + RECV_WINDOW + query
-        sign = _sign(api_secret, sign_payload)
-
-        url = f"{_base_url(env)}/v5/position/closed-pnl?{query}"
+        if start_time is None:
+            base_query += f"&limit={limit}"
+        else:
+            min_start = int(time.time() * 1000) - CLOSED_PNL_WINDOW_MS + 60_000
+            start_time = max(int(start_time), min_start)
+            base_query += f"&limit={CLOSED_PNL_PAGE_LIMIT}&startTime={start_time}"
 
         log_debug("bybit_client", "A obter trades fechados", {
             "symbol": symbol,
             "env": env,
-            "limit": limit
+            "limit": limit,
+            "start_time": start_time
         })
 
-        r = requests.get(
-            url,
-            headers=_headers(api_key, sign, ts),
-            timeout=10
-        )
+        parsed = []
+        cursor = None
 
-        r.raise_for_status()
-        data = r.json()
+        for _ in range(CLOSED_PNL_MAX_PAGES):
+            query = base_query + (f"&cursor={cursor}" if cursor else "")
 
-        trades = data.get("result", {}).get("list", [])
+            ts = str(time_sync.now_ms("bybit", env))
+            sign_payload = ts + api_key + RECV_WINDOW + query
+            sign = _sign(api_secret, sign_payload)
 
-        parsed = []
-        for t in trades:
-            parsed_trade = {
-                "orderId": t.get("orderId"),
-                "symbol": t.get("symbol"),
-                "side": t.get("side"),
-                "entry_price": float(t.get("entryPrice", 0)),
-                "exit_price": float(t.get("exitPrice", 0)),
-                "qty": float(t.get("qty", 0)),
-                "fee": float(t.get("cumExecFee", 0)),
-                "pnl": float(t.get("closedPnl", 0)),
-                "createdTime": t.get("createdTime"),
-                "updatedTime": t.get("updatedTime")
-            }
-            parsed.append(parsed_trade)
+            url = f"{_base_url(env)}/v5/position/closed-pnl?{query}"
+
+            r = rate_limit.request(
+                "bybit", api_key, "history", "GET", url,
+                headers=_headers(api_key, sign, ts),
+                timeout=10
+            )
+
+            r.raise_for_status()
+            result = r.json().get("result", {}) or {}
+
+            parsed.extend(_parse_closed_trade(t) for t in result.get("list", []))
+
+            cursor = result.get("nextPageCursor")
+            if start_time is None or not cursor:
+                break
 
         log_debug("bybit_client", "Trades fechados obtidos", parsed)
         return parsed
@@ -0,0 +1,65 @@
+import time
+
+from cycle_cache import CycleCache
+from kline_buffer import INTERVAL_MS
+from market_data import get_candles_binance
+
+
+# =====================================================
+# CACHE DE CANDLES (PARTILHADO ENTRE CLIENTES)
+# =====================================================
+#
+# Chave: (env, symbol, interval)
+# Cada chave é obtida uma única vez por ciclo e partilhada por todos
+# os clientes. A entrada expira quando abre o próximo candle ou quando
+# começa um novo ciclo (begin_cycle).
+
+_cache = CycleCache("candle_cache", "Estatísticas da cache de candles")
+
+
+def interval_seconds(interval: str) -> int:
+    return INTERVAL_MS[interval] // 1000
+
+
+def next_candle_open(interval: str, now=None) -> float:
+    """
+    Timestamp (segundos) da abertura do próximo candle
+    """
+    step = interval_seconds(interval)
+    now = time.time() if now is None else now
+    return (int(now // step) + 1) * step
+
+
+# =====================================================
+# API
+# =====================================================
+def get_candles(symbol, interval="5m", env="real"):
+    """
+    Igual a get_candles_binance, mas partilhado por (env, symbol, interval).
+    O DataFrame devolvido é partilhado entre clientes: não deve ser alterado.
+    """
+    # um lock por chave: clientes do mesmo símbolo esperam pelo 1º pedido;
+    # falhas (None/vazio) não ficam em cache
+    return _cache.get(
+        (env, symbol, interval),
+        lambda: get_candles_binance(symbol, interval=interval, env=env),
+        expires=next_candle_open(interval),
+        keep=lambda df: df is not None and not df.empty
+    )
+
+
+def invalidate(symbol=None, interval=None, env=None):
+    def match(key):
+        k_env, k_symbol, k_interval = key
+        return (
+            (symbol is None or k_symbol == symbol)
+            and (interval is None or k_interval == interval)
+            and (env is None or k_env == env)
+        )
+
+    _cache.invalidate(match)
+
+
+begin_cycle = _cache.begin_cycle
+get_stats = _cache.get_stats
+log_stats = _cache.log_stats
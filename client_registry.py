@@ -0,0 +1,296 @@
+import os
+import json
+import hashlib
+import threading
+
+import yaml
+
+import signing
+from api_client import fetch_clients
+from logger import log_debug, log_error, log_info
+
+# =====================================================
+# CONFIG
+# =====================================================
+cfg = yaml.safe_load(open("config.yaml"))
+
+CLIENTS_CFG = cfg.get("clients", {}) or {}
+
+CACHE_FILE = CLIENTS_CFG.get("cache_file", "/var/lib/iforextrading/clients_cache.json")
+DELTA_PARAM = CLIENTS_CFG.get("delta_param") or None
+
+
+# =====================================================
+# REGISTO DE CLIENTES (CACHE + DELTAS)
+# =====================================================
+#
+# A lista de clientes fica em memória e em disco (última lista boa):
+# se a API de configuração falhar, o bot continua com a última lista.
+# Os pedidos são condicionais (ETag / If-Modified-Since → 304) e, se a
+# API suportar, por versão (DELTA_PARAM=<versão> → só os alterados).
+# Cada registo é validado/normalizado (prepare) só quando muda.
+#
+# Uma lista simples é a lista completa e fica tal como veio (o mesmo
+# cliente pode ter várias linhas, uma por símbolo). Resposta delta:
+#   {"version": ..., "clients": [alterados/novos], "removed": [...]}
+# Nos deltas cada linha é identificada por (IDCliente, TipoMoeda); em
+# "removed" pode vir o IDCliente (todas as linhas do cliente), o par
+# [IDCliente, TipoMoeda] ou {"IDCliente": ..., "TipoMoeda": ...}.
+
+_lock = threading.Lock()
+_clients = []     # registos pela ordem da API
+_contexts = {}    # chave → (registo, fingerprint, contexto ou None)
+_meta = {"etag": None, "last_modified": None, "version": None}
+_loaded = False
+_prepare = None
+
+_stats = {
+    "full": 0,
+    "delta": 0,
+    "not_modified": 0,
+    "errors": 0,
+    "prepared": 0
+}
+
+
+def configure(prepare):
+    """
+    prepare(registo) → contexto normalizado ou None (cliente ignorado)
+    """
+    global _prepare
+    _prepare = prepare
+
+
+def _fingerprint(record):
+    return hashlib.sha1(
+        json.dumps(record, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _record_key(record):
+    """
+    (IDCliente, TipoMoeda) ou None se o registo não tiver IDCliente
+    """
+    idcliente = record.get("IDCliente")
+    if idcliente in (None, ""):
+        return None
+    return (str(idcliente), str(record.get("TipoMoeda") or ""))
+
+
+def _context_key(record):
+    # registos sem IDCliente: identificados pelo conteúdo
+    return _record_key(record) or ("?", _fingerprint(record))
+
+
+# -------------------------------------------------
+# CACHE EM DISCO
+# -------------------------------------------------
+def _save_locked():
+    try:
+        os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+        tmp = CACHE_FILE + ".tmp"
+
+        # contém as API keys dos clientes → só o utilizador do bot lê
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({
+                "meta": _meta,
+                "clients": _clients
+            }, f, ensure_ascii=False, default=str)
+
+        os.replace(tmp, CACHE_FILE)
+    except Exception as e:
+        log_error("client_registry", "Erro ao gravar cache de clientes", e)
+
+
+def _load_locked():
+    global _loaded
+
+    if _loaded:
+        return
+    _loaded = True
+
+    if not os.path.exists(CACHE_FILE):
+        return
+
+    try:
+        with open(CACHE_FILE) as f:
+            data = json.load(f)
+    except Exception as e:
+        log_error("client_registry", "Erro ao ler cache de clientes", e)
+        return
+
+    _replace_locked(data.get("clients") or [])
+    _meta.update(data.get("meta") or {})
+
+    log_info("client_registry", "Clientes carregados da cache", {"clients": len(_clients)})
+
+
+# -------------------------------------------------
+# APLICAR ALTERAÇÕES
+# -------------------------------------------------
+def _replace_locked(clients):
+    _clients[:] = clients
+
+    keys = {_context_key(r) for r in _clients}
+    for key in list(_contexts):
+        if key not in keys:
+            _contexts.pop(key, None)
+
+
+def _upsert_locked(clients):
+    index = {}
+    for i, record in enumerate(_clients):
+        key = _record_key(record)
+        if key is not None:
+            index.setdefault(key, i)
+
+    for record in clients:
+        key = _record_key(record)
+        if key is None:
+            log_info("client_registry", "Aviso: registo do delta sem IDCliente, ignorado", record)
+            continue
+
+        if key in index:
+            _clients[index[key]] = record
+        else:
+            index[key] = len(_clients)
+            _clients.append(record)
+
+
+def _removed_match(spec):
+    if isinstance(spec, dict):
+        key = _record_key(spec)
+        if key is None:
+            return None
+        return lambda k: k == key
+
+    if isinstance(spec, (list, tuple)) and len(spec) == 2:
+        key = (str(spec[0]), str(spec[1] or ""))
+        return lambda k: k == key
+
+    idcliente = str(spec)
+    return lambda k: k[0] == idcliente
+
+
+def _remove_locked(specs):
+    for spec in specs:
+        match = _removed_match(spec)
+        if match is None:
+            log_info("client_registry", "Aviso: remoção do delta sem IDCliente, ignorada", spec)
+            continue
+
+        kept = []
+        for record in _clients:
+            key = _record_key(record)
+            if key is not None and match(key):
+                _contexts.pop(key, None)
+            else:
+                kept.append(record)
+        _clients[:] = kept
+
+
+def _secrets_locked():
+    return {r.get("CorretoraClientAPISecret") for r in _clients} - {None, ""}
+
+
+def _apply(response):
+    data = response.json()
+
+    with _lock:
+        secrets = _secrets_locked()
+
+        if isinstance(data, list):
+            _replace_locked(data)
+            _meta["version"] = None
+            _stats["full"] += 1
+        else:
+            _upsert_locked(data.get("clients") or [])
+            _remove_locked(data.get("removed") or [])
+            _meta["version"] = data.get("version")
+            _stats["delta"] += 1
+
+        _meta["etag"] = response.headers.get("ETag")
+        _meta["last_modified"] = response.headers.get("Last-Modified")
+        _save_locked()
+
+        # secrets de clientes removidos ou rodados → fora da cache do signing
+        retired = secrets - _secrets_locked()
+
+    for secret in retired:
+        signing.forget(secret)
+
+
+# =====================================================
+# API
+# =====================================================
+def refresh() -> list:
+    """
+    Atualiza a lista (se mudou) e devolve os clientes atuais.
+    Em caso de erro devolve a última lista boa (memória ou disco).
+    """
+    with _lock:
+        _load_locked()
+        etag = _meta["etag"]
+        last_modified = _meta["last_modified"]
+        version = _meta["version"]
+
+    params = {DELTA_PARAM: version} if DELTA_PARAM and version is not None else None
+
+    try:
+        r = fetch_clients(etag=etag, last_modified=last_modified, params=params)
+
+        if r.status_code == 304:
+            with _lock:
+                _stats["not_modified"] += 1
+        else:
+            _apply(r)
+
+    except Exception as e:
+        with _lock:
+            _stats["errors"] += 1
+            cached = len(_clients)
+        log_error("client_registry", "Erro ao obter clientes, a usar a última lista", e)
+        log_debug("client_registry", "Clientes em cache", {"clients": cached})
+
+    return get_clients()
+
+
+def get_clients() -> list:
+    with _lock:
+        return list(_clients)
+
+
+def get_context(record):
+    """
+    Contexto normalizado do cliente (prepare só corre quando o registo muda)
+    """
+    key = _context_key(record)
+
+    with _lock:
+        cached = _contexts.get(key)
+
+    # o mesmo objeto → registo não mudou desde a última preparação
+    if cached is not None and cached[0] is record:
+        return cached[2]
+
+    fp = _fingerprint(record)
+    if cached is not None and cached[1] == fp:
+        ctx = cached[2]
+    else:
+        ctx = _prepare(record) if _prepare is not None else record
+        with _lock:
+            _stats["prepared"] += 1
+
+    with _lock:
+        _contexts[key] = (record, fp, ctx)
+
+    return ctx
+
+
+def get_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["clients"] = len(_clients)
+        stats["version"] = _meta["version"]
+    return stats
@@ -0,0 +1,104 @@
+import time
+import threading
+from contextlib import contextmanager
+
+from logger import log_debug
+
+
+# =====================================================
+# CACHE POR CICLO COM LOCK POR CHAVE
+# =====================================================
+#
+# Base de candle_cache, signals e position_cache: cada chave é calculada
+# uma vez por ciclo e os pedidos concorrentes da mesma chave esperam pelo
+# primeiro. begin_cycle só descarta os valores; os locks por chave vivem
+# enquanto houver quem os use (contagem), por isso uma thread que ainda
+# tem o lock (ex.: scheduler candle_close) nunca fica com um lock órfão.
+
+class CycleCache:
+
+    def __init__(self, module, message):
+        """
+        module/message: usados no log_stats
+        """
+        self.module = module
+        self.message = message
+
+        self._values = {}     # chave → (valor, expira em ou None)
+        self._key_locks = {}  # chave → [lock, utilizadores]
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    @contextmanager
+    def key_lock(self, key):
+        with self._lock:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._key_locks.pop(key, None)
+
+    def get(self, key, compute, expires=None, keep=None):
+        """
+        Valor da chave; compute() só é chamado uma vez por ciclo (ou depois
+        de `expires`, timestamp). Erros de compute() propagam e não ficam em
+        cache; com keep, só fica em cache o valor para o qual keep(v) é True.
+        """
+        with self.key_lock(key):
+            with self._lock:
+                entry = self._values.get(key)
+                if entry is not None and (entry[1] is None or time.time() < entry[1]):
+                    self._stats["hits"] += 1
+                    return entry[0]
+                self._stats["misses"] += 1
+
+            value = compute()
+
+            with self._lock:
+                if keep is None or keep(value):
+                    self._values[key] = (value, expires)
+                else:
+                    self._values.pop(key, None)
+
+            return value
+
+    def invalidate(self, match=None) -> int:
+        """
+        Descarta as chaves para as quais match(chave) é True (todas sem match)
+        """
+        with self._lock:
+            keys = [k for k in self._values if match is None or match(k)]
+            for key in keys:
+                self._values.pop(key, None)
+        return len(keys)
+
+    def begin_cycle(self):
+        """
+        Início de um novo ciclo: os valores voltam a ser calculados uma vez
+        """
+        with self._lock:
+            self._values.clear()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._stats[name] = self._stats.get(name, 0) + n
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._values)
+
+        total = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / total, 3) if total else 0.0
+        return stats
+
+    def log_stats(self):
+        log_debug(self.module, self.message, self.get_stats)
@@ -0,0 +1,133 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from logger import log_debug, log_error
+
+# =====================================================
+# CONFIG
+# =====================================================
+cfg = yaml.safe_load(open("config.yaml"))
+
+MAX_WORKERS = int(cfg.get("bot", {}).get("max_workers", 16))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Estatísticas do último ciclo (consultáveis por outros módulos)
+last_cycle_stats = {}
+
+
+# =====================================================
+# POOL DE WORKERS
+# =====================================================
+def _get_executor(max_workers):
+    global _executor
+
+    with _executor_lock:
+        if _executor is None or _executor._max_workers != max_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="client"
+            )
+        return _executor
+
+
+def _run_client(handler, c):
+    """
+    Processa um cliente isolando os erros (igual ao try/except do loop antigo)
+    """
+    try:
+        handler(c)
+        return True
+    except Exception as e:
+        log_error(
+            "main",
+            "Erro ao processar cliente",
+            e,
+            idcliente=c.get("IDCliente")
+        )
+        return False
+
+
+async def _run_client_async(handler, c, semaphore):
+    async with semaphore:
+        try:
+            await handler(c)
+            return True
+        except Exception as e:
+            log_error(
+                "main",
+                "Erro ao processar cliente",
+                e,
+                idcliente=c.get("IDCliente")
+            )
+            return False
+
+
+def _run_async(clients, handler, workers):
+    """
+    Handler async: todos os clientes num event loop, no máximo `workers`
+    em simultâneo. O I/O bloqueante (asyncio.to_thread) corre num pool
+    próprio do ciclo, fechado no fim do ciclo.
+    """
+    async def run_all():
+        semaphore = asyncio.Semaphore(workers)
+        return await asyncio.gather(
+            *(_run_client_async(handler, c, semaphore) for c in clients)
+        )
+
+    loop = asyncio.new_event_loop()
+    loop.set_default_executor(
+        ThreadPoolExecutor(max_workers=workers, thread_name_prefix="client-io")
+    )
+
+    try:
+        return loop.run_until_complete(run_all())
+    finally:
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+
+# =====================================================
+# CICLO
+# =====================================================
+def run_cycle(clients, handler, max_workers=None):
+    """
+    Processa todos os clientes em paralelo, num pool limitado.
+
+    Cada cliente corre numa única tarefa, por isso os passos de um
+    cliente (trades fechados → posição → candles → ordem) mantêm a ordem.
+    O handler pode ser uma função ou uma coroutine function (async def).
+    Retorna as estatísticas do ciclo (inclui o tempo total).
+    """
+    global last_cycle_stats
+
+    start = time.monotonic()
+    workers = max(1, int(max_workers or MAX_WORKERS))
+
+    if asyncio.iscoroutinefunction(handler):
+        results = _run_async(clients, handler, workers) if clients else []
+    elif workers == 1 or len(clients) <= 1:
+        results = [_run_client(handler, c) for c in clients]
+    else:
+        executor = _get_executor(workers)
+        futures = [executor.submit(_run_client, handler, c) for c in clients]
+        results = [f.result() for f in futures]
+
+    stats = {
+        "clients": len(clients),
+        "ok": sum(1 for r in results if r),
+        "errors": sum(1 for r in results if not r),
+        "workers": workers,
+        "wall_time": round(time.monotonic() - start, 3)
+    }
+
+    last_cycle_stats = stats
+    log_debug("engine", "Ciclo concluído", stats)
+    return stats
@@ -0,0 +1,171 @@
+import asyncio
+from abc import ABC, abstractmethod
+
+import bybit_client
+import binance_client
+
+
+# =====================================================
+# INTERFACE COMUM DAS CORRETORAS
+# =====================================================
+#
+# O loop principal só fala com adapters (get_adapter(corretora)); cada
+# corretora implementa posições, trades fechados e ordens, e normaliza o
+# ambiente e as credenciais do registo do cliente. Os candles da estratégia
+# vêm sempre da Binance (candle_cache), partilhados por todos os clientes.
+# Os métodos são async: as chamadas bloqueantes dos clientes REST correm
+# em threads (asyncio.to_thread), e o engine sobrepõe o I/O de vários
+# clientes/corretoras no mesmo ciclo.
+# Nova corretora = nova subclasse + register(); o main não muda.
+
+class ExchangeAdapter(ABC):
+    name = None
+
+    @abstractmethod
+    def client_env(self, c) -> str:
+        """
+        Ambiente do cliente ("real" ou "testnet") a partir do registo
+        """
+
+    def credentials(self, c):
+        """
+        (api_key, api_secret) do registo do cliente
+        """
+        return c["CorretoraClientAPIKey"], c["CorretoraClientAPISecret"]
+
+    @abstractmethod
+    async def has_open_position(self, api_key, api_secret, symbol, env="real") -> bool:
+        """
+        True se houver posição aberta (ou se não for possível confirmar)
+        """
+
+    @abstractmethod
+    async def get_closed_trades(self, api_key, api_secret, symbol, env="real", limit=10, cursor=None):
+        """
+        Trades fechados no formato comum (orderId, symbol, side, entry_price,
+        exit_price, qty, fee, pnl, createdTime, updatedTime), desde `cursor`
+        """
+
+    @abstractmethod
+    async def place_order(self, api_key, api_secret, symbol, side, qty, env="real",
+                          sl=None, tp=None, signal_time=None):
+        """
+        Ordem MARKET com SL/TP. Resposta da corretora ou None se falhou.
+        """
+
+    @abstractmethod
+    def trade_id(self, trade) -> str:
+        """
+        ID único do trade fechado (dedup e OrderID enviado para a API)
+        """
+
+    @abstractmethod
+    def next_cursor(self, trades):
+        """
+        Cursor para o próximo polling incremental (trades não vazio)
+        """
+
+    def get_order_stats(self) -> dict:
+        return {}
+
+
+# =====================================================
+# BYBIT
+# =====================================================
+class BybitAdapter(ExchangeAdapter):
+    name = "bybit"
+
+    def client_env(self, c):
+        return c.get("BybitEnvironment") or "real"
+
+    async def has_open_position(self, api_key, api_secret, symbol, env="real") -> bool:
+        return await asyncio.to_thread(
+            bybit_client.has_open_position, api_key, api_secret, symbol, env
+        )
+
+    async def get_closed_trades(self, api_key, api_secret, symbol, env="real", limit=10, cursor=None):
+        return await asyncio.to_thread(
+            bybit_client.get_closed_trades,
+            api_key, api_secret, symbol,
+            env=env, limit=limit, start_time=cursor
+        )
+
+    async def place_order(self, api_key, api_secret, symbol, side, qty, env="real",
+                          sl=None, tp=None, signal_time=None):
+        # SL/TP vão na própria ordem (um só pedido)
+        return await asyncio.to_thread(
+            bybit_client.place_order,
+            api_key=api_key, api_secret=api_secret, symbol=symbol,
+            side=side, qty=qty, env=env, sl=sl, tp=tp
+        )
+
+    def trade_id(self, trade):
+        return trade.get("orderId")
+
+    def next_cursor(self, trades):
+        return max(int(t["updatedTime"]) for t in trades)
+
+
+# =====================================================
+# BINANCE
+# =====================================================
+class BinanceAdapter(ExchangeAdapter):
+    name = "binance"
+
+    def client_env(self, c):
+        # o registo só tem BybitEnvironment; "testnet" vale para as duas
+        return "testnet" if c.get("BybitEnvironment") == "testnet" else "real"
+
+    async def has_open_position(self, api_key, api_secret, symbol, env="real") -> bool:
+        return await asyncio.to_thread(
+            binance_client.has_open_position, api_key, api_secret, symbol, env
+        )
+
+    async def get_closed_trades(self, api_key, api_secret, symbol, env="real", limit=10, cursor=None):
+        return await asyncio.to_thread(
+            binance_client.get_closed_trades,
+            api_key, api_secret, symbol,
+            env=env, limit=limit, from_id=cursor
+        )
+
+    async def place_order(self, api_key, api_secret, symbol, side, qty, env="real",
+                          sl=None, tp=None, signal_time=None):
+        return await asyncio.to_thread(
+            binance_client.place_order,
+            api_key=api_key, api_secret=api_secret, symbol=symbol,
+            side=side, qty=qty, env=env, sl=sl, tp=tp, signal_time=signal_time
+        )
+
+    def trade_id(self, trade):
+        return f"BINANCE-{trade['orderId']}"
+
+    def next_cursor(self, trades):
+        return max(int(t["tradeId"]) for t in trades) + 1
+
+    def get_order_stats(self):
+        return binance_client.get_order_stats()
+
+
+# =====================================================
+# REGISTO
+# =====================================================
+_adapters = {}
+
+
+def register(adapter: ExchangeAdapter):
+    _adapters[adapter.name] = adapter
+
+
+def get_adapter(name):
+    """
+    Adapter da corretora (nome em minúsculas) ou None se não suportada
+    """
+    return _adapters.get(name)
+
+
+def adapters() -> dict:
+    return dict(_adapters)
+
+
+register(BybitAdapter())
+register(BinanceAdapter())
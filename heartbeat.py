@@ -1,4 +1,6 @@
-import threading, time, requests, yaml
+import threading, time, yaml
+import http_client
+import sharding
 
 cfg = yaml.safe_load(open("config.yaml"))
 
@@ -6,7 +8,8 @@ def start():
     def loop():
         while True:
             try:
-                requests.post(cfg["api"]["heartbeat_url"], json={"BotOnline": 1}, timeout=5)
+                # com sharding: worker, shard e clientes deste worker
+                http_client.post(cfg["api"]["heartbeat_url"], json={"BotOnline": 1, **sharding.get_status()}, timeout=5)
             except:
                 pass
             time.sleep(300)
@@ -0,0 +1,176 @@
+import time
+import threading
+from urllib.parse import urlsplit
+
+import requests
+import yaml
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Nota: este módulo não usa o logger (o logger envia logs através dele)
+
+# =====================================================
+# CONFIG
+# =====================================================
+cfg = yaml.safe_load(open("config.yaml"))
+
+HTTP_CFG = cfg.get("http", {}) or {}
+
+TIMEOUT = float(HTTP_CFG.get("timeout_seconds", 10))
+POOL_CONNECTIONS = int(HTTP_CFG.get("pool_connections", 4))
+POOL_MAXSIZE = int(HTTP_CFG.get("pool_maxsize", 32))
+RETRIES = int(HTTP_CFG.get("retries", 2))
+BACKOFF_FACTOR = float(HTTP_CFG.get("backoff_factor", 0.3))
+
+# Só métodos idempotentes são repetidos após resposta/erro de leitura.
+# POST (ex.: ordens) só é repetido se a ligação nem chegou a ser feita.
+RETRY_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUS = (500, 502, 503, 504)
+
+
+# =====================================================
+# SESSÕES (UMA POR HOST, COM POOL + KEEP-ALIVE)
+# =====================================================
+_sessions = {}
+_metrics = {}
+_lock = threading.Lock()
+
+
+def _new_session():
+    retry = Retry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=RETRIES,
+        status=RETRIES,
+        other=0,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=RETRY_METHODS,
+        raise_on_status=False,
+        respect_retry_after_header=True
+    )
+
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _host(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url) -> requests.Session:
+    host = _host(url)
+
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _sessions[host] = _new_session()
+            _metrics[host] = {
+                "requests": 0,
+                "errors": 0,
+                "latency_total": 0.0,
+                "latency_max": 0.0
+            }
+        return session
+
+
+# =====================================================
+# PEDIDOS
+# =====================================================
+def request(method, url, **kwargs) -> requests.Response:
+    """
+    Igual a requests.request, mas com sessão partilhada por host,
+    timeout por omissão e métricas de latência.
+    """
+    kwargs.setdefault("timeout", TIMEOUT)
+
+    session = get_session(url)
+    host = _host(url)
+    start = time.perf_counter()
+    error = False
+
+    try:
+        return session.request(method, url, **kwargs)
+    except Exception:
+        error = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+
+        with _lock:
+            m = _metrics[host]
+            m["requests"] += 1
+            m["errors"] += error
+            m["latency_total"] += elapsed
+            m["latency_max"] = max(m["latency_max"], elapsed)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
+
+
+# =====================================================
+# MÉTRICAS
+# =====================================================
+def _pool_counters(session):
+    """
+    (ligações abertas, pedidos feitos) nos pools urllib3 da sessão
+    """
+    connections = 0
+    requests_made = 0
+
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            requests_made += pool.num_requests
+
+    return connections, requests_made
+
+
+def get_metrics() -> dict:
+    """
+    Por host: pedidos, erros, latência média/máx. e reutilização de ligações
+    """
+    with _lock:
+        items = [(h, dict(_metrics[h]), s) for h, s in _sessions.items()]
+
+    result = {}
+    for host, m, session in items:
+        connections, requests_made = _pool_counters(session)
+
+        result[host] = {
+            "requests": m["requests"],
+            "errors": m["errors"],
+            "latency_avg_ms": round(m["latency_total"] / m["requests"] * 1000, 1) if m["requests"] else 0.0,
+            "latency_max_ms": round(m["latency_max"] * 1000, 1),
+            "connections": connections,
+            "reused": max(0, requests_made - connections),
+            "reuse_ratio": round(1 - connections / requests_made, 3) if requests_made else 0.0
+        }
+
+    return result
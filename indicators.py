@@ -0,0 +1,100 @@
+import threading
+
+import numpy as np
+
+
+# =====================================================
+# EMA INCREMENTAL (O(1) POR CANDLE)
+# =====================================================
+#
+# Mesma fórmula do pandas ewm(span, adjust=False):
+#   ema[0] = close[0]
+#   ema[t] = alpha * close[t] + (1 - alpha) * ema[t-1],  alpha = 2 / (span + 1)
+#
+# O estado guarda as EMAs até ao penúltimo candle recebido ("committed").
+# O último candle pode ainda estar em formação, por isso o seu valor é
+# calculado à parte em O(1) a partir do estado, sem o alterar.
+
+
+class EmaState:
+
+    def __init__(self, spans):
+        self.spans = tuple(spans)
+        self.alpha = np.array([2.0 / (s + 1.0) for s in self.spans])
+        self.lock = threading.Lock()
+
+        self.committed_time = None
+        self.committed = None
+
+    def _seed(self, closes):
+        """
+        Recalcula tudo a partir do primeiro candle (arranque ou falha de dados)
+        """
+        values = np.full(len(self.spans), float(closes[0]))
+        for x in closes[1:]:
+            values = self.alpha * float(x) + (1.0 - self.alpha) * values
+        return values
+
+    def update(self, open_times, closes):
+        """
+        open_times/closes: arrays ordenados (o último pode estar em formação).
+        Retorna (ema_penultimo, ema_ultimo) como arrays na ordem de `spans`.
+        """
+        n = len(closes)
+        if n < 2:
+            return None
+
+        with self.lock:
+            last_committed = n - 2
+            target_time = int(open_times[last_committed])
+
+            if self.committed_time is not None and self.committed_time <= target_time:
+                idx = int(np.searchsorted(open_times, self.committed_time))
+                known = idx < n and int(open_times[idx]) == self.committed_time
+            else:
+                known = False
+
+            if not known:
+                self.committed = self._seed(closes[:last_committed + 1])
+            else:
+                # só os candles novos (normalmente 0 ou 1)
+                values = self.committed
+                for x in closes[idx + 1:last_committed + 1]:
+                    values = self.alpha * float(x) + (1.0 - self.alpha) * values
+                self.committed = values
+
+            self.committed_time = target_time
+
+            prev = self.committed
+            last = self.alpha * float(closes[-1]) + (1.0 - self.alpha) * prev
+            return prev, last
+
+
+# =====================================================
+# REGISTO POR (env, symbol, interval)
+# =====================================================
+_states = {}
+_lock = threading.Lock()
+
+
+def get_state(key, spans) -> EmaState:
+    spans = tuple(spans)
+
+    with _lock:
+        state = _states.get((key, spans))
+        if state is None:
+            state = _states[(key, spans)] = EmaState(spans)
+        return state
+
+
+def update_emas(key, open_times, closes, spans):
+    return get_state(key, spans).update(open_times, closes)
+
+
+def reset(key=None):
+    with _lock:
+        if key is None:
+            _states.clear()
+            return
+        for k in [k for k in _states if k[0] == key]:
+            _states.pop(k, None)
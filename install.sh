@@ -3,6 +3,7 @@
 APP_DIR="/opt/iForexTrading"
 SERVICE_NAME="iforextrading"
 PYTHON_BIN="/usr/bin/python3"
+SHARDS="${SHARDS:-1}"   # >1 → um serviço por shard (iforextrading@0 ... @N-1)
 
 echo "📥 A instalar iForexTrading (modo venv)..."
 
@@ -32,6 +33,39 @@ $APP_DIR/venv/bin/pip install --upgrade pip
 $APP_DIR/venv/bin/pip install -r requirements.txt
 
 # Criar serviço systemd
+if [ "$SHARDS" -gt 1 ]; then
+    echo "🧩 A criar $SHARDS workers (sharding de clientes)..."
+
+    cat <<EOF >/etc/systemd/system/$SERVICE_NAME@.service
+[Unit]
+Description=iForexTrading Bot (shard %i)
+After=network-online.target
+Wants=network-online.target
+
+[Service]
+Type=simple
+ExecStart=$APP_DIR/venv/bin/python $APP_DIR/main.py --shard-index %i --shard-count $SHARDS
+Restart=always
+RestartSec=5
+User=root
+WorkingDirectory=$APP_DIR
+Environment=PYTHONUNBUFFERED=1
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+    systemctl daemon-reload
+    systemctl disable --now $SERVICE_NAME 2>/dev/null
+    for i in $(seq 0 $((SHARDS - 1))); do
+        systemctl enable $SERVICE_NAME@$i
+        systemctl restart $SERVICE_NAME@$i
+    done
+
+    echo "✅ iForexTrading instalado corretamente (venv, $SHARDS shards)"
+    exit 0
+fi
+
 cat <<EOF >/etc/systemd/system/$SERVICE_NAME.service
 [Unit]
 Description=iForexTrading Bot
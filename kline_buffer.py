@@ -0,0 +1,175 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+# =====================================================
+# BUFFER DE KLINES (RING FIXO EM NUMPY)
+# =====================================================
+
+COLUMNS = ["open", "high", "low", "close", "volume"]
+
+# duração de cada intervalo (ms); tabela única usada por market_data,
+# market_stream e candle_cache
+INTERVAL_MS = {
+    "1m": 60_000,
+    "3m": 180_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "30m": 1_800_000,
+    "1h": 3_600_000,
+    "2h": 7_200_000,
+    "4h": 14_400_000,
+    "6h": 21_600_000,
+    "8h": 28_800_000,
+    "12h": 43_200_000,
+    "1d": 86_400_000
+}
+
+
+class KlineBuffer:
+    """
+    Guarda os últimos `capacity` candles de um (env, symbol, interval).
+    Candles novos são acrescentados; o candle em formação é reescrito.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = int(capacity)
+        self.lock = threading.RLock()
+
+        self._open_time = np.zeros(self.capacity, dtype=np.int64)
+        self._close_time = np.zeros(self.capacity, dtype=np.int64)
+        self._values = np.zeros((self.capacity, len(COLUMNS)), dtype=np.float64)
+
+        self._start = 0
+        self.size = 0
+
+    # -------------------------------------------------
+    # ESCRITA
+    # -------------------------------------------------
+    @property
+    def last_open_time(self):
+        if self.size == 0:
+            return None
+        return int(self._open_time[(self._start + self.size - 1) % self.capacity])
+
+    def clear(self):
+        with self.lock:
+            self._start = 0
+            self.size = 0
+
+    def update(self, open_time, o, h, l, c, v, close_time):
+        """
+        Acrescenta um candle ou reescreve o último (mesmo open_time).
+        Candles mais antigos que o último são ignorados.
+        Retorna True se foi acrescentado um candle novo.
+        """
+        open_time = int(open_time)
+
+        with self.lock:
+            last = self.last_open_time
+
+            if last is not None and open_time < last:
+                return False
+
+            if last is not None and open_time == last:
+                idx = (self._start + self.size - 1) % self.capacity
+                appended = False
+            elif self.size < self.capacity:
+                idx = (self._start + self.size) % self.capacity
+                self.size += 1
+                appended = True
+            else:
+                # ring cheio → substitui o mais antigo
+                idx = self._start
+                self._start = (self._start + 1) % self.capacity
+                appended = True
+
+            self._open_time[idx] = open_time
+            self._close_time[idx] = int(close_time)
+            self._values[idx] = (float(o), float(h), float(l), float(c), float(v))
+            return appended
+
+    def update_rows(self, rows):
+        """
+        Aplica linhas no formato REST da Binance (/fapi/v1/klines)
+        """
+        with self.lock:
+            for r in rows:
+                self.update(r[0], r[1], r[2], r[3], r[4], r[5], r[6])
+
+    # -------------------------------------------------
+    # LEITURA
+    # -------------------------------------------------
+    def _order(self):
+        return (self._start + np.arange(self.size)) % self.capacity
+
+    def arrays(self, limit=None):
+        """
+        Cópias ordenadas: (open_time, close_time, valores[n, 5])
+        """
+        with self.lock:
+            order = self._order()
+            if limit is not None:
+                order = order[-limit:]
+            return (
+                self._open_time[order],
+                self._close_time[order],
+                self._values[order]
+            )
+
+    def to_frame(self, limit=None) -> pd.DataFrame:
+        open_time, close_time, values = self.arrays(limit)
+
+        df = pd.DataFrame(values, columns=COLUMNS)
+        df.insert(0, "open_time", open_time)
+        df["close_time"] = close_time
+        return df
+
+
+# =====================================================
+# REGISTO DE BUFFERS
+# =====================================================
+_buffers = {}
+_lock = threading.Lock()
+
+
+def get_buffer(env, symbol, interval, capacity=200) -> KlineBuffer:
+    """
+    Buffer partilhado por (env, symbol, interval).
+    Se for pedida uma capacidade maior, o buffer é recriado vazio.
+    """
+    key = (env, symbol, interval)
+
+    with _lock:
+        buf = _buffers.get(key)
+        if buf is None or buf.capacity < capacity:
+            buf = _buffers[key] = KlineBuffer(capacity)
+        return buf
+
+
+def apply_kline(env, symbol, interval, open_time, o, h, l, c, v, close_time, step_ms=None):
+    """
+    Atualiza o buffer com um candle vindo de outra fonte (ex.: WebSocket).
+    Só atualiza buffers que já existem (já têm histórico REST).
+    Retorna False se o candle não pôde ser aplicado (buffer vazio ou,
+    com step_ms, se faltarem candles entre o último guardado e este).
+    """
+    with _lock:
+        buf = _buffers.get((env, symbol, interval))
+
+    if buf is None:
+        return False
+
+    with buf.lock:
+        last = buf.last_open_time
+
+        if last is None:
+            return False
+
+        if step_ms and int(open_time) > last + step_ms:
+            return False
+
+        buf.update(open_time, o, h, l, c, v, close_time)
+        return True
@@ -1,10 +1,16 @@
 import yaml
 import datetime
 import json
-import requests
+import http_client
 import traceback
+import sys
 import os
 import time
+import threading
+import queue
+import atexit
+
+import sharding
 
 # =====================================================
 # CONFIG
@@ -12,77 +18,270 @@ import time
 cfg = yaml.safe_load(open("config.yaml"))
 
 DEBUG = cfg.get("logging", {}).get("debug", False)
-LOG_FILE = cfg.get("logging", {}).get("log_file", "/tmp/iforextrading.log")
-LOG_CLEAN_INTERVAL = 60 * 60  # 60 minutos
+LOG_FILE = sharding.worker_path(cfg.get("logging", {}).get("log_file", "/tmp/iforextrading.log"))
+
+LOG_CFG = cfg.get("logging", {}) or {}
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "ERROR": 40}
+
+# nível mínimo global (por omissão DEBUG se debug=true) + exceções por módulo
+LOG_LEVEL = str(LOG_CFG.get("level") or ("DEBUG" if DEBUG else "INFO")).upper()
+MODULE_LEVELS = {
+    m: str(lvl).upper()
+    for m, lvl in (LOG_CFG.get("modules") or {}).items()
+}
+
+LOG_MAX_BYTES = int(LOG_CFG.get("max_bytes", 50 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(LOG_CFG.get("backup_count", 3))
+LOG_BUFFER_BYTES = int(LOG_CFG.get("buffer_bytes", 64 * 1024))
+LOG_FLUSH_INTERVAL = float(LOG_CFG.get("flush_interval_seconds", 1.0))
+
+API_QUEUE_SIZE = int(LOG_CFG.get("api_queue_size", 10000))
+API_BATCH_SIZE = int(LOG_CFG.get("api_batch_size", 1))
+API_FLUSH_INTERVAL = float(LOG_CFG.get("api_flush_interval_seconds", 1.0))
+API_OVERFLOW = LOG_CFG.get("api_overflow", "drop")
+API_SPILL_FILE = sharding.worker_path(LOG_CFG.get("api_spill_file", "/tmp/iforextrading_log_spill.jsonl"))
+
+_thresholds = {}
+
+_write_lock = threading.Lock()
+_local_file = None
+_local_size = 0
+_local_buffer = []
+_local_buffer_bytes = 0
+_flusher = None
 
-_last_log_cleanup = 0
+_api_queue = queue.Queue(maxsize=API_QUEUE_SIZE)
+_api_stats = {"queued": 0, "sent": 0, "failed": 0, "dropped": 0, "spilled": 0}
+_api_stats_lock = threading.Lock()
+_spill_lock = threading.Lock()
+_shipper = None
+_shipper_lock = threading.Lock()
+_stop_event = threading.Event()
 
 
 # =====================================================
-# LOG LOCAL
+# NÍVEIS E PAYLOADS LAZY
 # =====================================================
-def _cleanup_log_if_needed():
-    global _last_log_cleanup
+def _threshold(module):
+    value = _thresholds.get(module)
+    if value is None:
+        value = LEVELS.get(MODULE_LEVELS.get(module, LOG_LEVEL), LEVELS["DEBUG"])
+        _thresholds[module] = value
+    return value
 
-    now = time.time()
 
-    if _last_log_cleanup == 0:
-        _last_log_cleanup = now
-        return
+def is_enabled(level, module) -> bool:
+    """
+    True se um log deste nível/módulo é registado (útil antes de trabalho caro)
+    """
+    return LEVELS[level] >= _threshold(module)
+
+
+def set_level(level, module=None):
+    global LOG_LEVEL
+
+    if module is None:
+        LOG_LEVEL = level.upper()
+    else:
+        MODULE_LEVELS[module] = level.upper()
+    _thresholds.clear()
+
+
+class _Lazy:
+    """
+    Payload calculado só quando é preciso (e uma única vez)
+    """
+    __slots__ = ("fn", "value", "done")
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.value = None
+        self.done = False
 
-    if now - _last_log_cleanup >= LOG_CLEAN_INTERVAL:
+    def __call__(self):
+        if not self.done:
+            self.value = self.fn()
+            self.done = True
+        return self.value
+
+
+def _resolve(data):
+    """
+    data pode ser um callable (payload lazy) → só é avaliado aqui
+    """
+    if callable(data):
         try:
-            if os.path.exists(LOG_FILE):
-                open(LOG_FILE, "w").close()  # limpa o ficheiro
-            _last_log_cleanup = now
-        except:
-            pass
+            return data()
+        except Exception as e:
+            return {"error": f"Erro ao gerar dados do log: {e}"}
+    return data
 
 
-def _write_local(level, module, message, data=None):
-    if not DEBUG:
+def _format_exc(exc_info):
+    if exc_info[0] is None:
+        return "NoneType: None\n"
+    return "".join(traceback.format_exception(*exc_info))
+
+
+# =====================================================
+# LOG LOCAL (ESCRITA COM BUFFER + ROTAÇÃO POR TAMANHO)
+# =====================================================
+#
+# O ficheiro fica aberto; as linhas vão para um buffer em memória que é
+# escrito quando passa LOG_BUFFER_BYTES ou a cada LOG_FLUSH_INTERVAL
+# segundos. Quando o ficheiro passa LOG_MAX_BYTES roda para .1, .2, ...
+
+def _open_local():
+    global _local_file, _local_size
+
+    if _local_file is None:
+        os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+        _local_file = open(LOG_FILE, "a", encoding="utf-8")
+        _local_size = _local_file.tell()
+
+    return _local_file
+
+
+def _rotate_local():
+    global _local_file, _local_size
+
+    if _local_file is not None:
+        _local_file.close()
+        _local_file = None
+
+    if LOG_BACKUP_COUNT > 0:
+        for i in range(LOG_BACKUP_COUNT - 1, 0, -1):
+            src = f"{LOG_FILE}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{LOG_FILE}.{i + 1}")
+        os.replace(LOG_FILE, f"{LOG_FILE}.1")
+    else:
+        open(LOG_FILE, "w").close()
+
+    _local_size = 0
+
+
+def _flush_local_locked():
+    global _local_buffer, _local_buffer_bytes, _local_size
+
+    if not _local_buffer:
         return
 
-    _cleanup_log_if_needed()
+    data = "".join(_local_buffer)
+    _local_buffer = []
+    _local_buffer_bytes = 0
+
+    try:
+        f = _open_local()
+        f.write(data)
+        f.flush()
+        _local_size += len(data.encode("utf-8"))
+
+        if _local_size >= LOG_MAX_BYTES:
+            _rotate_local()
+    except Exception:
+        pass
+
 
-    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+def flush_local():
+    with _write_lock:
+        _flush_local_locked()
+
+
+def _flusher_loop():
+    while not _stop_event.wait(LOG_FLUSH_INTERVAL):
+        flush_local()
+
+
+def _ensure_flusher():
+    global _flusher
+
+    if _flusher is not None:
+        return
+
+    with _write_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_flusher_loop,
+                name="log-flusher",
+                daemon=True
+            )
+            _flusher.start()
+
+
+def _write_local(level, module, message, data=None):
+    global _local_buffer_bytes
+
+    if not DEBUG or LEVELS[level] < _threshold(module):
+        return
 
     log_line = {
         "time": datetime.datetime.utcnow().isoformat(),
         "level": level,
         "module": module,
         "message": message,
-        "data": data
+        "data": _resolve(data)
     }
 
-    with open(LOG_FILE, "a") as f:
-        f.write(json.dumps(log_line, ensure_ascii=False) + "\n")
+    line = json.dumps(log_line, ensure_ascii=False, default=str) + "\n"
+
+    _ensure_flusher()
+
+    # vários clientes são processados em paralelo
+    with _write_lock:
+        _local_buffer.append(line)
+        _local_buffer_bytes += len(line)
+
+        if _local_buffer_bytes >= LOG_BUFFER_BYTES:
+            _flush_local_locked()
 
 
 # =====================================================
 # LOGGING API
 # =====================================================
 def log_debug(module, message, data=None):
+    """
+    data pode ser um callable: só é avaliado se o DEBUG estiver ativo
+    """
+    if not DEBUG or LEVELS["DEBUG"] < _threshold(module):
+        return
     _write_local("DEBUG", module, message, data)
 
 
 def log_info(module, message, data=None, idcliente=None):
+    if LEVELS["INFO"] < _threshold(module):
+        return
     _write_local("INFO", module, message, data)
     _send_api_log("INFO", message, data, idcliente)
 
 
 def log_error(module, message, error=None, idcliente=None):
-    err_data = {
+    if LEVELS["ERROR"] < _threshold(module):
+        return
+
+    # o traceback só é formatado quando o log é escrito/enviado
+    exc_info = sys.exc_info()
+    if isinstance(error, BaseException) and error.__traceback__ is not None:
+        exc_info = (type(error), error, error.__traceback__)
+
+    err_data = _Lazy(lambda: {
         "error": str(error),
-        "traceback": traceback.format_exc()
-    }
+        "traceback": _format_exc(exc_info)
+    })
     _write_local("ERROR", module, message, err_data)
     _send_api_log("ERROR", message, err_data, idcliente)
 
 
 # =====================================================
-# API LOG
+# API LOG (ENVIO EM BACKGROUND)
 # =====================================================
+#
+# Os logs para a API são postos numa fila limitada e enviados por uma
+# thread própria, em lotes. Quem faz log nunca espera pela rede.
+# Fila cheia → "drop" (descarta) ou "spill" (guarda em disco e reenvia
+# quando houver espaço).
+
 def _send_api_log(level, message, data, idcliente):
     payload = {
         "IDCliente": idcliente or 0,
@@ -91,15 +290,94 @@ def _send_api_log(level, message, data, idcliente):
         "Data": data
     }
 
+    _ensure_shipper()
+
     try:
-        r = requests.post(
+        _api_queue.put_nowait(payload)
+        _count("queued")
+    except queue.Full:
+        _overflow([payload])
+
+
+def _count(name, n=1):
+    with _api_stats_lock:
+        _api_stats[name] += n
+
+
+def _materialize(payload):
+    if callable(payload.get("Data")):
+        payload["Data"] = _resolve(payload["Data"])
+    return payload
+
+
+def _overflow(payloads):
+    if API_OVERFLOW == "spill":
+        try:
+            lines = "".join(
+                json.dumps(_materialize(p), ensure_ascii=False, default=str) + "\n"
+                for p in payloads
+            )
+            with _spill_lock:
+                os.makedirs(os.path.dirname(API_SPILL_FILE), exist_ok=True)
+                with open(API_SPILL_FILE, "a") as f:
+                    f.write(lines)
+            _count("spilled", len(payloads))
+            return
+        except Exception:
+            pass
+
+    _count("dropped", len(payloads))
+
+
+def _reload_spill():
+    """
+    Volta a pôr na fila os logs guardados em disco (fila vazia)
+    """
+    if API_OVERFLOW != "spill" or not os.path.exists(API_SPILL_FILE):
+        return
+
+    with _spill_lock:
+        sending = API_SPILL_FILE + ".sending"
+        try:
+            os.replace(API_SPILL_FILE, sending)
+            with open(sending) as f:
+                lines = f.readlines()
+            os.remove(sending)
+        except Exception:
+            return
+
+    pending = []
+    for line in lines:
+        try:
+            pending.append(json.loads(line))
+        except ValueError:
+            continue
+
+    for i, payload in enumerate(pending):
+        try:
+            _api_queue.put_nowait(payload)
+        except queue.Full:
+            _overflow(pending[i:])
+            break
+
+
+def _post_api(body):
+    if isinstance(body, list):
+        for p in body:
+            _materialize(p)
+    else:
+        _materialize(body)
+
+    try:
+        r = http_client.post(
             cfg["api"]["log_url"],
-            json=payload,
+            data=json.dumps(body, ensure_ascii=False, default=str).encode("utf-8"),
             timeout=5,
             headers={"Content-Type": "application/json"}
         )
 
         if r.status_code != 200:
+            _count("failed")
             _write_local(
                 "ERROR",
                 "logger",
@@ -107,17 +385,121 @@ def _send_api_log(level, message, data, idcliente):
                 {
                     "status_code": r.status_code,
                     "response": r.text,
-                    "payload": payload
+                    "payload": body
                 }
             )
+            return
+
+        _count("sent", len(body) if isinstance(body, list) else 1)
 
     except Exception as e:
+        _count("failed")
         _write_local(
             "ERROR",
             "logger",
             "Exceção ao enviar log para API",
             {
                 "error": str(e),
-                "payload": payload
+                "payload": body
             }
         )
+
+
+def _next_batch():
+    """
+    Espera pelo 1º log (até API_FLUSH_INTERVAL) e junta os que já estão na fila
+    """
+    try:
+        batch = [_api_queue.get(timeout=API_FLUSH_INTERVAL)]
+    except queue.Empty:
+        return []
+
+    while len(batch) < API_BATCH_SIZE:
+        try:
+            batch.append(_api_queue.get_nowait())
+        except queue.Empty:
+            break
+
+    return batch
+
+
+def _shipper_loop():
+    while True:
+        batch = _next_batch()
+
+        if not batch:
+            if _stop_event.is_set():
+                return
+            _reload_spill()
+            continue
+
+        try:
+            if API_BATCH_SIZE <= 1:
+                for payload in batch:
+                    _post_api(payload)
+            else:
+                _post_api(batch)
+        finally:
+            for _ in batch:
+                _api_queue.task_done()
+
+
+def _ensure_shipper():
+    global _shipper
+
+    if _shipper is not None:
+        return
+
+    with _shipper_lock:
+        if _shipper is None:
+            _shipper = threading.Thread(
+                target=_shipper_loop,
+                name="log-shipper",
+                daemon=True
+            )
+            _shipper.start()
+
+
+def flush(timeout=5.0) -> bool:
+    """
+    Espera (até timeout) que a fila de logs para a API fique vazia
+    """
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        if _api_queue.unfinished_tasks == 0:
+            return True
+        time.sleep(0.05)
+
+    return False
+
+
+def shutdown(timeout=5.0):
+    """
+    Envia o que estiver na fila; o que sobrar vai para disco (modo spill)
+    """
+    if _shipper is not None:
+        flush(timeout)
+    _stop_event.set()
+
+    leftover = []
+    while True:
+        try:
+            leftover.append(_api_queue.get_nowait())
+        except queue.Empty:
+            break
+
+    if leftover:
+        _overflow(leftover)
+
+    flush_local()
+
+
+def get_api_stats() -> dict:
+    with _api_stats_lock:
+        stats = dict(_api_stats)
+    stats["queue"] = _api_queue.qsize()
+    return stats
+
+
+atexit.register(shutdown)
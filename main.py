@@ -1,336 +1,563 @@
 import time
-import requests
-
-from api_client import get_clients
-from market_data import get_candles_binance
-from strategy_falcon import falcon_strategy
-from bybit_client import (
-    has_open_position as bybit_has_position,
-    place_order as bybit_place_order,
-    get_closed_trades
-)
-from binance_client import (
-    has_open_position as binance_has_position,
-    place_order as binance_place_order,
-    get_closed_trades as binance_get_closed_trades
-)
+import signal
+import asyncio
+import http_client
+
+import yaml
+
+import client_registry
+from candle_cache import get_candles
+from strategy_falcon import falcon_signal, falcon_signal_incremental, apply_risk
+from exchange_adapter import get_adapter, adapters
 from logger import log_info, log_debug, log_error
 import heartbeat
+import engine
+import candle_cache
+import signals
+import position_cache
+import rate_limit
+import sharding
+import time_sync
+import trade_store
+import trade_reporter
+import market_stream
+import user_stream
+import worker_pool
+from scheduler import CandleScheduler
 
 
 # =====================================================
 # CONFIG
 # =====================================================
 
-TRADES_API_URL = "http://invest.rdfonseca.com/api/forex_api_trades.php"
+cfg = yaml.safe_load(open("config.yaml"))
+
+POLL_INTERVAL = int(cfg.get("bot", {}).get("poll_interval_seconds", 60))
 
-# Evitar duplicados durante execução
-SENT_TRADES = set()
+# "poll": estratégia a cada ciclo | "candle_close": estratégia no fecho do candle
+MODE = cfg.get("bot", {}).get("mode", "poll")
+CLOSE_DELAY = float(cfg.get("bot", {}).get("close_delay_seconds", 2))
+CLOSE_MAX_LATE = float(cfg.get("bot", {}).get("close_max_late_seconds", 10))
 
+# EMAs incrementais por (env, symbol, interval) em vez de recalcular tudo
+INCREMENTAL_EMA = bool(cfg.get("strategy", {}).get("incremental_ema", True))
 
 # =====================================================
-# BOOT
+# UTILITÁRIOS
 # =====================================================
-log_info("main", "BOT iForexTrading iniciado")
-heartbeat.start()
+def _market_keys(clients):
+    """
+    (env, symbol, interval) em uso pelos clientes ativos
+    """
+    keys = set()
+    for c in clients:
+        ctx = _prepare_client(c, verbose=False)
+        if ctx is not None:
+            keys.add((ctx["env"], ctx["symbol"], "5m"))
+    return keys
 
 
 # =====================================================
-# LOOP PRINCIPAL
+# PREPARAR CLIENTE
 # =====================================================
-while True:
+def _prepare_client(c, verbose=True):
+    """
+    Contexto do cliente ou None se for ignorado. A validação/normalização
+    (_build_context) só corre quando o registo do cliente muda.
+    """
+    if verbose:
+        log_debug("main", "Processar cliente", c)
+
+    return client_registry.get_context(c)
+
+
+def _build_context(c):
+    """
+    Valida e normaliza o cliente. Retorna o contexto ou None se for ignorado.
+    """
+    idcliente = c.get("IDCliente")
+
+    # -------------------------------------------------
+    # Ativo?
+    # -------------------------------------------------
+    if c.get("BotActive") != 1:
+        log_debug("main", "BotActive=0, ignorado", idcliente)
+        return None
+
+    # -------------------------------------------------
+    # Campos obrigatórios
+    # -------------------------------------------------
+    required_fields = [
+        "TipoMoeda",
+        "LotSize",
+        "StopLoss",
+        "TakeProfit",
+        "Corretora",
+        "CorretoraClientAPIKey",
+        "CorretoraClientAPISecret"
+    ]
+
+    missing = [
+        f for f in required_fields
+        if c.get(f) in (None, "", 0)
+    ]
+
+    if missing:
+        log_info(
+            "main",
+            "Cliente ignorado: configuração incompleta",
+            {"missing_fields": missing},
+            idcliente=idcliente
+        )
+        return None
+
+    # -------------------------------------------------
+    # Normalização
+    # -------------------------------------------------
+    corretora = c["Corretora"].lower()
+
+    adapter = get_adapter(corretora)
+    if adapter is None:
+        log_debug("main", "Corretora não suportada, ignorado", {
+            "idcliente": idcliente,
+            "corretora": corretora
+        })
+        return None
+
+    api_key, api_secret = adapter.credentials(c)
+    symbol = c["TipoMoeda"]
+    env = adapter.client_env(c)
+
+    return {
+        "client": c,
+        "idcliente": idcliente,
+        "corretora": corretora,
+        "adapter": adapter,
+        "api_key": api_key,
+        "api_secret": api_secret,
+        "symbol": symbol,
+        "env": env
+    }
+
+
+# =====================================================
+# TRADES FECHADOS
+# =====================================================
+async def _report_closed_trades(ctx):
+    """
+    Erros aqui (corretora, state DB, outbox) ficam registados mas não
+    impedem a verificação de posição/ordem do cliente
+    """
     try:
-        clients = get_clients()
-        log_debug("main", "Clientes recebidos", clients)
-
-        for c in clients:
-            try:
-                log_debug("main", "Processar cliente", c)
-
-                idcliente = c.get("IDCliente")
-
-                # -------------------------------------------------
-                # Ativo?
-                # -------------------------------------------------
-                if c.get("BotActive") != 1:
-                    log_debug("main", "BotActive=0, ignorado", idcliente)
-                    continue
-
-                # -------------------------------------------------
-                # Campos obrigatórios
-                # -------------------------------------------------
-                required_fields = [
-                    "TipoMoeda",
-                    "LotSize",
-                    "StopLoss",
-                    "TakeProfit",
-                    "Corretora",
-                    "CorretoraClientAPIKey",
-                    "CorretoraClientAPISecret"
-                ]
-
-                missing = [
-                    f for f in required_fields
-                    if c.get(f) in (None, "", 0)
-                ]
-
-                if missing:
-                    log_info(
-                        "main",
-                        "Cliente ignorado: configuração incompleta",
-                        {"missing_fields": missing},
-                        idcliente=idcliente
-                    )
-                    continue
-
-                # -------------------------------------------------
-                # Normalização
-                # -------------------------------------------------
-                corretora = c["Corretora"].lower()
-                api_key = c["CorretoraClientAPIKey"]
-                api_secret = c["CorretoraClientAPISecret"]
-                symbol = c["TipoMoeda"]
-
-                if corretora == "bybit":
-                    env = c.get("BybitEnvironment") or "real"
-                else:
-                    env = "testnet" if c.get("BybitEnvironment") == "testnet" else "real"
-
-                # =================================================
-                # 📊 PASSO 2 — TRADES FECHADOS (SÓ BYBIT)
-                # =================================================
-                if corretora == "bybit":
-                    closed_trades = get_closed_trades(
-                        api_key,
-                        api_secret,
-                        symbol,
-                        env=env,
-                        limit=10
-                    )
-
-                    for t in closed_trades:
-                        trade_id = t.get("orderId")
-
-                        if not trade_id or trade_id in SENT_TRADES:
-                            continue
-
-                        payload = {
-                            "IDCliente": idcliente,
-                            "Corretora": "bybit",
-                            "Symbol": t["symbol"],
-                            "Side": t["side"],
-                            "EntryPrice": t["entry_price"],
-                            "ExitPrice": t["exit_price"],
-                            "Qty": t["qty"],
-                            "Fee": t["fee"],
-                            "PnL": t["pnl"],
-                            "OrderID": trade_id,
-                            "OpenTime": t["createdTime"],
-                            "CloseTime": t["updatedTime"],
-                            "Environment": env
-                        }
-
-                        try:
-                            log_debug(
-                                "main",
-                                "A enviar trade fechado para API",
-                                payload
-                            )
-
-                            r = requests.post(
-                                TRADES_API_URL,
-                                json=payload,
-                                timeout=10
-                            )
-
-                            r.raise_for_status()
-
-                            SENT_TRADES.add(trade_id)
-
-                            log_info(
-                                "main",
-                                "Trade fechado enviado com sucesso",
-                                payload,
-                                idcliente=idcliente
-                            )
-
-                        except Exception as e:
-                            log_error(
-                                "main",
-                                "Erro ao enviar trade fechado",
-                                e,
-                                idcliente=idcliente
-                            )
-
-                # =================================================
-                # 📊 PASSO 2 — TRADES FECHADOS (BINANCE)
-                # =================================================
-                if corretora == "binance":
-                    closed_trades = binance_get_closed_trades(
-                        api_key,
-                        api_secret,
-                        symbol,
-                        env=env,
-                        limit=10
-                    )
-                
-                    for t in closed_trades:
-                        trade_id = f"BINANCE-{t['orderId']}"
-                
-                        if trade_id in SENT_TRADES:
-                            continue
-                
-                        payload = {
-                            "IDCliente": idcliente,
-                            "Corretora": "binance",
-                            "Symbol": t["symbol"],
-                            "Side": t["side"],
-                            "EntryPrice": t["entry_price"],
-                            "ExitPrice": t["exit_price"],
-                            "Qty": t["qty"],
-                            "Fee": t["fee"],
-                            "PnL": t["pnl"],
-                            "OrderID": trade_id,
-                            "OpenTime": t["createdTime"],
-                            "CloseTime": t["updatedTime"],
-                            "Environment": env
-                        }
-                
-                        try:
-                            log_debug(
-                                "main",
-                                "A enviar trade fechado BINANCE para API",
-                                payload
-                            )
-                
-                            r = requests.post(
-                                TRADES_API_URL,
-                                json=payload,
-                                timeout=10
-                            )
-                
-                            r.raise_for_status()
-                
-                            SENT_TRADES.add(trade_id)
-                
-                            log_info(
-                                "main",
-                                "Trade fechado BINANCE enviado",
-                                payload,
-                                idcliente=idcliente
-                            )
-                
-                        except Exception as e:
-                            log_error(
-                                "main",
-                                "Erro ao enviar trade fechado BINANCE",
-                                e,
-                                idcliente=idcliente
-                            )
-
-
-
-                
-                # -------------------------------------------------
-                # Verificar posição aberta (ANTI-DUPLICADOS)
-                # -------------------------------------------------
-                if corretora == "bybit":
-                    has_position = bybit_has_position(
-                        api_key,
-                        api_secret,
-                        symbol,
-                        env
-                    )
-
-                elif corretora == "binance":
-                    has_position = binance_has_position(
-                        api_key,
-                        api_secret,
-                        symbol,
-                        env
-                    )
-                else:
-                    continue
-
-                if has_position:
-                    log_info(
-                        "main",
-                        "Ordem bloqueada: posição já aberta",
-                        {"symbol": symbol, "corretora": corretora},
-                        idcliente=idcliente
-                    )
-                    continue
-
-                # -------------------------------------------------
-                # Market Data (Binance)
-                # -------------------------------------------------
-                df = get_candles_binance(
-                    symbol,
-                    interval="5m",
-                    env=env
-                )
+        await _poll_closed_trades(ctx)
+    except Exception as e:
+        log_error("main", "Erro ao reportar trades fechados", e, idcliente=ctx["idcliente"])
+
+
+async def _poll_closed_trades(ctx):
+    idcliente = ctx["idcliente"]
+    corretora = ctx["corretora"]
+    adapter = ctx["adapter"]
+    api_key = ctx["api_key"]
+    api_secret = ctx["api_secret"]
+    symbol = ctx["symbol"]
+    env = ctx["env"]
+
+    # =================================================
+    # 📊 PASSO 2 — TRADES FECHADOS
+    # =================================================
+    # Polling incremental: o cursor (updatedTime na Bybit, id do trade na
+    # Binance) fica no trade_store; só na 1ª vez se pedem os últimos 10.
+    # Com o stream de conta ligado, o REST só é chamado quando houve
+    # execuções no símbolo ou a reconciliação está devida.
+    if not user_stream.trades_due(corretora, env, api_key, symbol):
+        return
+
+    started = time.time()
+    cursor_name = f"{corretora}|{env}|{symbol}"
+
+    # SQLite / outbox em threads: não bloqueiam o event loop
+    cursor = await asyncio.to_thread(trade_store.get_cursor, idcliente, cursor_name)
+
+    closed_trades = await adapter.get_closed_trades(
+        api_key,
+        api_secret,
+        symbol,
+        env=env,
+        limit=10,
+        cursor=cursor
+    )
+
+    user_stream.trades_polled(corretora, env, api_key, symbol, started)
+
+    if not closed_trades:
+        return
+
+    await asyncio.to_thread(_queue_closed_trades, ctx, closed_trades, cursor_name, cursor)
+
+
+def _queue_closed_trades(ctx, closed_trades, cursor_name, cursor):
+    idcliente = ctx["idcliente"]
+    adapter = ctx["adapter"]
+
+    for t in closed_trades:
+        trade_id = adapter.trade_id(t)
+
+        if not trade_id:
+            continue
+
+        payload = {
+            "IDCliente": idcliente,
+            "Corretora": ctx["corretora"],
+            "Symbol": t["symbol"],
+            "Side": t["side"],
+            "EntryPrice": t["entry_price"],
+            "ExitPrice": t["exit_price"],
+            "Qty": t["qty"],
+            "Fee": t["fee"],
+            "PnL": t["pnl"],
+            "OrderID": trade_id,
+            "OpenTime": t["createdTime"],
+            "CloseTime": t["updatedTime"],
+            "Environment": ctx["env"]
+        }
+
+        # envio em background (lotes + outbox): não atrasa as ordens
+        if trade_reporter.submit(idcliente, trade_id, payload):
+            log_debug(
+                "main",
+                "Trade fechado em fila para a API",
+                payload
+            )
+
+    next_cursor = adapter.next_cursor(closed_trades)
+
+    if cursor is None or next_cursor > cursor:
+        trade_store.set_cursor(idcliente, cursor_name, next_cursor)
+
+
+# =====================================================
+# SINAL POR SÍMBOLO
+# =====================================================
+def _compute_signal(env, symbol, closed_open_time=None):
+    """
+    Candles + crossover/tendência. Corre uma vez por símbolo e ciclo.
+    closed_open_time: open_time (ms) do candle acabado de fechar.
+    Se indicado, a estratégia só vê candles fechados até esse.
+    """
+    # -------------------------------------------------
+    # Market Data (Binance)
+    # -------------------------------------------------
+    df = get_candles(
+        symbol,
+        interval="5m",
+        env=env
+    )
+
+    if df is None or df.empty:
+        log_debug(
+            "main",
+            "Sem candles válidos (Binance)",
+            {"symbol": symbol}
+        )
+        return None
+
+    if closed_open_time is not None:
+        df = df[df["open_time"] <= closed_open_time].reset_index(drop=True)
+
+        if df.empty or df["open_time"].iloc[-1] != closed_open_time:
+            log_debug(
+                "main",
+                "Candle fechado ainda não disponível",
+                {"symbol": symbol, "open_time": closed_open_time}
+            )
+            return None
+
+    if INCREMENTAL_EMA:
+        sig = falcon_signal_incremental((env, symbol, "5m"), df)
+    else:
+        sig = falcon_signal(df)
+
+    if sig:
+        # início da medição sinal → posição protegida
+        sig["time"] = time.time()
+
+    return sig
+
+
+# =====================================================
+# AVALIAR ESTRATÉGIA / EXECUTAR
+# =====================================================
+async def _evaluate_client(ctx, closed_open_time=None):
+    """
+    closed_open_time: open_time (ms) do candle fechado (modo candle_close)
+    """
+    c = ctx["client"]
+    idcliente = ctx["idcliente"]
+    corretora = ctx["corretora"]
+    adapter = ctx["adapter"]
+    api_key = ctx["api_key"]
+    api_secret = ctx["api_secret"]
+    symbol = ctx["symbol"]
+    env = ctx["env"]
+
+    # -------------------------------------------------
+    # Verificar posição aberta (ANTI-DUPLICADOS)
+    # -------------------------------------------------
+    has_position = await adapter.has_open_position(
+        api_key,
+        api_secret,
+        symbol,
+        env
+    )
+
+    if has_position:
+        log_info(
+            "main",
+            "Ordem bloqueada: posição já aberta",
+            {"symbol": symbol, "corretora": corretora},
+            idcliente=idcliente
+        )
+        return
+
+    # -------------------------------------------------
+    # Estratégia: sinal por símbolo (partilhado) + SL/TP do cliente
+    # -------------------------------------------------
+    # bloqueante (candles + lock por símbolo) → thread
+    raw_signal = await asyncio.to_thread(
+        signals.get_signal,
+        (env, symbol, "5m", closed_open_time),
+        lambda: _compute_signal(env, symbol, closed_open_time)
+    )
+
+    sig = apply_risk(raw_signal, c)
+    log_debug("main", "Sinal calculado", sig)
+
+    if not sig:
+        return
+
+    # -------------------------------------------------
+    # Execução
+    # -------------------------------------------------
+    result = await adapter.place_order(
+        api_key=api_key,
+        api_secret=api_secret,
+        symbol=symbol,
+        side=sig["side"],
+        qty=c["LotSize"],
+        env=env,
+        sl=sig["stop"],
+        tp=sig["take"],
+        signal_time=raw_signal.get("time")
+    )
+
+    log_info(
+        "main",
+        f"Ordem executada ({corretora.upper()} | {env.upper()})",
+        result,
+        idcliente=idcliente
+    )
+
+
+# =====================================================
+# PROCESSAR CLIENTE
+# =====================================================
+async def process_client(c):
+    """
+    Modo poll: trades fechados + estratégia, a cada ciclo
+    """
+    ctx = _prepare_client(c)
+    if ctx is None:
+        return
+
+    await _report_closed_trades(ctx)
+    await _evaluate_client(ctx)
+
+
+async def housekeep_client(c):
+    """
+    Modo candle_close: só trades fechados (a estratégia corre no fecho)
+    """
+    ctx = _prepare_client(c)
+    if ctx is None:
+        return
+
+    await _report_closed_trades(ctx)
+
+
+def _on_candle_close(key, clients, open_time):
+    """
+    Avalia os clientes subscritos a (env, symbol, interval) no fecho do candle
+    """
+    ctxs = {}
+    for c in clients:
+        ctx = _prepare_client(c, verbose=False)
+        if ctx is None:
+            continue
+        ctxs[id(c)] = ctx
+        # posições frescas no fecho do candle (o snapshot do ciclo pode ter
+        # até POLL_INTERVAL); continua a ser 1 pedido por conta. O estado do
+        # stream de conta, se ligado, já está atualizado.
+        position_cache.invalidate(ctx["corretora"], ctx["env"], ctx["api_key"], stream=False)
+
+    async def evaluate(c):
+        ctx = ctxs.get(id(c))
+        if ctx is not None:
+            await _evaluate_client(ctx, closed_open_time=open_time)
+
+    engine.run_cycle(clients, evaluate)
+
+
+def _accounts(clients):
+    """
+    (corretora, env, api_key, api_secret) das contas ativas (stream de conta)
+    """
+    accounts = set()
+    for c in clients:
+        ctx = _prepare_client(c, verbose=False)
+        if ctx is not None:
+            accounts.add((ctx["corretora"], ctx["env"], ctx["api_key"], ctx["api_secret"]))
+    return accounts
+
+
+def _affinity_key(c):
+    """
+    Chave de afinidade do worker_pool: clientes do mesmo símbolo no mesmo processo
+    """
+    ctx = _prepare_client(c, verbose=False)
+    if ctx is None:
+        return None
+    return (ctx["env"], ctx["symbol"])
+
+
+def _subscriptions(clients):
+    subs = {}
+    for c in clients:
+        ctx = _prepare_client(c, verbose=False)
+        if ctx is None:
+            continue
+        key = (ctx["env"], ctx["symbol"], "5m")
+        subs.setdefault(key, []).append(c)
+    return subs
 
-                if df is None or df.empty:
-                    log_debug(
-                        "main",
-                        "Sem candles válidos (Binance)",
-                        {"symbol": symbol}
-                    )
-                    continue
-
-                # -------------------------------------------------
-                # Estratégia
-                # -------------------------------------------------
-                signal = falcon_strategy(df, c)
-                log_debug("main", "Sinal calculado", signal)
-
-                if not signal:
-                    continue
-
-                # -------------------------------------------------
-                # Execução
-                # -------------------------------------------------
-                if corretora == "bybit":
-                    result = bybit_place_order(
-                        api_key=api_key,
-                        api_secret=api_secret,
-                        symbol=symbol,
-                        side=signal["side"],
-                        qty=c["LotSize"],
-                        env=env,
-                        sl=signal["stop"],
-                        tp=signal["take"]
-                    )
-
-                else:
-                    result = binance_place_order(
-                        api_key=api_key,
-                        api_secret=api_secret,
-                        symbol=symbol,
-                        side=signal["side"],
-                        qty=c["LotSize"],
-                        env=env,
-                        sl=signal["stop"],
-                        tp=signal["take"]
-                    )
 
+# =====================================================
+# LOOP PRINCIPAL
+# =====================================================
+def _on_sigterm(signum, frame):
+    # systemd stop → SystemExit para correr os atexit (ex.: flush dos logs)
+    raise SystemExit(0)
+
+
+def _run(get_clients):
+    """
+    Ciclo do bot sobre os clientes de get_clients() (processo único ou worker)
+    """
+    scheduler = None
+    if MODE == "candle_close":
+        scheduler = CandleScheduler(_on_candle_close, close_delay=CLOSE_DELAY, max_late=CLOSE_MAX_LATE)
+        market_stream.add_close_listener(scheduler.notify_close)
+        scheduler.start()
+
+    while True:
+        try:
+            clients = get_clients()
+            log_debug("main", "Clientes recebidos", lambda: clients)
+
+            market_stream.subscribe(_market_keys(clients))
+            user_stream.sync(_accounts(clients))
+            candle_cache.begin_cycle()
+            signals.begin_cycle()
+            position_cache.begin_cycle()
+
+            if scheduler is not None:
+                scheduler.set_subscriptions(_subscriptions(clients))
+                stats = engine.run_cycle(clients, housekeep_client)
+            else:
+                stats = engine.run_cycle(clients, process_client)
+
+            candle_cache.log_stats()
+            signals.log_stats()
+            position_cache.log_stats()
+            rate_limit.log_stats()
+            log_debug("main", "Streams de conta", user_stream.get_stats)
+            for name, adapter in adapters().items():
+                log_debug("main", f"Ordens ({name})", adapter.get_order_stats)
+            log_debug("main", "Offsets de relógio (ms)", time_sync.get_offsets)
+            log_debug("main", "Envio de trades", trade_reporter.get_stats)
+            log_debug("main", "Registo de clientes", client_registry.get_stats)
+            log_debug("main", "Métricas HTTP", http_client.get_metrics)
+
+            if stats["wall_time"] > POLL_INTERVAL:
                 log_info(
                     "main",
-                    f"Ordem executada ({corretora.upper()} | {env.upper()})",
-                    result,
-                    idcliente=idcliente
+                    "Ciclo excedeu o intervalo de polling",
+                    stats
                 )
 
-            except Exception as e:
-                log_error(
-                    "main",
-                    "Erro ao processar cliente",
-                    e,
-                    idcliente=c.get("IDCliente")
-                )
+            time.sleep(max(0, POLL_INTERVAL - stats["wall_time"]))
 
-        time.sleep(60)
+        except Exception as e:
+            log_error("main", "Erro fatal no loop principal", e)
+            time.sleep(10)
 
-    except Exception as e:
-        log_error("main", "Erro fatal no loop principal", e)
-        time.sleep(10)
+
+def _worker(inbox):
+    """
+    Processo do worker_pool: só os clientes atribuídos pelo supervisor
+    """
+    signal.signal(signal.SIGTERM, _on_sigterm)
+
+    log_info("main", "Worker iniciado", {"mode": MODE, "process": sharding.PROCESS_INDEX})
+    client_registry.configure(_build_context)
+    trade_store.load()
+    trade_reporter.start()
+
+    _run(inbox.get)
+
+
+def _supervise():
+    """
+    Supervisor do worker_pool: lista de clientes, atribuição e restarts
+    """
+    pool = worker_pool.WorkerPool(_worker, _affinity_key)
+    pool.start()
+
+    while True:
+        start = time.monotonic()
+
+        try:
+            pool.dispatch(sharding.filter_clients(client_registry.refresh()))
+            log_debug("main", "Registo de clientes", client_registry.get_stats)
+        except Exception as e:
+            log_error("main", "Erro fatal no loop principal", e)
+
+        while time.monotonic() - start < POLL_INTERVAL:
+            pool.supervise()
+            time.sleep(1)
+
+
+def main():
+    signal.signal(signal.SIGTERM, _on_sigterm)
+
+    log_info("main", "BOT iForexTrading iniciado", {
+        "mode": MODE,
+        "worker": sharding.WORKER_ID,
+        "processes": worker_pool.PROCESSES
+    })
+    sharding.start()
+    heartbeat.start()
+    client_registry.configure(_build_context)
+
+    if worker_pool.PROCESSES > 1:
+        _supervise()
+        return
+
+    trade_store.load()
+    trade_reporter.start()
+
+    _run(lambda: sharding.filter_clients(client_registry.refresh()))
+
+
+if __name__ == "__main__":
+    main()
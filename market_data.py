@@ -1,57 +1,98 @@
-import requests
-import pandas as pd
+import time
+import rate_limit
 from logger import log_debug, log_error
+from kline_buffer import INTERVAL_MS, get_buffer
+import market_stream
 
 
 # =====================================================
 # BINANCE FUTURES - MARKET DATA
 # =====================================================
 
-def get_candles_binance(symbol, interval="5m", limit=200, env="real"):
-    base_url = (
+# limite máximo de candles por pedido
+MAX_KLINES_PER_REQUEST = 1500
+
+
+def _base_url(env: str) -> str:
+    return (
         "https://testnet.binancefuture.com"
         if env == "testnet"
         else "https://fapi.binance.com"
     )
 
-    url = f"{base_url}/fapi/v1/klines"
 
-    params = {
-        "symbol": symbol,
-        "interval": interval,
-        "limit": limit
-    }
+def _klines_weight(limit):
+    # peso do /fapi/v1/klines na Binance depende do limit
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def _fetch_klines(env, params):
+    url = f"{_base_url(env)}/fapi/v1/klines"
+
+    r = rate_limit.request(
+        "binance", None, "market", "GET", url,
+        weight=_klines_weight(int(params.get("limit", 500))),
+        params=params,
+        timeout=10
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+def get_candles_binance(symbol, interval="5m", limit=200, env="real"):
+    """
+    Devolve os últimos `limit` candles.
 
-    log_debug("market_data", "A obter candles Binance", params)
+    Mantém um buffer por (env, symbol, interval): depois do primeiro pedido
+    só são pedidos os candles a partir do último open_time (startTime),
+    reescrevendo o candle em formação e acrescentando os novos.
+
+    Com o streaming ativo e sincronizado, o buffer já está atualizado pelo
+    WebSocket e não é feito nenhum pedido REST.
+    """
+    buf = get_buffer(env, symbol, interval, limit)
+    step = INTERVAL_MS.get(interval)
 
     try:
-        r = requests.get(url, params=params, timeout=10)
-        r.raise_for_status()
-
-        rows = r.json()
-
-        df = pd.DataFrame(
-            rows,
-            columns=[
-                "open_time",
-                "open",
-                "high",
-                "low",
-                "close",
-                "volume",
-                "_",
-                "_",
-                "_",
-                "_",
-                "_",
-                "_"
-            ]
-        )
-
-        for c in ["open", "high", "low", "close"]:
-            df[c] = df[c].astype(float)
-
-        return df.reset_index(drop=True)
+        with buf.lock:
+            if buf.size > 0 and market_stream.is_live(env, symbol, interval):
+                return buf.to_frame(limit)
+
+            last = buf.last_open_time
+            now_ms = int(time.time() * 1000)
+
+            params = {
+                "symbol": symbol,
+                "interval": interval,
+                "limit": limit
+            }
+
+            if last is not None and step:
+                # candles em falta (+ o candle em formação)
+                missing = (now_ms - last) // step + 1
+
+                if missing < buf.capacity:
+                    params["startTime"] = last
+                    params["limit"] = int(min(missing + 1, MAX_KLINES_PER_REQUEST))
+                else:
+                    # intervalo demasiado grande → recarregar tudo
+                    buf.clear()
+
+            log_debug("market_data", "A obter candles Binance", params)
+
+            rows = _fetch_klines(env, params)
+            buf.update_rows(rows)
+
+            # buffer em dia → o stream pode voltar a ser usado
+            market_stream.clear_gap(env, symbol, interval)
+
+            return buf.to_frame(limit)
 
     except Exception as e:
         log_error("market_data", "Erro ao obter candles Binance", e)
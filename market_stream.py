@@ -0,0 +1,313 @@
+import json
+import time
+import threading
+
+import yaml
+
+from logger import log_debug, log_error, log_info
+from kline_buffer import INTERVAL_MS, apply_kline
+
+try:
+    import websocket
+except ImportError:  # websocket-client é opcional (só para o modo streaming)
+    websocket = None
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+cfg = yaml.safe_load(open("config.yaml"))
+
+STREAM_CFG = cfg.get("market_data", {}).get("stream", {}) or {}
+
+ENABLED = bool(STREAM_CFG.get("enabled", False))
+STALE_AFTER = float(STREAM_CFG.get("stale_after_seconds", 90))
+RECONNECT_DELAY = float(STREAM_CFG.get("reconnect_delay_seconds", 5))
+
+# Binance aceita no máximo 200 streams por ligação
+MAX_STREAMS_PER_CONNECTION = 200
+
+WS_URLS = {
+    "real": "wss://fstream.binance.com",
+    "testnet": "wss://stream.binancefuture.com"
+}
+WS_URLS.update(STREAM_CFG.get("urls") or {})
+
+
+def _stream_name(symbol, interval):
+    return f"{symbol.lower()}@kline_{interval}"
+
+
+# =====================================================
+# LIGAÇÃO (COMBINED STREAMS) POR AMBIENTE
+# =====================================================
+class KlineStream:
+    """
+    Uma ligação WebSocket com os streams de kline de um ambiente.
+    Cada mensagem atualiza o KlineBuffer correspondente.
+    """
+
+    def __init__(self, env, url):
+        self.env = env
+        self.url = url.rstrip("/")
+
+        self._lock = threading.Lock()
+        self._streams = set()
+        self._last_update = {}
+        self._gap = set()
+        self._ws = None
+        self._connected = False
+        self._thread = None
+        self._stop = threading.Event()
+        self._next_id = 1
+
+    # -------------------------------------------------
+    # SUBSCRIÇÕES
+    # -------------------------------------------------
+    def set_streams(self, keys):
+        """
+        keys: conjunto de (symbol, interval) em uso
+        """
+        wanted = {_stream_name(s, i) for s, i in keys}
+
+        if len(wanted) > MAX_STREAMS_PER_CONNECTION:
+            log_error(
+                "market_stream",
+                "Demasiados streams numa ligação",
+                {"env": self.env, "streams": len(wanted)}
+            )
+            wanted = set(sorted(wanted)[:MAX_STREAMS_PER_CONNECTION])
+
+        with self._lock:
+            added = wanted - self._streams
+            removed = self._streams - wanted
+            self._streams = wanted
+            ws = self._ws if self._connected else None
+
+        if ws is not None:
+            if added:
+                self._send(ws, "SUBSCRIBE", sorted(added))
+            if removed:
+                self._send(ws, "UNSUBSCRIBE", sorted(removed))
+
+        if self._thread is None and wanted:
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f"kline-stream-{self.env}",
+                daemon=True
+            )
+            self._thread.start()
+
+    def _send(self, ws, method, params):
+        with self._lock:
+            msg_id = self._next_id
+            self._next_id += 1
+
+        try:
+            ws.send(json.dumps({"method": method, "params": params, "id": msg_id}))
+            log_debug("market_stream", f"{method} enviado", params)
+        except Exception as e:
+            log_error("market_stream", f"Erro ao enviar {method}", e)
+
+    # -------------------------------------------------
+    # ESTADO
+    # -------------------------------------------------
+    def is_live(self, symbol, interval) -> bool:
+        """
+        True se o stream está ligado, sem falhas e recebeu dados recentes
+        """
+        name = _stream_name(symbol, interval)
+
+        with self._lock:
+            if not self._connected or name not in self._streams or name in self._gap:
+                return False
+            last = self._last_update.get(name)
+
+        return last is not None and time.time() - last < STALE_AFTER
+
+    def clear_gap(self, symbol, interval):
+        with self._lock:
+            self._gap.discard(_stream_name(symbol, interval))
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            ws = self._ws
+        if ws is not None:
+            ws.close()
+
+    # -------------------------------------------------
+    # LOOP DA LIGAÇÃO
+    # -------------------------------------------------
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                streams = sorted(self._streams)
+
+            if not streams:
+                self._stop.wait(1)
+                continue
+
+            url = f"{self.url}/stream?streams={'/'.join(streams)}"
+            log_info("market_stream", "A ligar stream de klines", {
+                "env": self.env,
+                "streams": len(streams)
+            })
+
+            ws = websocket.WebSocketApp(
+                url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close
+            )
+
+            with self._lock:
+                self._ws = ws
+
+            try:
+                ws.run_forever(ping_interval=60, ping_timeout=20)
+            except Exception as e:
+                log_error("market_stream", "Erro na ligação WebSocket", e)
+
+            with self._lock:
+                self._ws = None
+                self._connected = False
+                # dados perdidos durante a falha → REST até voltar a sincronizar
+                self._gap.update(self._streams)
+
+            if not self._stop.is_set():
+                self._stop.wait(RECONNECT_DELAY)
+
+    def _on_open(self, ws):
+        with self._lock:
+            self._connected = True
+        log_debug("market_stream", "Stream de klines ligado", {"env": self.env})
+
+    def _on_error(self, ws, error):
+        log_error("market_stream", "Erro no stream de klines", error)
+
+    def _on_close(self, ws, status, reason):
+        with self._lock:
+            self._connected = False
+        log_info("market_stream", "Stream de klines desligado", {
+            "env": self.env,
+            "status": status,
+            "reason": reason
+        })
+
+    def _on_message(self, ws, message):
+        try:
+            msg = json.loads(message)
+            data = msg.get("data", msg)
+
+            if data.get("e") != "kline":
+                return
+
+            k = data["k"]
+            name = _stream_name(k["s"], k["i"])
+
+            applied = apply_kline(
+                self.env,
+                k["s"],
+                k["i"],
+                k["t"],
+                k["o"],
+                k["h"],
+                k["l"],
+                k["c"],
+                k["v"],
+                k["T"],
+                step_ms=INTERVAL_MS.get(k["i"])
+            )
+
+            with self._lock:
+                self._last_update[name] = time.time()
+                if not applied:
+                    # buffer vazio ou candle em falta → resincronizar por REST
+                    self._gap.add(name)
+
+            if k.get("x") and applied:
+                _notify_close(self.env, k["s"], k["i"], k["t"])
+
+        except Exception as e:
+            log_error("market_stream", "Erro ao processar mensagem", e)
+
+
+# =====================================================
+# API
+# =====================================================
+_streams = {}
+_lock = threading.Lock()
+_close_listeners = []
+
+
+def add_close_listener(fn):
+    """
+    fn(env, symbol, interval, open_time) é chamada quando um candle fecha
+    """
+    _close_listeners.append(fn)
+
+
+def _notify_close(env, symbol, interval, open_time):
+    for fn in list(_close_listeners):
+        try:
+            fn(env, symbol, interval, int(open_time))
+        except Exception as e:
+            log_error("market_stream", "Erro no listener de fecho de candle", e)
+
+
+def _get_stream(env):
+    with _lock:
+        stream = _streams.get(env)
+        if stream is None:
+            stream = _streams[env] = KlineStream(env, WS_URLS[env])
+        return stream
+
+
+def enabled() -> bool:
+    return ENABLED and websocket is not None
+
+
+def subscribe(keys):
+    """
+    keys: conjunto de (env, symbol, interval) em uso neste ciclo
+    """
+    if not enabled():
+        return
+
+    by_env = {}
+    for env, symbol, interval in keys:
+        by_env.setdefault(env, set()).add((symbol, interval))
+
+    with _lock:
+        envs = set(_streams) | set(by_env)
+
+    for env in envs:
+        _get_stream(env).set_streams(by_env.get(env, set()))
+
+
+def is_live(env, symbol, interval) -> bool:
+    if not enabled():
+        return False
+
+    with _lock:
+        stream = _streams.get(env)
+
+    return stream is not None and stream.is_live(symbol, interval)
+
+
+def clear_gap(env, symbol, interval):
+    with _lock:
+        stream = _streams.get(env)
+
+    if stream is not None:
+        stream.clear_gap(symbol, interval)
+
+
+if ENABLED and websocket is None:
+    log_error(
+        "market_stream",
+        "Streaming ativo mas websocket-client não está instalado",
+        None
+    )
@@ -0,0 +1,70 @@
+import time
+
+import user_stream
+from cycle_cache import CycleCache
+
+
+# =====================================================
+# SNAPSHOT DE POSIÇÕES POR CONTA (PARTILHADO)
+# =====================================================
+#
+# Chave: (corretora, env, api_key, scope)
+# As corretoras devolvem todas as posições da conta num só pedido.
+# O snapshot é obtido uma vez por ciclo e partilhado pela verificação de
+# posição aberta, pelos trades fechados e por todos os clientes/símbolos
+# com a mesma API key. Depois de uma ordem a conta é invalidada.
+# Com o stream de conta ligado (user_stream), as posições vêm do estado
+# local e o REST só é usado para semear/reconciliar.
+
+_cache = CycleCache("position_cache", "Estatísticas do snapshot de posições")
+
+
+# =====================================================
+# API
+# =====================================================
+def get_positions(corretora, env, api_key, fetch, scope=None):
+    """
+    Lista de posições da conta; fetch() só é chamado uma vez por ciclo.
+    Erros de fetch() propagam e não ficam em cache.
+    A lista devolvida é partilhada: não deve ser alterada.
+    """
+    live = user_stream.get_positions(corretora, env, api_key, scope)
+    if live is not None:
+        _cache.count("stream")
+        return live
+
+    def _fetch():
+        started = time.time()
+        positions = fetch()
+        user_stream.seed(corretora, env, api_key, positions, started, scope)
+        return positions
+
+    return _cache.get((corretora, env, api_key, scope), _fetch)
+
+
+def find_position(positions, symbol):
+    return next((p for p in positions if p.get("symbol") == symbol), None)
+
+
+def invalidate(corretora=None, env=None, api_key=None, stream=True):
+    """
+    Descarta o snapshot da conta (ex.: depois de enviar uma ordem).
+    Com stream=True o estado do stream de conta também é reconciliado.
+    """
+    def match(key):
+        k_corretora, k_env, k_api_key, _ = key
+        return (
+            (corretora is None or k_corretora == corretora)
+            and (env is None or k_env == env)
+            and (api_key is None or k_api_key == api_key)
+        )
+
+    _cache.count("invalidations", _cache.invalidate(match))
+
+    if stream and corretora is not None and env is not None and api_key is not None:
+        user_stream.invalidate(corretora, env, api_key)
+
+
+begin_cycle = _cache.begin_cycle
+get_stats = _cache.get_stats
+log_stats = _cache.log_stats
@@ -0,0 +1,286 @@
+import time
+import hashlib
+import threading
+from urllib.parse import urlsplit
+
+import yaml
+
+import http_client
+import time_sync
+from logger import log_debug, log_error
+
+# =====================================================
+# CONFIG
+# =====================================================
+cfg = yaml.safe_load(open("config.yaml"))
+
+RL_CFG = cfg.get("rate_limit", {}) or {}
+
+BINANCE_IP_WEIGHT = int(RL_CFG.get("binance_ip_weight_per_minute", 2400))
+BINANCE_ORDERS = int(RL_CFG.get("binance_orders_per_minute", 1200))
+BYBIT_IP_REQUESTS = int(RL_CFG.get("bybit_ip_requests_per_5s", 600))
+MAX_WAIT = float(RL_CFG.get("max_wait_seconds", 30))
+DEFAULT_RETRY_AFTER = float(RL_CFG.get("default_retry_after_seconds", 10))
+
+# Prioridades: order > position/market > history. Cada uma só usa a
+# fração do limite indicada; o resto fica reservado para as de cima.
+THRESHOLDS = {"order": 1.0, "position": 0.85, "market": 0.85, "history": 0.6}
+THRESHOLDS.update(RL_CFG.get("thresholds") or {})
+
+
+class RateLimitError(Exception):
+    """
+    IP ou conta banida/limitada pela corretora (418/429 com Retry-After):
+    o pedido não é enviado, porque enviar durante o ban prolonga-o
+    """
+
+
+# =====================================================
+# JANELAS DE LIMITE
+# =====================================================
+class Bucket:
+    """
+    Uso de uma janela de limite (ex.: peso por minuto de um IP).
+    O valor local é estimado a cada pedido e corrigido pelos headers.
+    """
+
+    def __init__(self, name, limit, window):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.used = 0
+        self.reset_at = 0.0
+        self.banned_until = 0.0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.rejected = 0
+        self.refused = 0
+
+    def _roll(self, now):
+        if now >= self.reset_at:
+            self.used = 0
+            self.reset_at = (int(now // self.window) + 1) * self.window
+
+    def wait_time(self, weight, threshold, now) -> float:
+        self._roll(now)
+        if self.used + weight > self.limit * threshold:
+            return self.reset_at - now
+        return 0.0
+
+    def consume(self, weight, now):
+        self._roll(now)
+        self.used += weight
+
+    def observe(self, used, now, limit=None, reset_at=None):
+        """
+        Valor real do header (usado desde o início da janela)
+        """
+        self._roll(now)
+        if limit:
+            self.limit = limit
+        if reset_at:
+            self.reset_at = reset_at
+        self.used = max(self.used, used)
+
+    def stats(self, now) -> dict:
+        self._roll(now)
+        return {
+            "used": self.used,
+            "limit": self.limit,
+            "usage": round(self.used / self.limit, 3) if self.limit else 0.0,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 2),
+            "rejected": self.rejected,
+            "refused": self.refused,
+            "banned_for": round(max(0.0, self.banned_until - now), 1)
+        }
+
+
+# =====================================================
+# ESTADO (POR IP/HOST E POR API KEY)
+# =====================================================
+_buckets = {}
+_cond = threading.Condition()
+
+
+def _bucket(name, limit, window):
+    bucket = _buckets.get(name)
+    if bucket is None:
+        bucket = _buckets[name] = Bucket(name, limit, window)
+    return bucket
+
+
+def _host(url):
+    return urlsplit(url).netloc
+
+
+def _account(api_key):
+    # hash da key inteira: keys com o mesmo prefixo não partilham janela
+    # (nem ban), e a key não aparece nas estatísticas
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def _buckets_for(exchange, api_key, priority, url):
+    """
+    Janelas que um pedido consome (chamado com _cond)
+    """
+    host = _host(url)
+
+    if exchange == "binance":
+        buckets = [_bucket(f"binance|ip|{host}", BINANCE_IP_WEIGHT, 60)]
+        if priority == "order" and api_key:
+            buckets.append(_bucket(f"binance|orders|{_account(api_key)}", BINANCE_ORDERS, 60))
+        return buckets
+
+    if exchange == "bybit":
+        buckets = [_bucket(f"bybit|ip|{host}", BYBIT_IP_REQUESTS, 5)]
+        if api_key:
+            # limite por UID e endpoint (valores reais vêm nos headers X-Bapi-*)
+            path = urlsplit(url).path
+            buckets.append(_bucket(f"bybit|{_account(api_key)}|{path}", 10, 1))
+        return buckets
+
+    return []
+
+
+def _acquire(buckets, priority, weight):
+    threshold = THRESHOLDS.get(priority, 1.0)
+    deadline = time.time() + MAX_WAIT
+    waited = 0.0
+
+    with _cond:
+        while True:
+            now = time.time()
+
+            banned = [b for b in buckets if now < b.banned_until]
+            if banned:
+                for b in banned:
+                    b.refused += 1
+                raise RateLimitError(
+                    f"{banned[0].name} banido por mais "
+                    f"{max(b.banned_until for b in banned) - now:.0f}s"
+                )
+
+            wait = max((b.wait_time(weight, threshold, now) for b in buckets), default=0.0)
+
+            if wait <= 0 or now >= deadline:
+                for b in buckets:
+                    b.consume(weight, now)
+                    if waited:
+                        b.waits += 1
+                        b.wait_seconds += waited
+                return waited
+
+            wait = min(wait, deadline - now)
+            _cond.wait(wait)
+            waited += time.time() - now
+
+
+def _rejected_bucket(exchange, buckets, response):
+    """
+    Janela que levou o 418/429: o IP (buckets[0]) só num 418 da Binance ou
+    num 429 de peso por IP; limites por conta (ordens da Binance, UID e
+    endpoint da Bybit) só bloqueiam essa conta
+    """
+    if len(buckets) == 1 or response.status_code == 418:
+        return buckets[0]
+
+    if exchange == "binance":
+        # -1015 = demasiadas ordens (limite da conta); -1003 = peso do IP
+        try:
+            code = response.json().get("code")
+        except Exception:
+            code = None
+
+        orders = response.headers.get("X-MBX-ORDER-COUNT-1M")
+        if code == -1015 or (orders is not None and int(orders) >= buckets[1].limit):
+            return buckets[1]
+        return buckets[0]
+
+    # Bybit: pedidos assinados são limitados por UID e endpoint
+    return buckets[1]
+
+
+def _observe(exchange, buckets, response):
+    now = time.time()
+    headers = response.headers
+
+    with _cond:
+        if exchange == "binance":
+            used = headers.get("X-MBX-USED-WEIGHT-1M")
+            if used is not None:
+                buckets[0].observe(int(used), now)
+
+            orders = headers.get("X-MBX-ORDER-COUNT-1M")
+            if orders is not None and len(buckets) > 1:
+                buckets[1].observe(int(orders), now)
+
+        elif exchange == "bybit" and len(buckets) > 1:
+            remaining = headers.get("X-Bapi-Limit-Status")
+            limit = headers.get("X-Bapi-Limit")
+            reset_ms = headers.get("X-Bapi-Limit-Reset-Timestamp")
+
+            if remaining is not None and limit is not None:
+                buckets[1].observe(
+                    int(limit) - int(remaining),
+                    now,
+                    limit=int(limit),
+                    reset_at=int(reset_ms) / 1000 if reset_ms else None
+                )
+
+        if response.status_code in (418, 429):
+            retry_after = headers.get("Retry-After")
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = DEFAULT_RETRY_AFTER
+
+            banned = _rejected_bucket(exchange, buckets, response)
+            for b in buckets:
+                b.rejected += 1
+            banned.banned_until = max(banned.banned_until, now + delay)
+
+        _cond.notify_all()
+
+    if response.status_code in (418, 429):
+        log_error(exchange, "Limite de pedidos excedido", {
+            "status": response.status_code,
+            "retry_after": delay,
+            "url": response.url.split("?")[0]
+        })
+
+
+# =====================================================
+# API
+# =====================================================
+def request(exchange, api_key, priority, method, url, weight=1, **kwargs):
+    """
+    http_client.request com controlo de limites: espera (até MAX_WAIT)
+    se a prioridade já gastou a sua parte da janela e lê os headers de uso.
+    Durante um ban (418/429) levanta RateLimitError sem enviar.
+    """
+    with _cond:
+        buckets = _buckets_for(exchange, api_key, priority, url)
+
+    waited = _acquire(buckets, priority, weight)
+    if waited:
+        log_debug("rate_limit", "Pedido atrasado pelo limite", {
+            "exchange": exchange,
+            "priority": priority,
+            "waited": round(waited, 2)
+        })
+
+    response = http_client.request(method, url, **kwargs)
+    _observe(exchange, buckets, response)
+    time_sync.check_response(exchange, response)
+    return response
+
+
+def get_stats() -> dict:
+    now = time.time()
+    with _cond:
+        return {name: b.stats(now) for name, b in _buckets.items()}
+
+
+def log_stats():
+    log_debug("rate_limit", "Uso dos limites das corretoras", get_stats)
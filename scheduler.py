@@ -0,0 +1,149 @@
+import time
+import threading
+
+from candle_cache import interval_seconds
+from logger import log_debug, log_error
+
+
+# =====================================================
+# SCHEDULER POR FECHO DE CANDLE
+# =====================================================
+class CandleScheduler:
+    """
+    Acorda no fecho de cada candle (env, symbol, interval) e chama
+    handler(key, clients, candle_open_time_ms) só com os clientes
+    subscritos a essa chave.
+
+    O fecho chega pelo stream de klines (notify_close) ou, sem stream,
+    por um temporizador alinhado com o fecho + close_delay segundos.
+    Cada candle é avaliado uma única vez. Pelo temporizador, um fecho com
+    mais de max_late segundos de atraso (arranque, subscrição nova, loop
+    atrasado) não é avaliado: fica só marcado e espera-se pelo próximo.
+    """
+
+    def __init__(self, handler, close_delay=2.0, max_late=10.0):
+        self.handler = handler
+        self.close_delay = float(close_delay)
+        self.max_late = float(max_late)
+
+        self._cond = threading.Condition()
+        self._subs = {}
+        self._pending = {}
+        self._last_fired = {}
+        self._thread = None
+
+    # -------------------------------------------------
+    # SUBSCRIÇÕES
+    # -------------------------------------------------
+    def set_subscriptions(self, subs):
+        """
+        subs: {(env, symbol, interval): [clientes]}
+        """
+        with self._cond:
+            self._subs = {k: list(v) for k, v in subs.items() if v}
+
+            for key in list(self._last_fired):
+                if key not in self._subs:
+                    self._last_fired.pop(key, None)
+                    self._pending.pop(key, None)
+
+            self._cond.notify()
+
+    def notify_close(self, env, symbol, interval, open_time):
+        """
+        Fecho de candle recebido do stream (kline com x=true)
+        """
+        key = (env, symbol, interval)
+
+        with self._cond:
+            if key not in self._subs:
+                return
+            self._pending[key] = int(open_time)
+            self._cond.notify()
+
+    # -------------------------------------------------
+    # LOOP
+    # -------------------------------------------------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run,
+                name="candle-scheduler",
+                daemon=True
+            )
+            self._thread.start()
+
+    def _last_closed_open_ms(self, interval, now):
+        """
+        open_time (ms) do último candle já fechado
+        """
+        step = interval_seconds(interval)
+        return (int(now // step) - 1) * step * 1000
+
+    def _due(self, now):
+        """
+        Chaves a avaliar agora + segundos até ao próximo fecho
+        """
+        due = {}
+        wait = 60.0
+
+        for key in self._subs:
+            interval = key[2]
+            step = interval_seconds(interval)
+
+            # fecho recebido pelo stream
+            if key in self._pending:
+                due[key] = self._pending.pop(key)
+
+            # temporizador (fallback): fecho + close_delay
+            elif now - (now // step) * step >= self.close_delay:
+                t = self._last_closed_open_ms(interval, now)
+                late = now - (now // step) * step - self.close_delay
+
+                if late <= self.max_late:
+                    due[key] = t
+                elif self._last_fired.get(key) is None or t > self._last_fired[key]:
+                    # candle fechado há demasiado tempo: o cruzamento já é
+                    # antigo → não avaliar, só o próximo fecho
+                    self._last_fired[key] = t
+                    log_debug("scheduler", "Fecho de candle antigo ignorado", {
+                        "key": list(key),
+                        "open_time": t,
+                        "late": round(late, 1)
+                    })
+
+            next_fire = (now // step + 1) * step + self.close_delay
+            wait = min(wait, next_fire - now)
+
+        due = {
+            k: t for k, t in due.items()
+            if self._last_fired.get(k) is None or t > self._last_fired[k]
+        }
+        for key, t in due.items():
+            self._last_fired[key] = t
+
+        return due, max(0.05, wait)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due, wait = self._due(time.time())
+                if not due:
+                    self._cond.wait(wait)
+                    continue
+                jobs = [(k, t, self._subs.get(k, [])) for k, t in due.items()]
+
+            for key, open_time, clients in jobs:
+                close_ms = open_time + interval_seconds(key[2]) * 1000
+
+                log_debug("scheduler", "Fecho de candle", {
+                    "key": list(key),
+                    "open_time": open_time,
+                    "clients": len(clients),
+                    "delay": round(time.time() - close_ms / 1000, 3)
+                })
+
+                try:
+                    self.handler(key, clients, open_time)
+                except Exception as e:
+                    log_error("scheduler", "Erro ao avaliar fecho de candle", e)
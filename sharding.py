@@ -0,0 +1,236 @@
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import argparse
+import threading
+
+import yaml
+
+# Nota: o logger usa worker_path() → os logs são importados só nas funções
+
+# =====================================================
+# CONFIG (config.yaml + argumentos da linha de comando)
+# =====================================================
+cfg = yaml.safe_load(open("config.yaml"))
+
+SHARD_CFG = cfg.get("sharding", {}) or {}
+
+_parser = argparse.ArgumentParser(add_help=False)
+_parser.add_argument("--shard-index", type=int)
+_parser.add_argument("--shard-count", type=int)
+_parser.add_argument("--worker-id")
+_parser.add_argument("--coordinator-dir")
+_args, _ = _parser.parse_known_args(sys.argv[1:])
+
+SHARD_INDEX = _args.shard_index if _args.shard_index is not None else SHARD_CFG.get("index")
+SHARD_COUNT = int(_args.shard_count or SHARD_CFG.get("count") or 1)
+COORDINATOR_DIR = _args.coordinator_dir or SHARD_CFG.get("coordinator_dir") or None
+LEASE_SECONDS = float(SHARD_CFG.get("lease_seconds", 30))
+RENEW_SECONDS = float(SHARD_CFG.get("renew_seconds", 5))
+
+# "static": índice/contagem fixos | "coordinated": membros por lease em disco
+if COORDINATOR_DIR:
+    MODE = "coordinated"
+elif SHARD_COUNT > 1:
+    MODE = "static"
+else:
+    MODE = "off"
+
+if MODE == "static":
+    WORKER_ID = _args.worker_id or f"shard{int(SHARD_INDEX or 0)}"
+elif MODE == "coordinated":
+    # tem de ser estável entre restarts (outbox e logs por worker)
+    WORKER_ID = _args.worker_id or SHARD_CFG.get("worker_id") or socket.gethostname()
+else:
+    WORKER_ID = None
+
+# processo de um worker_pool (definido pelo supervisor ao lançar o processo)
+PROCESS_INDEX = os.environ.get("IFOREX_PROCESS_INDEX")
+
+
+# =====================================================
+# PARTIÇÃO (RENDEZVOUS HASHING)
+# =====================================================
+#
+# Cada IDCliente pertence ao worker com o maior hash(worker|cliente).
+# A partição é estável: quando um worker entra ou sai só mudam de dono
+# os clientes desse worker (~1/N), os restantes ficam onde estavam.
+#
+# Modo coordinated: cada worker renova um ficheiro de lease em
+# COORDINATOR_DIR; os membros são os leases com menos de LEASE_SECONDS.
+# Um worker novo só assume clientes depois de LEASE_SECONDS registado,
+# para os outros já o verem e largarem esses clientes (sem duplicados).
+
+def _score(worker, client_id):
+    return hashlib.md5(f"{worker}|{client_id}".encode()).digest()
+
+
+def owner(client_id, workers):
+    return max(workers, key=lambda w: _score(w, client_id)) if workers else None
+
+
+def worker_path(path):
+    """
+    Caminho próprio do worker/processo
+    (ex.: outbox.jsonl → outbox.shard1.jsonl, outbox.shard1.p2.jsonl)
+    """
+    parts = [p for p in (WORKER_ID, PROCESS_INDEX and f"p{PROCESS_INDEX}") if p]
+    if not parts or not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{'.'.join(parts)}{ext}"
+
+
+_lock = threading.Lock()
+_members = []
+_joined_at = None
+_owned = []
+_thread = None
+
+
+def _lease_file(worker_id):
+    return os.path.join(COORDINATOR_DIR, f"{worker_id}.lease")
+
+
+def _renew():
+    global _joined_at
+
+    os.makedirs(COORDINATOR_DIR, exist_ok=True)
+    now = time.time()
+    if _joined_at is None:
+        _joined_at = now
+
+    tmp = _lease_file(WORKER_ID) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"worker": WORKER_ID, "pid": os.getpid(), "joined_at": _joined_at, "renewed_at": now}, f)
+    os.replace(tmp, _lease_file(WORKER_ID))
+
+
+def _scan():
+    now = time.time()
+    members = []
+
+    for name in os.listdir(COORDINATOR_DIR):
+        if not name.endswith(".lease"):
+            continue
+        try:
+            if now - os.path.getmtime(os.path.join(COORDINATOR_DIR, name)) < LEASE_SECONDS:
+                members.append(name[:-len(".lease")])
+        except OSError:
+            continue
+
+    return sorted(members)
+
+
+def _coordinate():
+    from logger import log_error, log_info
+
+    while True:
+        try:
+            _renew()
+            members = _scan()
+
+            with _lock:
+                changed = members != _members
+                _members[:] = members
+
+            if changed:
+                log_info("sharding", "Workers alterados, a rebalancear", {
+                    "worker": WORKER_ID,
+                    "members": members
+                })
+        except Exception as e:
+            log_error("sharding", "Erro no lease do worker", e)
+
+        time.sleep(RENEW_SECONDS)
+
+
+def _leave():
+    try:
+        os.remove(_lease_file(WORKER_ID))
+    except OSError:
+        pass
+
+
+# =====================================================
+# API
+# =====================================================
+def start():
+    """
+    Modo coordinated: regista o worker e mantém o lease (chamado no arranque)
+    """
+    global _thread
+    import atexit
+
+    if MODE != "coordinated" or _thread is not None:
+        return
+
+    _renew()
+    with _lock:
+        _members[:] = _scan()
+
+    atexit.register(_leave)
+    _thread = threading.Thread(target=_coordinate, name="sharding", daemon=True)
+    _thread.start()
+
+
+def _workers():
+    """
+    Workers ativos vistos por este worker (None = ainda não assume clientes)
+    """
+    if MODE == "static":
+        return [f"shard{i}" for i in range(SHARD_COUNT)]
+
+    with _lock:
+        members = list(_members)
+
+    if _joined_at is None or time.time() - _joined_at < LEASE_SECONDS:
+        return None
+    if WORKER_ID not in members:
+        members.append(WORKER_ID)
+    return members
+
+
+def filter_clients(clients) -> list:
+    """
+    Só os clientes deste worker (sem sharding devolve todos)
+    """
+    global _owned
+
+    if MODE == "off":
+        return clients
+
+    workers = _workers()
+    if workers is None:
+        owned = []
+    else:
+        me = f"shard{int(SHARD_INDEX or 0)}" if MODE == "static" else WORKER_ID
+        owned = [c for c in clients if owner(str(c.get("IDCliente")), workers) == me]
+
+    with _lock:
+        _owned = [c.get("IDCliente") for c in owned]
+
+    return owned
+
+
+def get_status() -> dict:
+    """
+    Estado para o heartbeat: worker, shard e clientes deste worker
+    """
+    if MODE == "off":
+        return {}
+
+    with _lock:
+        status = {
+            "Worker": WORKER_ID,
+            "ShardMode": MODE,
+            "Workers": len(_members) if MODE == "coordinated" else SHARD_COUNT,
+            "Clients": list(_owned)
+        }
+
+    if MODE == "static":
+        status["Shard"] = f"{int(SHARD_INDEX or 0)}/{SHARD_COUNT}"
+    return status
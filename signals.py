@@ -0,0 +1,27 @@
+from cycle_cache import CycleCache
+
+
+# =====================================================
+# SINAIS POR SÍMBOLO (PARTILHADOS ENTRE CLIENTES)
+# =====================================================
+#
+# O sinal Falcon (crossover + tendência) só depende dos candles, por isso é
+# calculado uma vez por chave e partilhado pelos clientes desse símbolo.
+# Chave: (env, symbol, interval, candle) — candle é None no modo poll ou o
+# open_time do candle fechado no modo candle_close.
+# O SL/TP de cada cliente é aplicado depois (strategy_falcon.apply_risk).
+
+_cache = CycleCache("signals", "Estatísticas de sinais")
+
+
+def get_signal(key, compute):
+    """
+    Devolve o sinal da chave; compute() só é chamado uma vez por ciclo.
+    Um resultado None (sem sinal ou sem candles) também é partilhado.
+    """
+    return _cache.get(key, compute)
+
+
+begin_cycle = _cache.begin_cycle
+get_stats = _cache.get_stats
+log_stats = _cache.log_stats
@@ -0,0 +1,42 @@
+import hmac
+import hashlib
+import threading
+
+
+# =====================================================
+# ASSINATURA HMAC-SHA256 COM ESTADO PRÉ-CALCULADO
+# =====================================================
+#
+# hmac.new(secret, ...) processa a chave (ipad/opad) a cada assinatura.
+# Aqui o HMAC já com a chave fica guardado por secret e cada assinatura
+# só faz copy() + update() do payload.
+
+_signers = {}
+_lock = threading.Lock()
+
+
+def _keyed(secret):
+    base = _signers.get(secret)
+    if base is None:
+        with _lock:
+            base = _signers.get(secret)
+            if base is None:
+                base = _signers[secret] = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+    return base
+
+
+def sign(secret: str, payload: str) -> str:
+    """
+    Igual a hmac.new(secret, payload, sha256).hexdigest()
+    """
+    h = _keyed(secret).copy()
+    h.update(payload.encode())
+    return h.hexdigest()
+
+
+def forget(secret: str):
+    """
+    Descarta o estado de um secret (ex.: cliente removido/rodado)
+    """
+    with _lock:
+        _signers.pop(secret, None)
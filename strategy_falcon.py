@@ -1,37 +1,120 @@
+import numpy as np
+import pandas as pd
+import yaml
+
+from indicators import update_emas
+
+cfg = yaml.safe_load(open("config.yaml"))
+
+# EMAs (rápida, lenta, tendência); ajustáveis com sweep.py
+EMA_SPANS = tuple(int(s) for s in (cfg.get("strategy", {}) or {}).get("ema_spans", (9, 20, 50)))
+
+
 def ema(series, period):
     return series.ewm(span=period, adjust=False).mean()
 
-def falcon_strategy(df, cfg):
-    df["ema9"] = ema(df["close"], 9)
-    df["ema20"] = ema(df["close"], 20)
-    df["ema50"] = ema(df["close"], 50)
 
-    last = df.iloc[-1]
-    prev = df.iloc[-2]
+def _decide(prev, last, close):
+    """
+    prev/last: (ema9, ema20, ema50) no penúltimo e no último candle.
+    Só depende dos candles → calculado uma vez por símbolo.
+    """
+    prev_ema9, prev_ema20, _ = prev
+    last_ema9, last_ema20, last_ema50 = last
+
+    long_signal = prev_ema9 < prev_ema20 and last_ema9 > last_ema20
+    short_signal = prev_ema9 > prev_ema20 and last_ema9 < last_ema20
+
+    trend_long = last_ema20 > last_ema50
+    trend_short = last_ema20 < last_ema50
+
+    if long_signal and trend_long:
+        return {"side": "BUY", "entry": close}
+
+    if short_signal and trend_short:
+        return {"side": "SELL", "entry": close}
+
+    return None
 
-    long_signal = prev.ema9 < prev.ema20 and last.ema9 > last.ema20
-    short_signal = prev.ema9 > prev.ema20 and last.ema9 < last.ema20
 
-    trend_long = last.ema20 > last.ema50
-    trend_short = last.ema20 < last.ema50
+def apply_risk(signal, cfg):
+    """
+    Etapa por cliente: acrescenta SL/TP (StopLoss/TakeProfit em %) ao sinal
+    """
+    if not signal:
+        return None
 
+    close = signal["entry"]
     sl = cfg["StopLoss"] / 100
     tp = cfg["TakeProfit"] / 100
 
-    if long_signal and trend_long:
+    if signal["side"] == "BUY":
         return {
             "side": "BUY",
-            "entry": last.close,
-            "stop": last.close * (1 - sl),
-            "take": last.close * (1 + tp)
+            "entry": close,
+            "stop": close * (1 - sl),
+            "take": close * (1 + tp)
         }
 
-    if short_signal and trend_short:
-        return {
-            "side": "SELL",
-            "entry": last.close,
-            "stop": last.close * (1 + sl),
-            "take": last.close * (1 - tp)
-        }
+    return {
+        "side": "SELL",
+        "entry": close,
+        "stop": close * (1 + sl),
+        "take": close * (1 - tp)
+    }
 
-    return None
+
+def falcon_signal(df):
+    """
+    Cálculo completo com pandas (não altera o DataFrame)
+    """
+    emas = [ema(df["close"], span) for span in EMA_SPANS]
+
+    prev = tuple(e.iloc[-2] for e in emas)
+    last = tuple(e.iloc[-1] for e in emas)
+
+    return _decide(prev, last, df["close"].iloc[-1])
+
+
+def falcon_signal_incremental(key, df):
+    """
+    Igual a falcon_signal, mas com EMAs incrementais por (env, symbol, interval)
+    """
+    result = update_emas(
+        key,
+        df["open_time"].to_numpy(),
+        df["close"].to_numpy(),
+        EMA_SPANS
+    )
+
+    if result is None:
+        return None
+
+    prev, last = result
+    return _decide(tuple(prev), tuple(last), float(df["close"].iloc[-1]))
+
+
+def falcon_signals(close, spans=EMA_SPANS):
+    """
+    Versão vetorizada de falcon_signal para todos os candles (backtest):
+    +1 BUY, -1 SELL, 0 sem sinal. O valor no candle i é o que falcon_signal
+    daria com os candles 0..i (cruzamento entre i-1 e i).
+    """
+    close = pd.Series(np.asarray(close, dtype=float))
+    fast, slow, trend = (ema(close, span).to_numpy() for span in spans)
+
+    cross_up = (fast[:-1] < slow[:-1]) & (fast[1:] > slow[1:])
+    cross_down = (fast[:-1] > slow[:-1]) & (fast[1:] < slow[1:])
+
+    sides = np.zeros(len(close), dtype=np.int8)
+    sides[1:][cross_up & (slow[1:] > trend[1:])] = 1
+    sides[1:][cross_down & (slow[1:] < trend[1:])] = -1
+    return sides
+
+
+def falcon_strategy(df, cfg):
+    return apply_risk(falcon_signal(df), cfg)
+
+
+def falcon_strategy_incremental(key, df, cfg):
+    return apply_risk(falcon_signal_incremental(key, df), cfg)
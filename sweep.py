@@ -0,0 +1,222 @@
+"""
+Otimização de parâmetros da estratégia Falcon (EMAs e SL/TP) sobre klines
+guardados, em todos os núcleos (correr a partir da pasta do projeto):
+
+    python sweep.py data/*_5m.csv --fast 5,9,13 --slow 20,26 --trend 50,100 \\
+        --sl 0.5,1,1.5 --tp 1,2,3 [--random 200] --out sweep.csv
+
+Grelha completa por omissão; --random N testa N combinações ao acaso da
+grelha. O PnL é por trade de --notional (USDT), para os símbolos pesarem
+o mesmo; o drawdown é sobre a soma de todos os símbolos por ordem de fecho.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import itertools
+import tempfile
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+import backtest
+from strategy_falcon import EMA_SPANS, falcon_signals
+
+FIELDS = ("open_time", "open", "high", "low", "close")
+
+
+# =====================================================
+# CANDLES PARTILHADOS (MMAP)
+# =====================================================
+#
+# Os klines são lidos uma vez e gravados num só .npy (5 x candles, todos
+# os símbolos seguidos); cada processo abre-o com mmap, por isso as páginas
+# são partilhadas e nada é copiado por tarefa. Fica em /dev/shm (RAM) se
+# existir.
+
+_data = None   # no processo: [(símbolo, {campo: array})]
+
+
+def _share(files):
+    """
+    (ficheiro .npy temporário, [(símbolo, início, fim)])
+    """
+    loaded = [(backtest.symbol_from_path(f), backtest.load_klines(f)) for f in files]
+    total = sum(len(d["close"]) for _, d in loaded)
+
+    tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    fd, path = tempfile.mkstemp(prefix="sweep_", suffix=".npy", dir=tmp_dir)
+    os.close(fd)
+
+    arr = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(len(FIELDS), total))
+    layout = []
+    start = 0
+
+    for symbol, d in loaded:
+        end = start + len(d["close"])
+        for row, field in enumerate(FIELDS):
+            arr[row, start:end] = d[field]
+        layout.append((symbol, start, end))
+        start = end
+
+    arr.flush()
+    del arr
+    return path, layout
+
+
+def _attach(path, layout):
+    global _data
+
+    arr = np.load(path, mmap_mode="r")
+    _data = [
+        (symbol, {
+            field: (arr[row, start:end].astype(np.int64) if field == "open_time" else arr[row, start:end])
+            for row, field in enumerate(FIELDS)
+        })
+        for symbol, start, end in layout
+    ]
+
+
+# =====================================================
+# AVALIAÇÃO
+# =====================================================
+def _evaluate(task):
+    """
+    Uma combinação de EMAs com uma parte dos seus SL/TP: as EMAs e os
+    sinais são calculados uma vez por símbolo e reutilizados em cada SL/TP.
+    """
+    spans, risks, notional, fee_rate = task
+    sides = [falcon_signals(d["close"], spans) for _, d in _data]
+    results = []
+
+    for sl, tp in risks:
+        pnls, times = [], []
+        per_symbol = {}
+
+        for (symbol, d), s in zip(_data, sides):
+            trades = backtest.simulate(d, sl, tp, sides=s)
+            net, _ = backtest.pnl(trades, notional / trades["entry"], fee_rate)
+
+            pnls.append(net)
+            times.append(d["open_time"][trades["exit_idx"]])
+            per_symbol[symbol] = round(float(net.sum()), 4)
+
+        net = np.concatenate(pnls)
+        order = np.argsort(np.concatenate(times), kind="stable")
+        summary = backtest.summarize(net[order])
+
+        results.append({
+            "fast": spans[0],
+            "slow": spans[1],
+            "trend": spans[2],
+            "sl": sl,
+            "tp": tp,
+            **summary,
+            "win_rate": round(summary["wins"] / summary["trades"], 4) if summary["trades"] else 0.0,
+            "per_symbol": per_symbol
+        })
+
+    return results
+
+
+def _combinations(fast, slow, trend, sl, tp, samples=None, seed=42):
+    combos = [
+        c for c in itertools.product(fast, slow, trend, sl, tp)
+        if c[0] < c[1] < c[2]
+    ]
+    if samples and samples < len(combos):
+        combos = random.Random(seed).sample(combos, samples)
+    return combos
+
+
+def _tasks(combos, processes):
+    """
+    [(spans, [(sl, tp)])]: uma tarefa por combinação de EMAs (os SL/TP
+    partilham os sinais); com menos combinações de EMAs do que processos,
+    os SL/TP de cada uma são repartidos para haver tarefas para todos.
+    """
+    by_spans = {}
+    for fast, slow, trend, sl, tp in combos:
+        by_spans.setdefault((fast, slow, trend), []).append((sl, tp))
+
+    chunks = -(-processes // len(by_spans)) if by_spans else 1
+    tasks = []
+    for spans, risks in by_spans.items():
+        n = min(chunks, len(risks))
+        tasks.extend((spans, risks[i::n]) for i in range(n))
+    return tasks
+
+
+def sweep(files, combos, notional=100.0, fee_rate=backtest.DEFAULT_FEE_RATE, processes=None):
+    """
+    Resultados de todas as combinações (fast, slow, trend, sl, tp), por PnL
+    """
+    processes = processes or os.cpu_count()
+    tasks = [(spans, risks, notional, fee_rate) for spans, risks in _tasks(combos, processes)]
+    path, layout = _share(files)
+
+    try:
+        with Pool(min(processes, len(tasks)), initializer=_attach, initargs=(path, layout)) as pool:
+            results = [r for chunk in pool.imap_unordered(_evaluate, tasks) for r in chunk]
+    finally:
+        os.remove(path)
+
+    results.sort(key=lambda r: r["pnl"], reverse=True)
+    return results
+
+
+# =====================================================
+# CLI
+# =====================================================
+def _floats(value):
+    return [float(v) for v in value.split(",")]
+
+
+def _ints(value):
+    return [int(v) for v in value.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Otimização de EMAs e SL/TP da estratégia Falcon")
+    parser.add_argument("files", nargs="+", help="klines (.csv, .parquet, .npy)")
+    parser.add_argument("--fast", type=_ints, default=[EMA_SPANS[0]], help="EMA rápida, ex.: 5,9,13")
+    parser.add_argument("--slow", type=_ints, default=[EMA_SPANS[1]], help="EMA lenta, ex.: 20,26")
+    parser.add_argument("--trend", type=_ints, default=[EMA_SPANS[2]], help="EMA de tendência, ex.: 50,100")
+    parser.add_argument("--sl", type=_floats, required=True, help="StopLoss em %%, ex.: 0.5,1,1.5")
+    parser.add_argument("--tp", type=_floats, required=True, help="TakeProfit em %%, ex.: 1,2,3")
+    parser.add_argument("--random", type=int, help="N combinações ao acaso (em vez da grelha)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--notional", type=float, default=100.0, help="valor por trade (USDT)")
+    parser.add_argument("--fee", type=float, default=backtest.DEFAULT_FEE_RATE, help="taxa por lado")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--top", type=int, default=20, help="linhas a mostrar")
+    parser.add_argument("--out", help="todos os resultados (.csv)")
+    args = parser.parse_args(argv)
+
+    combos = _combinations(args.fast, args.slow, args.trend, args.sl, args.tp, args.random, args.seed)
+    if not combos:
+        print("Nenhuma combinação válida (tem de ser fast < slow < trend)")
+        return 1
+
+    start = time.perf_counter()
+    results = sweep(args.files, combos, args.notional, args.fee, args.processes)
+    elapsed = time.perf_counter() - start
+
+    table = pd.DataFrame(results).drop(columns="per_symbol")
+    print(table.head(args.top).to_string(index=False))
+    processes = min(args.processes, len(_tasks(combos, args.processes)))
+    print(f"{len(results)} combinações x {len(args.files)} símbolos em {elapsed:.2f}s "
+          f"({processes} processos)")
+
+    if args.out:
+        pd.DataFrame([
+            {**{k: v for k, v in r.items() if k != "per_symbol"},
+             **{f"pnl_{s}": p for s, p in r["per_symbol"].items()}}
+            for r in results
+        ]).to_csv(args.out, index=False)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
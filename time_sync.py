@@ -0,0 +1,177 @@
+import time
+import threading
+from urllib.parse import urlsplit
+
+import yaml
+
+import http_client
+from logger import log_debug, log_error, log_info
+
+# =====================================================
+# CONFIG
+# =====================================================
+cfg = yaml.safe_load(open("config.yaml"))
+
+SYNC_CFG = cfg.get("time_sync", {}) or {}
+
+ENABLED = bool(SYNC_CFG.get("enabled", True))
+REFRESH_SECONDS = float(SYNC_CFG.get("refresh_seconds", 300))
+SAMPLES = int(SYNC_CFG.get("samples", 3))
+
+
+# =====================================================
+# OFFSET DO RELÓGIO POR CORRETORA/AMBIENTE
+# =====================================================
+#
+# offset = hora do servidor - hora local (ms), medido a meio do round
+# trip; das SAMPLES medições fica a de menor RTT. Os timestamps assinados
+# usam now_ms(), o que evita rejeições por relógio (Binance -1021,
+# Bybit 10002). Uma rejeição destas força nova medição.
+
+_offsets = {}      # (exchange, env) → offset em ms
+_synced_at = {}    # (exchange, env) → time.time()
+_hosts = {}        # host → (exchange, env)
+_lock = threading.Lock()
+_wake = threading.Event()
+_thread = None
+
+
+def _server_time_url(exchange, env):
+    # import tardio: os clientes importam este módulo
+    if exchange == "binance":
+        from binance_client import _base_url
+        return f"{_base_url(env)}/fapi/v1/time"
+
+    from bybit_client import _base_url
+    return f"{_base_url(env)}/v5/market/time"
+
+
+def _server_time(exchange, data):
+    if exchange == "binance":
+        return int(data["serverTime"])
+    return int(data["time"])
+
+
+def _measure(exchange, env):
+    url = _server_time_url(exchange, env)
+    best = None
+
+    for _ in range(SAMPLES):
+        t0 = time.time()
+        r = http_client.get(url, timeout=5)
+        t1 = time.time()
+        r.raise_for_status()
+
+        rtt = t1 - t0
+        offset = _server_time(exchange, r.json()) - (t0 + t1) / 2 * 1000
+
+        if best is None or rtt < best[0]:
+            best = (rtt, offset)
+
+    return best
+
+
+def sync(exchange, env):
+    try:
+        rtt, offset = _measure(exchange, env)
+    except Exception as e:
+        log_error("time_sync", "Erro ao sincronizar relógio", e)
+        return
+
+    with _lock:
+        _offsets[(exchange, env)] = offset
+        _synced_at[(exchange, env)] = time.time()
+
+    log_debug("time_sync", "Relógio sincronizado", {
+        "exchange": exchange,
+        "env": env,
+        "offset_ms": round(offset, 1),
+        "rtt_ms": round(rtt * 1000, 1)
+    })
+
+
+def _run():
+    while True:
+        _wake.wait(timeout=5)
+        _wake.clear()
+
+        now = time.time()
+        with _lock:
+            due = [k for k in _offsets if now - _synced_at.get(k, 0) >= REFRESH_SECONDS]
+
+        for exchange, env in due:
+            sync(exchange, env)
+
+
+def _register(exchange, env):
+    global _thread
+
+    with _lock:
+        if (exchange, env) in _offsets:
+            return
+        _offsets[(exchange, env)] = 0.0
+
+        try:
+            _hosts[urlsplit(_server_time_url(exchange, env)).netloc] = (exchange, env)
+        except Exception:
+            pass
+
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="time-sync", daemon=True)
+            _thread.start()
+
+    # 1ª medição já, em background (o pedido atual usa offset 0)
+    _wake.set()
+
+
+# =====================================================
+# API
+# =====================================================
+def now_ms(exchange, env) -> int:
+    """
+    Hora da corretora (ms) para timestamps assinados
+    """
+    if not ENABLED:
+        return int(time.time() * 1000)
+
+    offset = _offsets.get((exchange, env))
+    if offset is None:
+        _register(exchange, env)
+        offset = 0.0
+
+    return int(time.time() * 1000 + offset)
+
+
+def check_response(exchange, response):
+    """
+    Chamado com cada resposta: rejeição por timestamp → nova medição
+    """
+    if not ENABLED:
+        return
+
+    content = response.content or b""
+    if exchange == "binance":
+        rejected = response.status_code == 400 and b"-1021" in content
+    else:
+        rejected = b'"retCode":10002' in content
+
+    if not rejected:
+        return
+
+    key = _hosts.get(urlsplit(response.url).netloc)
+    if key is None:
+        return
+
+    log_info("time_sync", "Pedido rejeitado por timestamp, a ressincronizar", {
+        "exchange": key[0],
+        "env": key[1]
+    })
+
+    with _lock:
+        _synced_at[key] = 0
+    _wake.set()
+
+
+def get_offsets() -> dict:
+    with _lock:
+        return {f"{e}|{env}": round(o, 1) for (e, env), o in _offsets.items()}
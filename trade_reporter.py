@@ -0,0 +1,366 @@
+import os
+import json
+import time
+import heapq
+import queue
+import atexit
+import itertools
+import threading
+
+import yaml
+
+import http_client
+import sharding
+import trade_store
+from logger import log_debug, log_info, log_error
+
+# =====================================================
+# CONFIG
+# =====================================================
+cfg = yaml.safe_load(open("config.yaml"))
+
+TRADES_CFG = cfg.get("trades", {}) or {}
+
+TRADES_API_URL = cfg.get("api", {}).get(
+    "trades_url",
+    "http://invest.rdfonseca.com/api/forex_api_trades.php"
+)
+BATCH_SIZE = int(TRADES_CFG.get("batch_size", 1))
+FLUSH_INTERVAL = float(TRADES_CFG.get("flush_interval_seconds", 2))
+RETRY_BASE = float(TRADES_CFG.get("retry_base_seconds", 5))
+RETRY_MAX = float(TRADES_CFG.get("retry_max_seconds", 300))
+OUTBOX_FILE = sharding.worker_path(
+    TRADES_CFG.get("outbox_file", "/var/lib/iforextrading/trades_outbox.jsonl")
+)
+
+
+# =====================================================
+# ENVIO DE TRADES FECHADOS (BACKGROUND + OUTBOX)
+# =====================================================
+#
+# O loop de trading só põe os trades fechados na fila (submit). Uma
+# thread própria envia-os para a API em lotes. Até serem aceites, os
+# trades ficam na outbox em disco: sobrevivem a restarts e a falhas da
+# API, e são repetidos com backoff exponencial.
+#
+# A outbox é um journal só de acrescentar: submit escreve uma linha com
+# o trade, o envio com sucesso escreve {"done": chave}. A thread de envio
+# compacta o ficheiro (só os pendentes) quando o journal cresce, sem
+# bloquear submit enquanto reescreve.
+COMPACT_MIN_LINES = 1000
+
+_lock = threading.Lock()
+_queue = queue.Queue()
+_outbox = {}
+_journal_lock = threading.Lock()
+_journal = None
+_journal_lines = 0
+_outbox_loaded = False
+_thread = None
+_stop_event = threading.Event()
+
+_stats = {"submitted": 0, "sent": 0, "failed": 0}
+
+
+def _key(idcliente, trade_id):
+    return f"{idcliente}|{trade_id}"
+
+
+# -------------------------------------------------
+# OUTBOX EM DISCO
+# -------------------------------------------------
+def _append(record):
+    """
+    Acrescenta uma linha ao journal (O(1), não reescreve o ficheiro)
+    """
+    global _journal, _journal_lines
+
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+    with _journal_lock:
+        try:
+            if _journal is None:
+                os.makedirs(os.path.dirname(OUTBOX_FILE), exist_ok=True)
+                _journal = open(OUTBOX_FILE, "a")
+            _journal.write(line)
+            _journal.flush()
+            _journal_lines += 1
+        except Exception as e:
+            log_error("trade_reporter", "Erro ao gravar outbox de trades", e)
+
+
+def _compact():
+    """
+    Reescreve o journal só com os pendentes (thread de envio). As linhas
+    acrescentadas durante a escrita são copiadas no fim (replay idempotente).
+    """
+    global _journal, _journal_lines
+
+    with _lock:
+        pending = len(_outbox)
+
+    with _journal_lock:
+        if _journal_lines < max(COMPACT_MIN_LINES, 2 * pending):
+            return
+        if _journal is not None:
+            _journal.flush()
+        offset = os.path.getsize(OUTBOX_FILE) if os.path.exists(OUTBOX_FILE) else 0
+
+    with _lock:
+        pending = [dict(e) for e in _outbox.values()]
+
+    try:
+        tmp = OUTBOX_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            for entry in pending:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+            with _journal_lock:
+                if _journal is not None:
+                    _journal.flush()
+                    _journal.close()
+                    _journal = None
+
+                tail = 0
+                if os.path.exists(OUTBOX_FILE):
+                    with open(OUTBOX_FILE) as old:
+                        old.seek(offset)
+                        for line in old:
+                            f.write(line)
+                            tail += 1
+
+                f.flush()
+                os.replace(tmp, OUTBOX_FILE)
+                _journal_lines = len(pending) + tail
+    except Exception as e:
+        log_error("trade_reporter", "Erro ao compactar outbox de trades", e)
+
+
+def _claim_on_load(entry):
+    # base de dados partilhada ocupada → tentar mais umas vezes; se não der,
+    # o trade fica na outbox e é recuperado no próximo arranque
+    for _ in range(3):
+        try:
+            return trade_store.claim(entry["idcliente"], entry["trade_id"])
+        except trade_store.StoreBusy:
+            time.sleep(trade_store.SHARED_READ_TIMEOUT)
+
+    log_error("trade_reporter", "Base de dados ocupada, trade da outbox adiado", None,
+              idcliente=entry["idcliente"])
+    return False
+
+
+def _load_outbox():
+    """
+    Trades pendentes do arranque anterior voltam a ser enviados
+    """
+    global _outbox_loaded, _journal_lines
+
+    with _lock:
+        if _outbox_loaded:
+            return
+        _outbox_loaded = True
+
+        if not os.path.exists(OUTBOX_FILE):
+            return
+
+        try:
+            with open(OUTBOX_FILE) as f:
+                for line in f:
+                    _journal_lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if "done" in entry:
+                        _outbox.pop(entry["done"], None)
+                    else:
+                        _outbox[_key(entry["idcliente"], entry["trade_id"])] = entry
+        except Exception as e:
+            log_error("trade_reporter", "Erro ao ler outbox de trades", e)
+            return
+
+    pending = 0
+    for entry in list(_outbox.values()):
+        if trade_store.contains(entry["idcliente"], entry["trade_id"]):
+            with _lock:
+                _outbox.pop(_key(entry["idcliente"], entry["trade_id"]), None)
+            continue
+        if not _claim_on_load(entry):
+            continue
+        entry["next_try"] = 0
+        _queue.put(entry)
+        pending += 1
+
+    if pending:
+        log_info("trade_reporter", "Trades pendentes recuperados da outbox", {"trades": pending})
+
+
+# -------------------------------------------------
+# ENVIO
+# -------------------------------------------------
+def _post(entries):
+    body = entries[0]["payload"] if BATCH_SIZE <= 1 else [e["payload"] for e in entries]
+
+    log_debug("trade_reporter", "A enviar trades fechados para API", {
+        "trades": len(entries)
+    })
+
+    r = http_client.post(TRADES_API_URL, json=body, timeout=10)
+    r.raise_for_status()
+
+
+def _sent(entries):
+    with _lock:
+        for e in entries:
+            _outbox.pop(_key(e["idcliente"], e["trade_id"]), None)
+        _stats["sent"] += len(entries)
+
+    for e in entries:
+        _append({"done": _key(e["idcliente"], e["trade_id"])})
+
+    _compact()
+
+    for e in entries:
+        trade_store.mark_sent(e["idcliente"], e["trade_id"])
+        log_info(
+            "main",
+            "Trade fechado enviado com sucesso",
+            e["payload"],
+            idcliente=e["idcliente"]
+        )
+
+
+def _failed(entries, error):
+    now = time.time()
+
+    with _lock:
+        _stats["failed"] += len(entries)
+        for e in entries:
+            e["attempts"] = e.get("attempts", 0) + 1
+            e["next_try"] = now + min(RETRY_MAX, RETRY_BASE * 2 ** (e["attempts"] - 1))
+
+    for e in entries:
+        log_error(
+            "main",
+            "Erro ao enviar trade fechado",
+            error,
+            idcliente=e["idcliente"]
+        )
+
+
+def _next_batch(waiting, seq):
+    """
+    Próximos trades a enviar (já vencidos, no máximo BATCH_SIZE).
+    `waiting` é o heap (next_try, seq, trade) da thread de envio: os trades
+    novos da fila entram uma vez (O(log n)) e só saem os vencidos, por isso
+    uma outbox grande ou a API em baixo não custam O(n) por envio.
+    """
+    timeout = FLUSH_INTERVAL
+    if waiting:
+        timeout = min(timeout, max(0.0, waiting[0][0] - time.time()))
+
+    try:
+        e = _queue.get(timeout=timeout)
+        while True:
+            heapq.heappush(waiting, (e.get("next_try", 0), next(seq), e))
+            e = _queue.get_nowait()
+    except queue.Empty:
+        pass
+
+    now = time.time()
+    due = []
+    while waiting and waiting[0][0] <= now and len(due) < BATCH_SIZE:
+        due.append(heapq.heappop(waiting)[2])
+
+    return due
+
+
+def _run():
+    waiting = []
+    seq = itertools.count()
+
+    while not _stop_event.is_set():
+        due = _next_batch(waiting, seq)
+        if not due:
+            continue
+
+        try:
+            if BATCH_SIZE <= 1:
+                for i, e in enumerate(due):
+                    try:
+                        _post([e])
+                    except Exception as err:
+                        _failed(due[i:i + 1], err)
+                        continue
+                    _sent([e])
+            else:
+                _post(due)
+                _sent(due)
+        except Exception as err:
+            _failed(due, err)
+
+        # falhados voltam ao heap com o próximo next_try (backoff)
+        for e in due:
+            if _key(e["idcliente"], e["trade_id"]) in _outbox:
+                heapq.heappush(waiting, (e["next_try"], next(seq), e))
+
+
+def start():
+    """
+    Recupera a outbox e arranca a thread de envio (chamado no arranque)
+    """
+    global _thread
+
+    _load_outbox()
+
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_run, name="trade-reporter", daemon=True)
+        _thread.start()
+
+
+# =====================================================
+# API
+# =====================================================
+def submit(idcliente, trade_id, payload) -> bool:
+    """
+    Põe um trade fechado na fila de envio (não bloqueia).
+    False se já foi enviado ou já está pendente; trade_store.StoreBusy se
+    não for possível confirmar (o cursor não avança → próximo ciclo).
+    """
+    if not trade_store.claim(idcliente, trade_id):
+        return False
+
+    entry = {
+        "idcliente": idcliente,
+        "trade_id": trade_id,
+        "payload": payload,
+        "attempts": 0,
+        "next_try": 0
+    }
+
+    with _lock:
+        _outbox[_key(idcliente, trade_id)] = entry
+        _stats["submitted"] += 1
+
+    _append(entry)
+
+    start()
+    _queue.put(entry)
+    return True
+
+
+def get_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["pending"] = len(_outbox)
+    return stats
+
+
+def _shutdown():
+    _stop_event.set()
+
+
+atexit.register(_shutdown)
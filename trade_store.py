@@ -0,0 +1,313 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import yaml
+
+import sharding
+from logger import log_debug, log_error
+
+# =====================================================
+# CONFIG
+# =====================================================
+cfg = yaml.safe_load(open("config.yaml"))
+
+STATE_CFG = cfg.get("state", {}) or {}
+
+DB_FILE = STATE_CFG.get("db_file", "/var/lib/iforextrading/state.db")
+MAX_PER_CLIENT = int(STATE_CFG.get("sent_trades_per_client", 500))
+TTL_SECONDS = float(STATE_CFG.get("sent_trades_ttl_days", 30)) * 86400
+PURGE_INTERVAL = 60 * 60  # 60 minutos
+
+# vários workers/processos partilham a base de dados: um cliente pode
+# mudar de worker → a memória deste worker pode estar desatualizada
+SHARED = sharding.MODE != "off" or sharding.PROCESS_INDEX is not None
+
+# leituras partilhadas: fora do _lock, ligação por thread e timeout curto
+# (um worker a escrever não pode parar as threads dos outros workers)
+SHARED_READ_TIMEOUT = float(STATE_CFG.get("shared_read_timeout_seconds", 0.2))
+
+
+class StoreBusy(Exception):
+    """
+    Base de dados partilhada ocupada: trade não reservado, tentar no próximo ciclo
+    """
+
+
+# =====================================================
+# DEDUP PERSISTENTE DE TRADES ENVIADOS
+# =====================================================
+#
+# Os trades enviados para a API ficam em SQLite (sobrevivem a restarts) e
+# num índice em memória por cliente (OrderedDict: trade_id → sent_at),
+# carregado no arranque. Verificações em O(1), sem ir à base de dados.
+# Por cliente ficam no máximo MAX_PER_CLIENT trades e nenhum mais velho
+# que TTL_SECONDS.
+
+_lock = threading.Lock()
+_conn = None
+_index = {}
+_in_flight = set()
+_cursors = {}
+_last_purge = 0.0
+_readers = threading.local()
+
+
+def _connect():
+    os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
+
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sent_trades ("
+        " idcliente TEXT NOT NULL,"
+        " trade_id TEXT NOT NULL,"
+        " sent_at REAL NOT NULL,"
+        " PRIMARY KEY (idcliente, trade_id))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS cursors ("
+        " idcliente TEXT NOT NULL,"
+        " name TEXT NOT NULL,"
+        " value INTEGER NOT NULL,"
+        " updated_at REAL NOT NULL,"
+        " PRIMARY KEY (idcliente, name))"
+    )
+    return conn
+
+
+def _ensure_loaded():
+    """
+    Abre a base de dados e carrega o índice (uma vez, com _lock)
+    """
+    global _conn, _last_purge
+
+    if _conn is not None:
+        return
+
+    _conn = _connect()
+
+    cutoff = time.time() - TTL_SECONDS
+    _conn.execute("DELETE FROM sent_trades WHERE sent_at < ?", (cutoff,))
+
+    rows = _conn.execute(
+        "SELECT idcliente, trade_id, sent_at FROM sent_trades ORDER BY sent_at"
+    ).fetchall()
+
+    for idcliente, trade_id, sent_at in rows:
+        _index.setdefault(idcliente, OrderedDict())[trade_id] = sent_at
+
+    for idcliente in list(_index):
+        _evict(idcliente)
+
+    for idcliente, name, value in _conn.execute(
+        "SELECT idcliente, name, value FROM cursors"
+    ).fetchall():
+        _cursors[(idcliente, name)] = value
+
+    _last_purge = time.time()
+
+    log_debug("trade_store", "Trades enviados carregados", {
+        "clients": len(_index),
+        "trades": sum(len(v) for v in _index.values())
+    })
+
+
+def _evict(idcliente):
+    trades = _index.get(idcliente)
+    if not trades:
+        return
+
+    removed = []
+    while len(trades) > MAX_PER_CLIENT:
+        trade_id, _ = trades.popitem(last=False)
+        removed.append((idcliente, trade_id))
+
+    if removed:
+        _conn.executemany(
+            "DELETE FROM sent_trades WHERE idcliente = ? AND trade_id = ?",
+            removed
+        )
+
+
+def _purge_expired():
+    global _last_purge
+
+    now = time.time()
+    if now - _last_purge < PURGE_INTERVAL:
+        return
+
+    cutoff = now - TTL_SECONDS
+    _conn.execute("DELETE FROM sent_trades WHERE sent_at < ?", (cutoff,))
+
+    for idcliente, trades in list(_index.items()):
+        while trades and next(iter(trades.values())) < cutoff:
+            trades.popitem(last=False)
+        if not trades:
+            _index.pop(idcliente, None)
+
+    _last_purge = now
+
+
+def _shared_read(query, params):
+    """
+    SELECT na base de dados partilhada (chamado sem _lock)
+    """
+    conn = getattr(_readers, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, timeout=SHARED_READ_TIMEOUT, isolation_level=None)
+        _readers.conn = conn
+    return conn.execute(query, params).fetchone()
+
+
+# =====================================================
+# API
+# =====================================================
+def load():
+    """
+    Carrega o índice no arranque (opcional: é feito no 1º uso)
+    """
+    with _lock:
+        try:
+            _ensure_loaded()
+        except Exception as e:
+            log_error("trade_store", "Erro ao carregar trades enviados", e)
+
+
+def contains(idcliente, trade_id) -> bool:
+    with _lock:
+        _ensure_loaded()
+        return str(trade_id) in _index.get(str(idcliente), ())
+
+
+def claim(idcliente, trade_id) -> bool:
+    """
+    Reserva o trade para envio. False se já foi enviado ou está a ser enviado.
+    """
+    key = (str(idcliente), str(trade_id))
+
+    with _lock:
+        _ensure_loaded()
+
+        if key[1] in _index.get(key[0], ()) or key in _in_flight:
+            return False
+
+        _in_flight.add(key)
+        if not SHARED:
+            return True
+
+    # enviado por outro worker (antes de o cliente mudar de worker)?
+    try:
+        row = _shared_read(
+            "SELECT sent_at FROM sent_trades WHERE idcliente = ? AND trade_id = ?",
+            key
+        )
+    except sqlite3.OperationalError as e:
+        with _lock:
+            _in_flight.discard(key)
+        raise StoreBusy(str(e))
+
+    if row is None:
+        return True
+
+    with _lock:
+        _in_flight.discard(key)
+        _index.setdefault(key[0], OrderedDict())[key[1]] = row[0]
+    return False
+
+
+def release(idcliente, trade_id):
+    """
+    Liberta a reserva (envio falhou → volta a ser tentado)
+    """
+    with _lock:
+        _in_flight.discard((str(idcliente), str(trade_id)))
+
+
+def mark_sent(idcliente, trade_id):
+    idcliente = str(idcliente)
+    trade_id = str(trade_id)
+    now = time.time()
+
+    with _lock:
+        _ensure_loaded()
+        _in_flight.discard((idcliente, trade_id))
+
+        trades = _index.setdefault(idcliente, OrderedDict())
+        trades[trade_id] = now
+        trades.move_to_end(trade_id)
+
+        try:
+            _conn.execute(
+                "INSERT OR REPLACE INTO sent_trades (idcliente, trade_id, sent_at)"
+                " VALUES (?, ?, ?)",
+                (idcliente, trade_id, now)
+            )
+            _evict(idcliente)
+            _purge_expired()
+        except Exception as e:
+            log_error("trade_store", "Erro ao gravar trade enviado", e, idcliente=idcliente)
+
+
+# -------------------------------------------------
+# CURSORES (POLLING INCREMENTAL DE TRADES FECHADOS)
+# -------------------------------------------------
+def get_cursor(idcliente, name):
+    """
+    Último valor visto (ex.: updatedTime ou trade id) ou None
+    """
+    key = (str(idcliente), name)
+
+    with _lock:
+        _ensure_loaded()
+        if not SHARED:
+            return _cursors.get(key)
+
+    # outro worker pode ter avançado o cursor; se a base de dados estiver
+    # ocupada fica o valor em memória (os trades repetidos são ignorados)
+    try:
+        row = _shared_read(
+            "SELECT value FROM cursors WHERE idcliente = ? AND name = ?",
+            key
+        )
+    except sqlite3.OperationalError as e:
+        log_debug("trade_store", "Base de dados ocupada, cursor em memória", str(e))
+        row = None
+
+    with _lock:
+        if row is not None and row[0] > _cursors.get(key, row[0] - 1):
+            _cursors[key] = row[0]
+        return _cursors.get(key)
+
+
+def set_cursor(idcliente, name, value):
+    key = (str(idcliente), name)
+    value = int(value)
+
+    with _lock:
+        _ensure_loaded()
+        if _cursors.get(key) == value:
+            return
+        _cursors[key] = value
+
+        try:
+            _conn.execute(
+                "INSERT OR REPLACE INTO cursors (idcliente, name, value, updated_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key[0], name, value, time.time())
+            )
+        except Exception as e:
+            log_error("trade_store", "Erro ao gravar cursor", e, idcliente=idcliente)
+
+
+def get_stats() -> dict:
+    with _lock:
+        return {
+            "clients": len(_index),
+            "trades": sum(len(v) for v in _index.values()),
+            "in_flight": len(_in_flight),
+            "cursors": len(_cursors)
+        }
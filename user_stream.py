@@ -0,0 +1,482 @@
+import json
+import time
+import threading
+
+import yaml
+
+import rate_limit
+import signing
+import time_sync
+from logger import log_debug, log_error, log_info
+
+try:
+    import websocket
+except ImportError:  # websocket-client é opcional (só para o modo streaming)
+    websocket = None
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+cfg = yaml.safe_load(open("config.yaml"))
+
+STREAM_CFG = cfg.get("account_stream", {}) or {}
+
+ENABLED = bool(STREAM_CFG.get("enabled", False))
+RECONCILE_SECONDS = float(STREAM_CFG.get("reconcile_seconds", 300))
+RECONNECT_DELAY = float(STREAM_CFG.get("reconnect_delay_seconds", 5))
+KEEPALIVE_SECONDS = float(STREAM_CFG.get("listen_key_keepalive_seconds", 1800))
+PING_SECONDS = 20  # Bybit fecha a ligação privada sem ping em ~30 s
+
+WS_URLS = {
+    "binance": {
+        "real": "wss://fstream.binance.com",
+        "testnet": "wss://stream.binancefuture.com"
+    },
+    "bybit": {
+        "real": "wss://stream.bybit.com/v5/private",
+        "testnet": "wss://stream-demo.bybit.com/v5/private"
+    }
+}
+for _corretora, _urls in (STREAM_CFG.get("urls") or {}).items():
+    WS_URLS.setdefault(_corretora, {}).update(_urls or {})
+
+# listenKey (REST) da Binance
+LISTEN_KEY_URLS = {
+    "real": "https://fapi.binance.com",
+    "testnet": "https://testnet.binancefuture.com"
+}
+LISTEN_KEY_URLS.update(STREAM_CFG.get("listen_key_urls") or {})
+
+
+# =====================================================
+# ESTADO DA CONTA (ALIMENTADO PELO STREAM PRIVADO)
+# =====================================================
+#
+# Um stream por conta (corretora, env, api_key). Os eventos de posição
+# atualizam um snapshot em memória com o mesmo formato do REST
+# (positionRisk / position/list); as execuções marcam o símbolo como
+# "sujo" para os trades fechados serem pedidos por REST.
+# O REST continua a ser usado para semear o snapshot e reconciliar a cada
+# RECONCILE_SECONDS, e sempre que o stream não está ligado.
+
+def _scope(corretora, symbol):
+    if corretora == "bybit":
+        from bybit_client import _settle_coin
+        return _settle_coin(symbol)
+    return None
+
+
+def _position_key(corretora, p):
+    if corretora == "bybit":
+        return (p.get("symbol"), p.get("positionIdx", 0))
+    return (p.get("symbol"), p.get("positionSide", "BOTH"))
+
+
+class AccountStream:
+    """
+    Ligação WebSocket privada de uma conta + estado local da conta
+    """
+
+    def __init__(self, corretora, env, api_key, api_secret):
+        self.corretora = corretora
+        self.env = env
+        self.api_key = api_key
+        self.api_secret = api_secret
+
+        self._lock = threading.Lock()
+        self._positions = {}      # scope → {position_key: posição}
+        self._reconciled = {}     # scope → time.time() do último snapshot REST
+        self._position_event = 0.0
+        self._fills = {}          # symbol → time.time() da última execução
+        self._trades_polled = {}  # symbol → time.time() do último REST
+        self._live = False
+        self._ws = None
+        self._listen_key = None
+        self._last_keepalive = 0.0
+        self._last_ping = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+
+    # -------------------------------------------------
+    # ESTADO
+    # -------------------------------------------------
+    def get_positions(self, scope):
+        """
+        Snapshot local ou None (stream em baixo, sem snapshot, ou reconciliação devida)
+        """
+        with self._lock:
+            if not self._live or scope not in self._positions:
+                return None
+            if time.time() - self._reconciled.get(scope, 0) >= RECONCILE_SECONDS:
+                return None
+            return list(self._positions[scope].values())
+
+    def seed(self, scope, positions, started):
+        """
+        Snapshot REST obtido a partir de `started`. Ignorado se entretanto
+        chegou um evento de posição (fica para a próxima reconciliação).
+        """
+        with self._lock:
+            if not self._live or self._position_event > started:
+                return
+            self._positions[scope] = {
+                _position_key(self.corretora, p): p for p in positions
+            }
+            self._reconciled[scope] = time.time()
+
+    def invalidate(self):
+        """
+        Próxima leitura vai ao REST (ex.: depois de enviar uma ordem)
+        """
+        with self._lock:
+            self._reconciled.clear()
+
+    def trades_due(self, symbol) -> bool:
+        with self._lock:
+            if not self._live:
+                return True
+            polled = self._trades_polled.get(symbol)
+            if polled is None or time.time() - polled >= RECONCILE_SECONDS:
+                return True
+            return self._fills.get(symbol, 0) >= polled
+
+    def trades_polled(self, symbol, started):
+        with self._lock:
+            self._trades_polled[symbol] = started
+
+    def _apply_positions(self, positions):
+        now = time.time()
+        with self._lock:
+            self._position_event = now
+            for p in positions:
+                scope = _scope(self.corretora, p.get("symbol", ""))
+                snapshot = self._positions.get(scope)
+                if snapshot is None:
+                    continue
+                snapshot[_position_key(self.corretora, p)] = p
+
+    def _apply_fill(self, symbol):
+        with self._lock:
+            self._fills[symbol] = time.time()
+
+    # -------------------------------------------------
+    # LIGAÇÃO
+    # -------------------------------------------------
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"user-stream-{self.corretora}-{self.env}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            ws = self._ws
+        if ws is not None:
+            ws.close()
+
+    def _url(self):
+        base = WS_URLS[self.corretora][self.env].rstrip("/")
+        if self.corretora == "binance":
+            self._listen_key = self._new_listen_key()
+            return f"{base}/ws/{self._listen_key}"
+        return base
+
+    def _new_listen_key(self):
+        r = rate_limit.request(
+            "binance", self.api_key, "position", "POST",
+            f"{LISTEN_KEY_URLS[self.env]}/fapi/v1/listenKey",
+            headers={"X-MBX-APIKEY": self.api_key},
+            timeout=10
+        )
+        r.raise_for_status()
+        self._last_keepalive = time.time()
+        return r.json()["listenKey"]
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                url = self._url()
+
+                ws = websocket.WebSocketApp(
+                    url,
+                    on_open=self._on_open,
+                    on_message=self._on_message,
+                    on_error=self._on_error,
+                    on_close=self._on_close
+                )
+
+                with self._lock:
+                    self._ws = ws
+
+                ws.run_forever(ping_interval=60, ping_timeout=20)
+
+            except Exception as e:
+                log_error("user_stream", "Erro na ligação do stream de conta", e)
+
+            with self._lock:
+                self._ws = None
+                # eventos perdidos durante a falha → REST até voltar a semear
+                self._live = False
+                self._positions.clear()
+                self._reconciled.clear()
+
+            if not self._stop.is_set():
+                self._stop.wait(RECONNECT_DELAY)
+
+    def _on_open(self, ws):
+        if self.corretora == "bybit":
+            expires = time_sync.now_ms("bybit", self.env) + 10_000
+            signature = signing.sign(self.api_secret, f"GET/realtime{expires}")
+            ws.send(json.dumps({"op": "auth", "args": [self.api_key, expires, signature]}))
+            self._last_ping = time.time()
+            return
+
+        self._set_live(True)
+
+    def _set_live(self, live):
+        with self._lock:
+            self._live = live
+        log_debug("user_stream", "Stream de conta ligado" if live else "Stream de conta em baixo", {
+            "corretora": self.corretora,
+            "env": self.env
+        })
+
+    def _on_error(self, ws, error):
+        log_error("user_stream", "Erro no stream de conta", error)
+
+    def _on_close(self, ws, status, reason):
+        with self._lock:
+            self._live = False
+        log_info("user_stream", "Stream de conta desligado", {
+            "corretora": self.corretora,
+            "env": self.env,
+            "status": status,
+            "reason": reason
+        })
+
+    def _on_message(self, ws, message):
+        try:
+            msg = json.loads(message)
+            if self.corretora == "bybit":
+                self._on_bybit(ws, msg)
+            else:
+                self._on_binance(ws, msg)
+        except Exception as e:
+            log_error("user_stream", "Erro ao processar mensagem de conta", e)
+
+    # -------------------------------------------------
+    # EVENTOS
+    # -------------------------------------------------
+    def _on_binance(self, ws, msg):
+        event = msg.get("e")
+
+        if event == "ACCOUNT_UPDATE":
+            self._apply_positions([
+                {
+                    "symbol": p["s"],
+                    "positionAmt": p["pa"],
+                    "entryPrice": p["ep"],
+                    "unRealizedProfit": p.get("up"),
+                    "positionSide": p.get("ps", "BOTH")
+                }
+                for p in msg.get("a", {}).get("P", [])
+            ])
+
+        elif event == "ORDER_TRADE_UPDATE":
+            o = msg.get("o", {})
+            if o.get("x") == "TRADE":
+                self._apply_fill(o["s"])
+
+        elif event == "listenKeyExpired":
+            log_info("user_stream", "listenKey expirada, a religar", {"env": self.env})
+            ws.close()
+
+    def _on_bybit(self, ws, msg):
+        op = msg.get("op")
+
+        if op == "auth":
+            if msg.get("success"):
+                ws.send(json.dumps({"op": "subscribe", "args": ["position", "execution"]}))
+                self._set_live(True)
+            else:
+                log_error("user_stream", "Autenticação do stream Bybit recusada", msg.get("ret_msg"))
+                ws.close()
+            return
+
+        topic = msg.get("topic", "")
+
+        if topic.startswith("position"):
+            self._apply_positions(msg.get("data", []))
+
+        elif topic.startswith("execution"):
+            for e in msg.get("data", []):
+                if e.get("execType") == "Trade":
+                    self._apply_fill(e["symbol"])
+
+    # -------------------------------------------------
+    # MANUTENÇÃO (keepalive / ping)
+    # -------------------------------------------------
+    def maintain(self):
+        now = time.time()
+
+        with self._lock:
+            ws = self._ws if self._live else None
+
+        if ws is None:
+            return
+
+        if self.corretora == "bybit":
+            if now - self._last_ping >= PING_SECONDS:
+                self._last_ping = now
+                ws.send(json.dumps({"op": "ping"}))
+            return
+
+        if now - self._last_keepalive >= KEEPALIVE_SECONDS:
+            self._last_keepalive = now
+            r = rate_limit.request(
+                "binance", self.api_key, "position", "PUT",
+                f"{LISTEN_KEY_URLS[self.env]}/fapi/v1/listenKey",
+                headers={"X-MBX-APIKEY": self.api_key},
+                timeout=10
+            )
+            r.raise_for_status()
+
+
+# =====================================================
+# API
+# =====================================================
+_accounts = {}
+_lock = threading.Lock()
+_maintainer = None
+
+
+def enabled() -> bool:
+    return ENABLED and websocket is not None
+
+
+def _get_account(corretora, env, api_key):
+    with _lock:
+        return _accounts.get((corretora, env, api_key))
+
+
+def _maintain_loop():
+    while True:
+        with _lock:
+            accounts = list(_accounts.values())
+
+        for account in accounts:
+            try:
+                account.maintain()
+            except Exception as e:
+                log_error("user_stream", "Erro no keepalive do stream de conta", e)
+
+        time.sleep(5)
+
+
+def sync(accounts):
+    """
+    accounts: iterável de (corretora, env, api_key, api_secret) ativos.
+    Liga streams novos e desliga os de contas que deixaram de existir.
+    """
+    global _maintainer
+
+    if not enabled():
+        return
+
+    wanted = {
+        (corretora, env, api_key): api_secret
+        for corretora, env, api_key, api_secret in accounts
+        if corretora in WS_URLS and env in WS_URLS[corretora]
+    }
+
+    with _lock:
+        removed = [a for k, a in _accounts.items() if k not in wanted]
+        for a in removed:
+            _accounts.pop((a.corretora, a.env, a.api_key), None)
+
+        added = []
+        for key, api_secret in wanted.items():
+            if key not in _accounts:
+                _accounts[key] = AccountStream(*key, api_secret)
+                added.append(_accounts[key])
+
+        if _maintainer is None and _accounts:
+            _maintainer = threading.Thread(
+                target=_maintain_loop,
+                name="user-stream-keepalive",
+                daemon=True
+            )
+            _maintainer.start()
+
+    for a in removed:
+        a.stop()
+    for a in added:
+        a.start()
+
+    if added or removed:
+        log_info("user_stream", "Streams de conta atualizados", {
+            "accounts": len(wanted),
+            "added": len(added),
+            "removed": len(removed)
+        })
+
+
+def get_positions(corretora, env, api_key, scope=None):
+    """
+    Posições da conta a partir do stream, ou None se for preciso ir ao REST
+    """
+    account = _get_account(corretora, env, api_key)
+    return None if account is None else account.get_positions(scope)
+
+
+def seed(corretora, env, api_key, positions, started, scope=None):
+    account = _get_account(corretora, env, api_key)
+    if account is not None:
+        account.seed(scope, positions, started)
+
+
+def invalidate(corretora, env, api_key):
+    account = _get_account(corretora, env, api_key)
+    if account is not None:
+        account.invalidate()
+
+
+def trades_due(corretora, env, api_key, symbol) -> bool:
+    """
+    True se os trades fechados do símbolo têm de ser pedidos por REST
+    (stream em baixo, houve execuções ou a reconciliação está devida)
+    """
+    account = _get_account(corretora, env, api_key)
+    return account is None or account.trades_due(symbol)
+
+
+def trades_polled(corretora, env, api_key, symbol, started):
+    account = _get_account(corretora, env, api_key)
+    if account is not None:
+        account.trades_polled(symbol, started)
+
+
+def get_stats() -> dict:
+    with _lock:
+        accounts = list(_accounts.values())
+
+    live = 0
+    for a in accounts:
+        with a._lock:
+            live += a._live
+
+    return {"accounts": len(accounts), "live": live}
+
+
+if ENABLED and websocket is None:
+    log_error(
+        "user_stream",
+        "Stream de conta ativo mas websocket-client não está instalado",
+        None
+    )
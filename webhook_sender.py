@@ -1,4 +1,4 @@
-import requests
+import http_client
 import yaml
 
 cfg = yaml.safe_load(open("config.yaml"))
@@ -21,5 +21,5 @@ def send_signal(broker, api_key, symbol, lot, signal):
     else:
         raise Exception("Corretora não suportada")
 
-    r = requests.post(url, json=payload, timeout=10)
+    r = http_client.post(url, json=payload, timeout=10)
     r.raise_for_status()
@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import queue
+import atexit
+import hashlib
+import multiprocessing
+
+import yaml
+
+from logger import log_debug, log_error, log_info
+
+# =====================================================
+# CONFIG
+# =====================================================
+cfg = yaml.safe_load(open("config.yaml"))
+
+BOT_CFG = cfg.get("bot", {}) or {}
+
+PROCESSES = int(BOT_CFG.get("processes", 1))
+RESTART_DELAY = float(BOT_CFG.get("restart_delay_seconds", 5))
+MAX_RESTART_DELAY = 300
+
+# lido pelo sharding no processo filho (ficheiros por processo)
+ENV_VAR = "IFOREX_PROCESS_INDEX"
+
+
+# =====================================================
+# POOL DE PROCESSOS (AFINIDADE POR SÍMBOLO)
+# =====================================================
+#
+# Com bot.processes > 1 o main fica como supervisor: obtém os clientes,
+# agrupa-os por chave de afinidade (env, símbolo) e entrega cada grupo a
+# um processo. Candles, EMAs e streams de um símbolo ficam num só
+# processo; cada processo corre o seu próprio ciclo (engine, asyncio).
+# Um grupo só muda de processo se este ficar acima da carga alvo.
+# Um processo que morre é relançado (com backoff) sem afetar os outros.
+
+def assign(groups, processes, previous=None) -> dict:
+    """
+    {chave: [clientes]} → {chave: índice do processo}
+    """
+    previous = previous or {}
+    total = sum(len(v) for v in groups.values())
+    target = -(-total // processes) if total else 0
+    load = [0] * processes
+    result = {}
+
+    # maiores grupos primeiro; cada grupo fica onde estava se couber
+    for key in sorted(groups, key=lambda k: (-len(groups[k]), str(k))):
+        size = len(groups[key])
+        idx = previous.get(key)
+
+        if idx is None or idx >= processes or load[idx] + size > max(target, size):
+            idx = min(range(processes), key=lambda i: load[i])
+
+        load[idx] += size
+        result[key] = idx
+
+    return result
+
+
+def _fingerprint(clients):
+    return hashlib.sha1(
+        json.dumps(clients, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class Inbox:
+    """
+    Lado do processo filho: última lista de clientes do supervisor
+    """
+
+    def __init__(self, q, first_timeout=60):
+        self._queue = q
+        self._clients = None
+        self._parent = os.getppid()
+        self._first_timeout = first_timeout
+
+    def get(self) -> list:
+        # supervisor morreu (ex.: SIGKILL) → este processo termina também
+        if os.getppid() != self._parent:
+            raise SystemExit(0)
+
+        try:
+            if self._clients is None:
+                self._clients = self._queue.get(timeout=self._first_timeout)
+            while True:
+                self._clients = self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+        return self._clients or []
+
+
+def _child(target, q):
+    target(Inbox(q))
+
+
+class WorkerPool:
+
+    def __init__(self, target, key, processes=PROCESSES):
+        """
+        target(inbox): função do processo filho (tem de ser importável)
+        key(cliente): chave de afinidade (ex.: (env, símbolo))
+        """
+        self._mp = multiprocessing.get_context("spawn")
+        self._target = target
+        self._key = key
+        self.processes = max(1, int(processes))
+
+        self._workers = [
+            {
+                "process": None,
+                "queue": None,
+                "clients": [],
+                "sent": None,
+                "started_at": 0.0,
+                "restart_at": 0.0,
+                "crashes": 0,
+                "restarts": 0
+            }
+            for _ in range(self.processes)
+        ]
+        self._assignment = {}
+
+    # -------------------------------------------------
+    # PROCESSOS
+    # -------------------------------------------------
+    def _spawn(self, index):
+        w = self._workers[index]
+        q = self._mp.Queue()
+
+        # o filho (spawn) herda o ambiente no arranque
+        os.environ[ENV_VAR] = str(index)
+        try:
+            p = self._mp.Process(
+                target=_child,
+                args=(self._target, q),
+                name=f"worker-{index}",
+                daemon=True
+            )
+            p.start()
+        finally:
+            os.environ.pop(ENV_VAR, None)
+
+        w.update(process=p, queue=q, sent=None, started_at=time.monotonic())
+
+        log_info("worker_pool", "Processo iniciado", {"process": index, "pid": p.pid})
+
+    def start(self):
+        for i in range(self.processes):
+            self._spawn(i)
+        atexit.register(self.stop)
+
+    def stop(self):
+        for w in self._workers:
+            if w["process"] is not None and w["process"].is_alive():
+                w["process"].terminate()
+
+        for w in self._workers:
+            if w["process"] is not None:
+                w["process"].join(timeout=10)
+
+    def supervise(self):
+        """
+        Relança processos que morreram (backoff exponencial por processo)
+        """
+        now = time.monotonic()
+
+        for i, w in enumerate(self._workers):
+            p = w["process"]
+
+            if p is not None and not p.is_alive():
+                # processo estável há muito → conta como falha isolada
+                if now - w["started_at"] > MAX_RESTART_DELAY:
+                    w["crashes"] = 0
+                w["crashes"] += 1
+
+                delay = min(MAX_RESTART_DELAY, RESTART_DELAY * 2 ** (w["crashes"] - 1))
+                w.update(process=None, restart_at=now + delay)
+
+                log_error(
+                    "worker_pool",
+                    f"Processo {i} terminou (exitcode={p.exitcode}), relançado em {delay:.0f}s"
+                )
+
+            if w["process"] is None and now >= w["restart_at"]:
+                w["restarts"] += 1
+                self._spawn(i)
+                self._send(i)
+
+    # -------------------------------------------------
+    # ATRIBUIÇÃO DE CLIENTES
+    # -------------------------------------------------
+    def _send(self, index):
+        w = self._workers[index]
+        if w["process"] is None:
+            return
+
+        fp = _fingerprint(w["clients"])
+        if fp == w["sent"]:
+            return
+
+        w["queue"].put(w["clients"])
+        w["sent"] = fp
+
+    def dispatch(self, clients):
+        """
+        Distribui os clientes pelos processos (só envia o que mudou)
+        """
+        groups = {}
+        for c in clients:
+            groups.setdefault(self._key(c), []).append(c)
+
+        assignment = assign(groups, self.processes, self._assignment)
+        moved = sum(
+            1 for k, i in assignment.items()
+            if k in self._assignment and self._assignment[k] != i
+        )
+        self._assignment = assignment
+
+        per_process = [[] for _ in range(self.processes)]
+        for k, i in assignment.items():
+            per_process[i].extend(groups[k])
+
+        for i, w in enumerate(self._workers):
+            w["clients"] = per_process[i]
+
+        self.supervise()
+        for i in range(self.processes):
+            self._send(i)
+
+        if moved:
+            log_info("worker_pool", "Grupos de clientes mudaram de processo", {"moved": moved})
+
+        log_debug("worker_pool", "Clientes por processo", self.get_status)
+
+    def get_status(self) -> list:
+        return [
+            {
+                "process": i,
+                "pid": w["process"].pid if w["process"] is not None else None,
+                "alive": w["process"] is not None and w["process"].is_alive(),
+                "clients": len(w["clients"]),
+                "restarts": w["restarts"]
+            }
+            for i, w in enumerate(self._workers)
+        ]